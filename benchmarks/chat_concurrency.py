@@ -0,0 +1,107 @@
+"""
+Concurrency benchmark for the RAG tools.
+
+Simulates /chat requests that each make one rag_query call while another request
+runs a long add_data import, the way the ADK runner awaits tool calls on the
+uvicorn event loop. The Vertex AI SDK calls are replaced with sleeps of realistic
+duration so the benchmark runs offline and only measures scheduling behaviour.
+
+Usage:
+    python -m benchmarks.chat_concurrency [--requests 200] [--import-seconds 5]
+"""
+
+import argparse
+import asyncio
+import inspect
+import statistics
+import time
+from types import SimpleNamespace
+
+from vertexai import rag
+
+from rag_agent.tools import add_data, add_data_async, rag_query, rag_query_async
+
+CORPUS = "projects/bench/locations/us-central1/ragCorpora/bench"
+
+
+def _install_fake_sdk(retrieval_seconds: float, import_seconds: float) -> None:
+    """Replace the blocking SDK calls with sleeps of the given duration."""
+
+    def list_corpora():
+        return [SimpleNamespace(name=CORPUS, display_name="bench")]
+
+    def retrieval_query(**kwargs):
+        time.sleep(retrieval_seconds)
+        return SimpleNamespace(contexts=None)
+
+    def import_files(*args, **kwargs):
+        time.sleep(import_seconds)
+        return SimpleNamespace(imported_rag_files_count=1)
+
+    rag.list_corpora = list_corpora
+    rag.retrieval_query = retrieval_query
+    rag.import_files = import_files
+
+
+async def _call_tool(tool, **kwargs):
+    """Invoke a tool the way the ADK runner does: await coroutines, call the rest inline."""
+    if inspect.iscoroutinefunction(tool):
+        return await tool(**kwargs)
+    return tool(**kwargs)
+
+
+async def _run(query_tool, import_tool, requests: int, interval: float) -> list:
+    tool_context = SimpleNamespace(state={f"corpus_exists_{CORPUS}": True})
+    latencies = []
+
+    async def chat_request(arrival: float):
+        await _call_tool(query_tool, corpus_name=CORPUS, query="q", tool_context=tool_context)
+        # Measured from the scheduled arrival, so time spent waiting on a blocked loop counts
+        latencies.append(time.perf_counter() - arrival)
+
+    long_import = asyncio.create_task(
+        _call_tool(
+            import_tool,
+            corpus_name=CORPUS,
+            paths=["gs://bench/docs"],
+            tool_context=tool_context,
+        )
+    )
+    # Let the import start before the chat traffic arrives
+    await asyncio.sleep(0)
+
+    chats = []
+    start = time.perf_counter()
+    for i in range(requests):
+        arrival = start + i * interval
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        chats.append(asyncio.create_task(chat_request(arrival)))
+    await asyncio.gather(*chats, long_import)
+    return latencies
+
+
+def _report(label: str, latencies: list) -> None:
+    ordered = sorted(latencies)
+    p50 = statistics.median(ordered)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:<12} p50={p50 * 1000:8.1f} ms  p99={p99 * 1000:8.1f} ms  max={ordered[-1] * 1000:8.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=10.0)
+    parser.add_argument("--retrieval-ms", type=float, default=50.0)
+    parser.add_argument("--import-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    _install_fake_sdk(args.retrieval_ms / 1000, args.import_seconds)
+    interval = args.interval_ms / 1000
+
+    print(f"{args.requests} chat requests during a {args.import_seconds:.1f}s add_data import")
+    _report("sync tools", asyncio.run(_run(rag_query, add_data, args.requests, interval)))
+    _report("async tools", asyncio.run(_run(rag_query_async, add_data_async, args.requests, interval)))
+
+
+if __name__ == "__main__":
+    main()
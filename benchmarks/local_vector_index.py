@@ -0,0 +1,102 @@
+"""
+Query latency and recall of the local vector mirror.
+
+Writes --vectors clustered, unit-normalized synthetic embeddings into mirrors
+of each layout (float16 / int8, flat / IVF) and runs --queries top-k queries
+against them. Recall@k is measured against an exact float32 brute-force search
+over the same vectors, which is also timed as the reference.
+
+Usage:
+    python -m benchmarks.local_vector_index [--vectors 100000] [--dim 768] [--top-k 10]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from rag_agent.services.local_vector_index import LocalVectorIndex, MirrorWriter
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _dataset(count: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors scattered around random topic centres, like chunk embeddings of a corpus."""
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=count)
+    return _unit(centres[labels] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32))
+
+
+def _write(path: str, vectors: np.ndarray, dtype: str, ivf_min_vectors: int) -> LocalVectorIndex:
+    writer = MirrorWriter(path, dtype)
+    source_id = writer.add_source("gs://bench/corpus.txt", "corpus.txt")
+    for start in range(0, len(vectors), 10000):
+        block = vectors[start:start + 10000]
+        writer.add(source_id, [f"chunk {start + i}" for i in range(len(block))], block)
+    writer.finish({"corpus": "bench", "dim": vectors.shape[1], "embedder": "synthetic", "files_fingerprint": ""},
+                  ivf_min_vectors)
+    return LocalVectorIndex(path)
+
+
+def _report(label: str, latencies: list, recall: float) -> None:
+    ordered = sorted(latencies)
+    p50 = statistics.median(ordered)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:<22} p50={p50 * 1000:7.3f} ms  p99={p99 * 1000:7.3f} ms  "
+          f"max={ordered[-1] * 1000:7.3f} ms  recall@k={recall:.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = _dataset(args.vectors, args.dim, args.clusters, rng)
+    # Queries are noisy copies of stored chunks, as paraphrased questions would be
+    queries = _unit(vectors[rng.choice(args.vectors, args.queries)]
+                    + 0.5 * rng.standard_normal((args.queries, args.dim)).astype(np.float32) / np.sqrt(args.dim) * 8)
+
+    latencies, truth = [], []
+    for query in queries:
+        start = time.perf_counter()
+        similarities = vectors @ query
+        top = np.argpartition(-similarities, args.top_k - 1)[:args.top_k]
+        latencies.append(time.perf_counter() - start)
+        truth.append(set(top[np.argsort(-similarities[top])].tolist()))
+    _report("brute force float32", latencies, 1.0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in ("float16", "int8"):
+            for ivf in (False, True):
+                start = time.perf_counter()
+                index = _write(os.path.join(tmp, f"{dtype}-{ivf}"), vectors, dtype,
+                               ivf_min_vectors=0 if ivf else args.vectors + 1)
+                size = sum(os.path.getsize(os.path.join(index.path, name)) for name in os.listdir(index.path))
+                layout = f"IVF {index.meta['ivf']['nlist']} lists" if ivf else "flat"
+                print(f"{dtype} {layout}: built in {time.perf_counter() - start:.1f}s, {size / 2**20:.0f} MiB")
+                # Map chunk texts back to their original rows, since IVF reorders rows
+                original = np.array([int(index.context(row, 0.0)["text"].split()[1]) for row in range(index.count)])
+                for nprobe in args.nprobe if ivf else [0]:
+                    latencies, hits = [], 0
+                    for query, expected in zip(queries, truth):
+                        start = time.perf_counter()
+                        rows, _ = index.search_rows(query, args.top_k, distance_threshold=2.0, nprobe=nprobe)
+                        latencies.append(time.perf_counter() - start)
+                        hits += len(expected & set(original[rows].tolist()))
+                    label = f"{dtype} " + (f"ivf nprobe={nprobe}" if ivf else "flat")
+                    _report(label, latencies, hits / (args.top_k * len(queries)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Session load and append latency of the SQLite session service.
+
+Fills a fresh database with --sessions sessions of --events events each, then
+measures get_session and append_event on sessions picked at random: "hot" picks
+come from a working set that fits the in-memory LRU, "cold" picks from the
+whole population, and "restart" loads sessions with a new service instance, as
+after a Cloud Run restart.
+
+Usage:
+    python -m benchmarks.session_store [--sessions 100000] [--events 10]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from rag_agent.services.session_store import SqliteSessionService
+
+APP_NAME = "bench"
+
+
+def _event(author: str, text: str, **state) -> Event:
+    return Event(
+        author=author,
+        invocation_id="bench",
+        content=types.Content(role="user" if author == "user" else "model", parts=[types.Part(text=text)]),
+        actions=EventActions(state_delta=state),
+    )
+
+
+def _populate(path: str, sessions: int, events: int) -> None:
+    """Write the sessions straight into the tables, as the service would."""
+    service = SqliteSessionService(path)
+    conn = service._conn
+    now = time.time()
+    with conn:
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO sessions (app_name, user_id, id, state, last_update_time, version) VALUES (?, ?, ?, ?, ?, ?)",
+            ((APP_NAME, f"user-{i % 1000}", f"s{i}", '{"current_corpus": "docs"}', now, events) for i in range(sessions)),
+        )
+        payloads = [
+            _event("user" if j % 2 == 0 else "rag_agent", "lorem ipsum dolor sit amet " * 8).model_dump_json(exclude_none=True)
+            for j in range(events)
+        ]
+        conn.executemany(
+            "INSERT INTO events (app_name, user_id, session_id, timestamp, event) VALUES (?, ?, ?, ?, ?)",
+            ((APP_NAME, f"user-{i % 1000}", f"s{i}", now, payloads[j]) for i in range(sessions) for j in range(events)),
+        )
+
+
+def _report(label: str, latencies: list) -> None:
+    ordered = sorted(latencies)
+    p50 = statistics.median(ordered)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:<18} p50={p50 * 1000:7.3f} ms  p99={p99 * 1000:7.3f} ms  max={ordered[-1] * 1000:7.3f} ms")
+
+
+async def _measure(service: SqliteSessionService, picks: list, append: bool) -> tuple:
+    loads, appends = [], []
+    for i in picks:
+        key = dict(app_name=APP_NAME, user_id=f"user-{i % 1000}", session_id=f"s{i}")
+        start = time.perf_counter()
+        session = await service.get_session(**key)
+        loads.append(time.perf_counter() - start)
+        if append:
+            start = time.perf_counter()
+            await service.append_event(session, _event("user", "what does the handbook say?", turn=len(session.events)))
+            appends.append(time.perf_counter() - start)
+    return loads, appends
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--events", type=int, default=10)
+    parser.add_argument("--operations", type=int, default=5000)
+    parser.add_argument("--cache-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.sqlite3")
+        start = time.perf_counter()
+        _populate(path, args.sessions, args.events)
+        print(f"{args.sessions} sessions x {args.events} events written in {time.perf_counter() - start:.1f}s "
+              f"({os.path.getsize(path) / 2**20:.0f} MiB)")
+
+        rng = random.Random(0)
+        working_set = rng.sample(range(args.sessions), min(args.cache_size // 2, args.sessions))
+        service = SqliteSessionService(path, cache_size=args.cache_size)
+
+        asyncio.run(_measure(service, working_set, append=False))  # warm the hot tier
+        loads, appends = asyncio.run(_measure(service, [rng.choice(working_set) for _ in range(args.operations)], True))
+        _report("load (hot)", loads)
+        _report("append (hot)", appends)
+
+        loads, appends = asyncio.run(_measure(service, [rng.randrange(args.sessions) for _ in range(args.operations)], True))
+        _report("load (cold)", loads)
+        _report("append (cold)", appends)
+        print(f"hot tier: {service.stats()}")
+
+        restarted = SqliteSessionService(path, cache_size=args.cache_size)
+        loads, _ = asyncio.run(_measure(restarted, [rng.randrange(args.sessions) for _ in range(args.operations)], False))
+        _report("load (restart)", loads)
+
+
+if __name__ == "__main__":
+    main()
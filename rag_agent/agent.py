@@ -1,12 +1,19 @@
 from google.adk.agents import Agent
 from google.genai import types
-from .tools.add_data import add_data
-from .tools.create_corpus import create_corpus
-from .tools.delete_corpus import delete_corpus
-from .tools.delete_document import delete_document
-from .tools.get_corpus_info import get_corpus_info
-from .tools.list_corpora import list_corpora
-from .tools.rag_query import rag_query
+from .tools.async_tools import (
+    add_data_async,
+    add_data_from_manifest_async,
+    create_corpus_async,
+    delete_corpus_async,
+    delete_document_async,
+    get_corpus_info_async,
+    list_corpora_async,
+    rag_query_async,
+)
+from .services.history_compaction import compact_history
+from .services.model_router import route_model
+from .tools.get_ingestion_status import get_ingestion_status
+from .tools.rag_query_multi import rag_query_multi
 
 # Define the Agent with Gemini 3 Pro and Thinking Config
 root_agent = Agent(
@@ -23,15 +30,22 @@ root_agent = Agent(
         )
     ),
     
+    # Async variants run the blocking Vertex AI calls off the event loop
     tools=[
-        rag_query,
-        list_corpora,
-        create_corpus,
-        add_data,
-        get_corpus_info,
-        delete_corpus,
-        delete_document,
+        rag_query_async,
+        rag_query_multi,
+        list_corpora_async,
+        create_corpus_async,
+        add_data_async,
+        add_data_from_manifest_async,
+        get_ingestion_status,
+        get_corpus_info_async,
+        delete_corpus_async,
+        delete_document_async,
     ],
+    # Picks the model tier for the request (MODEL_ROUTER_ENABLED), then keeps the
+    # history sent to the model within HISTORY_TOKEN_BUDGET
+    before_model_callback=[route_model, compact_history],
     instruction="""
 # 🧠 Vertex AI RAG Agent (Gemini 3 Powered)
 You are a helpful RAG agent that interacts with Vertex AI's document corpora.
@@ -39,8 +53,15 @@ You use Gemini 3's advanced reasoning to plan complex information retrieval task
 
 ## Your Capabilities
 1. **Query Documents**: Retrieve relevant information from document corpora.
+   When a question may be answered by several corpora, use `rag_query_multi` once
+   with all of them instead of calling `rag_query` for each corpus.
 2. **List/Manage Corpora**: Create, list, and delete corpora.
+   For an overview of a large corpus, call `get_corpus_info` with `summary=True`;
+   list files page by page only when individual files are needed.
 3. **Add Data**: Ingest documents from Google Drive or Storage.
+   For large folders or many files, call `add_data` with `background=True` and
+   report the returned job_id; use `get_ingestion_status` when asked about progress.
+   For a JSONL manifest listing many files, use `add_data_from_manifest`.
 
 ## Reasoning Strategy
 - When asked a complex question, use your thinking capability to plan the retrieval steps.
@@ -5,6 +5,7 @@ These settings are used by the various RAG tools.
 Vertex AI initialization is performed in the package's __init__.py
 """
 
+import json
 import os
 
 from dotenv import load_dotenv
@@ -24,3 +25,204 @@ DEFAULT_TOP_K = 3
 DEFAULT_DISTANCE_THRESHOLD = 0.5
 DEFAULT_EMBEDDING_MODEL = "publishers/google/models/text-embedding-005"
 DEFAULT_EMBEDDING_REQUESTS_PER_MIN = 1000
+
+# Local SQLite manifest of imported sources, so add_data only re-imports new or
+# changed files. Set to an empty string to import every path every time.
+INGESTION_MANIFEST_PATH = os.environ.get("INGESTION_MANIFEST_PATH", "/tmp/ingestion_manifest.sqlite3")
+
+# Background ingestion jobs (add_data with background=True): corpora importing
+# at the same time, and how long finished jobs can still be polled
+INGESTION_MAX_WORKERS = int(os.environ.get("INGESTION_MAX_WORKERS", "4"))
+INGESTION_JOB_RETENTION_SECONDS = int(os.environ.get("INGESTION_JOB_RETENTION_SECONDS", "3600"))
+# get_ingestion_status: failed paths listed with a job's summary, and the largest page of per-path detail
+INGESTION_STATUS_FAILED_SAMPLE = int(os.environ.get("INGESTION_STATUS_FAILED_SAMPLE", "20"))
+INGESTION_STATUS_MAX_PAGE_SIZE = int(os.environ.get("INGESTION_STATUS_MAX_PAGE_SIZE", "100"))
+
+# Sharded imports: sources per rag.import_files call and shards importing at once
+INGESTION_SHARD_SIZE = int(os.environ.get("INGESTION_SHARD_SIZE", "25"))
+INGESTION_SHARD_CONCURRENCY = int(os.environ.get("INGESTION_SHARD_CONCURRENCY", "4"))
+INGESTION_IMPORT_MAX_RETRIES = int(os.environ.get("INGESTION_IMPORT_MAX_RETRIES", "5"))
+# Embedding requests per minute divided among every import shard on this host. The
+# limiter is host-local: with several instances (e.g. Cloud Run), set it to the
+# project quota divided by the maximum instance count
+EMBEDDING_REQUESTS_PER_MIN_QUOTA = int(
+    os.environ.get("EMBEDDING_REQUESTS_PER_MIN_QUOTA", str(DEFAULT_EMBEDDING_REQUESTS_PER_MIN))
+)
+EMBEDDING_QUOTA_PATH = os.environ.get("EMBEDDING_QUOTA_PATH", "/tmp/embedding_quota.json")
+
+# Client-side chunking: plain-text GCS sources are chunked (DEFAULT_CHUNK_SIZE words,
+# DEFAULT_CHUNK_OVERLAP overlap) and deduplicated across the corpus before upload
+CLIENT_CHUNKING_ENABLED = os.environ.get("CLIENT_CHUNKING_ENABLED", "false").lower() == "true"
+CLIENT_CHUNKING_EXTENSIONS = tuple(
+    os.environ.get("CLIENT_CHUNKING_EXTENSIONS", ".txt,.md,.csv,.json,.jsonl,.html,.htm,.xml").split(",")
+)
+CHUNK_DEDUP_PATH = os.environ.get("CHUNK_DEDUP_PATH", "/tmp/chunk_dedup.sqlite3")
+# Estimated Jaccard similarity of word shingles at which a chunk is a near duplicate
+CHUNK_DEDUP_THRESHOLD = float(os.environ.get("CHUNK_DEDUP_THRESHOLD", "0.85"))
+CHUNK_MINHASH_PERMUTATIONS = 128
+CHUNK_MINHASH_BANDS = 32
+
+# Multi-corpus retrieval (rag_query_multi): "rrf" or "normalized" score fusion
+DEFAULT_FUSION_METHOD = "rrf"
+DEFAULT_MULTI_CORPUS_TIMEOUT_SECONDS = 10
+
+# Corpus directory cache (shared by all tools in the process)
+CORPUS_CACHE_TTL_SECONDS = 60
+
+# RagFile listing: files per request when walking a whole corpus, and the page
+# sizes get_corpus_info returns to the model
+RAG_FILES_PAGE_SIZE = 1000
+CORPUS_INFO_DEFAULT_PAGE_SIZE = 50
+CORPUS_INFO_MAX_PAGE_SIZE = 200
+
+# Thread pool that runs the blocking Vertex AI SDK calls made by the async tools
+TOOL_EXECUTOR_MAX_WORKERS = int(os.environ.get("TOOL_EXECUTOR_MAX_WORKERS", "16"))
+
+# Audit ledger signing key (Cloud KMS)
+LEDGER_KEY_RING = "cloud-run-signer-keyring"
+LEDGER_KEY_NAME = "adk-rag-agent-signer"
+
+# Audit ledger group commit: a batch is written once it holds LEDGER_BATCH_SIZE
+# entries or LEDGER_BATCH_LATENCY_MS after its first entry was queued
+LEDGER_BATCH_SIZE = int(os.environ.get("LEDGER_BATCH_SIZE", "50"))
+LEDGER_BATCH_LATENCY_MS = int(os.environ.get("LEDGER_BATCH_LATENCY_MS", "50"))
+# "entry" signs every entry with KMS; "merkle" signs one Merkle root per batch
+LEDGER_SIGNING_MODE = os.environ.get("LEDGER_SIGNING_MODE", "entry")
+# Bounded audit queue; when full, "block" waits, "spill" writes to the journal, "shed" drops
+LEDGER_QUEUE_SIZE = int(os.environ.get("LEDGER_QUEUE_SIZE", "1000"))
+LEDGER_OVERFLOW_POLICY = os.environ.get("LEDGER_OVERFLOW_POLICY", "spill")
+LEDGER_JOURNAL_PATH = os.environ.get("LEDGER_JOURNAL_PATH", "/tmp/audit_ledger_journal.jsonl")
+# Cloud Run allows 10 seconds between SIGTERM and SIGKILL
+LEDGER_SHUTDOWN_TIMEOUT_SECONDS = float(os.environ.get("LEDGER_SHUTDOWN_TIMEOUT_SECONDS", "8"))
+
+# Retrieval result cache for rag_query (per process). Corpus versions are also
+# per process: with several workers or instances, a change made through one is
+# only seen by the others' caches after RETRIEVAL_CACHE_TTL_SECONDS
+RETRIEVAL_CACHE_ENABLED = os.environ.get("RETRIEVAL_CACHE_ENABLED", "false").lower() == "true"
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.environ.get("RETRIEVAL_CACHE_MAX_ENTRIES", "1000"))
+RETRIEVAL_CACHE_MAX_BYTES = int(os.environ.get("RETRIEVAL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RETRIEVAL_CACHE_TTL_SECONDS = int(os.environ.get("RETRIEVAL_CACHE_TTL_SECONDS", "300"))
+
+# Semantic (paraphrase) cache in front of rag_query; "hashing" embeds offline,
+# "vertex" uses DEFAULT_EMBEDDING_MODEL
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_EMBEDDER = os.environ.get("SEMANTIC_CACHE_EMBEDDER", "hashing")
+# The hashing embedder only compares words and trigrams, so it needs a stricter threshold
+SEMANTIC_CACHE_THRESHOLD = float(
+    os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95" if SEMANTIC_CACHE_EMBEDDER == "hashing" else "0.9")
+)
+SEMANTIC_CACHE_CAPACITY = int(os.environ.get("SEMANTIC_CACHE_CAPACITY", "2000"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+SEMANTIC_CACHE_PATH = os.environ.get("SEMANTIC_CACHE_PATH", "")
+
+# /batch endpoint
+BATCH_DEFAULT_CONCURRENCY = int(os.environ.get("BATCH_DEFAULT_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "64"))
+BATCH_ITEM_TIMEOUT_SECONDS = float(os.environ.get("BATCH_ITEM_TIMEOUT_SECONDS", "120"))
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "10000"))
+
+# Session storage: "memory" (lost on restart) or "sqlite" (SESSION_DB_PATH, put
+# it on a persistent volume) with the SESSION_CACHE_SIZE most recently used
+# sessions kept in memory
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", "/tmp/sessions.sqlite3")
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "1000"))
+
+# History compaction (before each model call): once the estimated prompt exceeds
+# HISTORY_TOKEN_BUDGET, older turns' tool results are trimmed to citations and,
+# if still over, summarized; the last HISTORY_KEEP_RECENT_TURNS turns stay verbatim
+HISTORY_COMPACTION_ENABLED = os.environ.get("HISTORY_COMPACTION_ENABLED", "true").lower() == "true"
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "16000"))
+HISTORY_KEEP_RECENT_TURNS = int(os.environ.get("HISTORY_KEEP_RECENT_TURNS", "4"))
+HISTORY_SUMMARY_TOKEN_BUDGET = int(os.environ.get("HISTORY_SUMMARY_TOKEN_BUDGET", "2000"))
+
+# Model routing (before each model call): picks a tier (model + thinking level)
+# per request from the prompt's length, wording and the tools it likely needs.
+# MODEL_ROUTER_POLICY (env, JSON) overrides keys of the policy below.
+MODEL_ROUTER_ENABLED = os.environ.get("MODEL_ROUTER_ENABLED", "false").lower() == "true"
+MODEL_ROUTER_POLICY = {
+    "tiers": {
+        "fast": {"model": "gemini-3-flash-preview", "thinking_level": "MINIMAL"},
+        "standard": {"model": "gemini-3-pro-preview", "thinking_level": "LOW"},
+        "deep": {"model": "gemini-3-pro-preview", "thinking_level": "HIGH"},
+    },
+    "default_tier": "standard",
+    # Management commands answered from a single tool result
+    "fast_patterns": [
+        r"^\s*(?:please\s+)?(?:list|show|get|display|delete|remove|create|make)\b",
+        r"\b(?:ingestion|import|job)\s+(?:status|progress)\b",
+        r"\b(?:status|progress)\s+of\b.{0,30}\b(?:ingestion|import|job)\b",
+        r"\bwhat\s+corpora\b",
+    ],
+    # Wording that asks for reasoning over the retrieved content
+    "deep_patterns": [
+        r"\b(?:compare|comparison|contrast|difference|differences|why|explain|analy[sz]e|evaluate|trade-?offs?|pros and cons|step by step)\b",
+    ],
+    # Keywords hinting at each tool; several distinct tools means a multi-step plan
+    "tool_keywords": {
+        "rag_query": ["what", "how", "find", "search", "according", "policy", "say", "says"],
+        "list_corpora": ["corpora", "corpuses"],
+        "create_corpus": ["create", "new corpus"],
+        "add_data": ["add", "import", "ingest", "upload"],
+        "get_corpus_info": ["files", "documents", "info", "details"],
+        "delete": ["delete", "remove"],
+    },
+    "fast_max_chars": 120,
+    "deep_min_chars": 600,
+    "deep_min_tools": 3,
+}
+MODEL_ROUTER_POLICY.update(json.loads(os.environ.get("MODEL_ROUTER_POLICY", "{}")))
+
+# /chat fast path: unambiguous management commands ("list corpora", "show files
+# in X", ...) call the tool directly and skip the model
+FAST_PATH_ENABLED = os.environ.get("FAST_PATH_ENABLED", "false").lower() == "true"
+
+# Whole-answer cache for /chat (per process): answers grounded only in rag_query /
+# rag_query_multi results, keyed by normalized prompt and agent configuration and
+# invalidated when one of their corpora changes
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+ANSWER_CACHE_MAX_BYTES = int(os.environ.get("ANSWER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+# Local vector mirror: corpora listed in LOCAL_VECTOR_CORPORA (display or resource
+# names, comma-separated, or "*") are mirrored into memory-mapped arrays and
+# queried locally instead of with rag.retrieval_query. Only corpora whose files
+# are all plain-text GCS sources can be mirrored; the others stay remote.
+LOCAL_VECTOR_CORPORA = [name.strip() for name in os.environ.get("LOCAL_VECTOR_CORPORA", "").split(",") if name.strip()]
+LOCAL_VECTOR_INDEX_DIR = os.environ.get("LOCAL_VECTOR_INDEX_DIR", "/tmp/local_vector_index")
+LOCAL_VECTOR_INDEX_DTYPE = os.environ.get("LOCAL_VECTOR_INDEX_DTYPE", "float16")  # "float16" or "int8"
+# "vertex" (DEFAULT_EMBEDDING_MODEL) or "hashing" (no API calls, lexical only)
+LOCAL_VECTOR_INDEX_EMBEDDER = os.environ.get("LOCAL_VECTOR_INDEX_EMBEDDER", "vertex")
+LOCAL_VECTOR_INDEX_REVALIDATE_SECONDS = int(os.environ.get("LOCAL_VECTOR_INDEX_REVALIDATE_SECONDS", "300"))
+# Mirrors with at least this many chunks are partitioned (IVF); queries scan
+# the LOCAL_VECTOR_IVF_NPROBE partitions closest to the query
+LOCAL_VECTOR_IVF_MIN_VECTORS = int(os.environ.get("LOCAL_VECTOR_IVF_MIN_VECTORS", "20000"))
+LOCAL_VECTOR_IVF_NPROBE = int(os.environ.get("LOCAL_VECTOR_IVF_NPROBE", "8"))
+
+# Hybrid retrieval: a local BM25 index over each corpus' plain-text GCS sources
+# is searched next to the vector lookup. Results are ranked by
+# (1 - HYBRID_LEXICAL_WEIGHT) * vector similarity + HYBRID_LEXICAL_WEIGHT * normalized BM25
+HYBRID_RETRIEVAL_ENABLED = os.environ.get("HYBRID_RETRIEVAL_ENABLED", "false").lower() == "true"
+LEXICAL_INDEX_DIR = os.environ.get("LEXICAL_INDEX_DIR", "/tmp/lexical_index")
+# A corpus whose index build failed is not re-indexed for this long (unless it changes)
+LEXICAL_INDEX_RETRY_SECONDS = int(os.environ.get("LEXICAL_INDEX_RETRY_SECONDS", "300"))
+HYBRID_LEXICAL_WEIGHT = float(os.environ.get("HYBRID_LEXICAL_WEIGHT", "0.3"))
+
+# Two-stage retrieval: rag_query over-fetches RERANK_OVERFETCH_FACTOR x top_k
+# candidates and keeps the top_k by RERANK_SCORER ("features": BM25 over the
+# candidates, query-term coverage, phrase matches and first-stage rank)
+RERANK_ENABLED = os.environ.get("RERANK_ENABLED", "false").lower() == "true"
+RERANK_OVERFETCH_FACTOR = int(os.environ.get("RERANK_OVERFETCH_FACTOR", "4"))
+RERANK_SCORER = os.environ.get("RERANK_SCORER", "features")
+RERANK_FEATURE_WEIGHTS = {"bm25": 0.3, "coverage": 0.3, "phrase": 0.2, "first_stage": 0.2}
+RERANK_FEATURE_WEIGHTS.update(json.loads(os.environ.get("RERANK_FEATURE_WEIGHTS", "{}")))
+
+# Context packing for the model: rag_query / rag_query_multi results are
+# de-overlapped, ordered by maximal marginal relevance (CONTEXT_MMR_LAMBDA
+# weighs relevance against diversity) and cut to CONTEXT_TOKEN_BUDGET estimated
+# tokens, in a compact form that lists each source once
+CONTEXT_PACKING_ENABLED = os.environ.get("CONTEXT_PACKING_ENABLED", "false").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MMR_LAMBDA = float(os.environ.get("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_MIN_OVERLAP_WORDS = int(os.environ.get("CONTEXT_MIN_OVERLAP_WORDS", "8"))
@@ -2,10 +2,17 @@ import logging
 import uuid
 import os
 import importlib
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 # --- ADK Imports ---
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
@@ -26,19 +33,78 @@ except ImportError:
 
 # --- Internal Imports ---
 from .agent import root_agent
+from .tools.async_tools import run_blocking
+from .tools.delete_document import delete_document
+from .tools.get_corpus_info import get_corpus_info
+from .tools.get_ingestion_status import get_ingestion_status
+from .tools.list_corpora import list_corpora
+from .tools.rag_query import retrieve_contexts
+from .tools.utils import (
+    check_corpus_exists,
+    corpus_versions_snapshot,
+    get_corpus_resource_name,
+    get_corpus_version,
+)
+from .config import (
+    BATCH_DEFAULT_CONCURRENCY,
+    HISTORY_COMPACTION_ENABLED,
+    HISTORY_KEEP_RECENT_TURNS,
+    HISTORY_TOKEN_BUDGET,
+    BATCH_ITEM_TIMEOUT_SECONDS,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_MAX_ITEMS,
+    LEDGER_BATCH_LATENCY_MS,
+    LEDGER_BATCH_SIZE,
+    LEDGER_JOURNAL_PATH,
+    LEDGER_KEY_NAME,
+    LEDGER_KEY_RING,
+    LEDGER_OVERFLOW_POLICY,
+    LEDGER_QUEUE_SIZE,
+    LEDGER_SHUTDOWN_TIMEOUT_SECONDS,
+    LEDGER_SIGNING_MODE,
+    MODEL_ROUTER_ENABLED,
+    MODEL_ROUTER_POLICY,
+    SEMANTIC_CACHE_PATH,
+)
+from .services.answer_cache import agent_fingerprint, answer_cache, cited_corpora
 from .services.audit_ledger import AuditLedger
+from .services.batch import run_batch
+from .services.chunking import chunk_deduplicator
+from .services.context_packing import context_packer
+from .services.fast_path import fast_path
+from .services.ingestion_jobs import ingestion_jobs
+from .services.ledger_verifier import verify_chain
+from .services.lexical_index import lexical_index
+from .services.local_vector_index import local_vector_indexes
+from .services.model_router import model_router
+from .services.rate_limiter import embedding_quota
+from .services.reranker import reranker
+from .services.retrieval_cache import retrieval_cache
+from .services.semantic_cache import semantic_cache
+from .services.session_store import session_store
 
 # --- Logging Setup ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Starts the audit ledger workers and drains them on shutdown."""
+    if ledger:
+        await ledger.start()
+    yield
+    if ledger:
+        await ledger.shutdown(timeout=LEDGER_SHUTDOWN_TIMEOUT_SECONDS)
+    if semantic_cache and SEMANTIC_CACHE_PATH:
+        await asyncio.to_thread(semantic_cache.save, SEMANTIC_CACHE_PATH)
+
+app = FastAPI(lifespan=lifespan)
 
 # --- CONFIGURATION ---
 PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT")
 LOCATION = os.environ.get("GOOGLE_CLOUD_LOCATION", "us-central1")
-KEY_RING = "cloud-run-signer-keyring"
-KEY_NAME = "adk-rag-agent-signer"
+KEY_RING = LEDGER_KEY_RING
+KEY_NAME = LEDGER_KEY_NAME
 APP_NAME = "adk-rag-agent"  # Required by ADK Runner for telemetry
 
 # --- SERVICE INITIALIZATION ---
@@ -49,15 +115,21 @@ try:
         project_id=PROJECT_ID,
         location=LOCATION,
         key_ring=KEY_RING,
-        key_name=KEY_NAME
+        key_name=KEY_NAME,
+        batch_size=LEDGER_BATCH_SIZE,
+        batch_latency_ms=LEDGER_BATCH_LATENCY_MS,
+        signing_mode=LEDGER_SIGNING_MODE,
+        queue_size=LEDGER_QUEUE_SIZE,
+        overflow_policy=LEDGER_OVERFLOW_POLICY,
+        journal_path=LEDGER_JOURNAL_PATH
     )
     logger.info("✅ Secure Audit Ledger initialized.")
 except Exception as e:
     logger.error(f"❌ Failed to initialize Audit Ledger (Check Credentials): {e}")
     ledger = None
 
-# 2. Initialize Short-Term Memory (Session)
-session_service = InMemorySessionService()
+# 2. Initialize Short-Term Memory (Session): SQLite-backed when SESSION_BACKEND=sqlite
+session_service = session_store or InMemorySessionService()
 
 # 3. Initialize Long-Term Memory (Vertex AI RAG)
 # FIXED: Using 'project' instead of 'project_id' to match library spec
@@ -81,6 +153,241 @@ runner = Runner(
     app_name=APP_NAME
 )
 
+# Cached answers are only served to the agent configuration that produced them
+AGENT_FINGERPRINT = agent_fingerprint(
+    root_agent,
+    MODEL_ROUTER_POLICY if MODEL_ROUTER_ENABLED else None,
+    (HISTORY_TOKEN_BUDGET, HISTORY_KEEP_RECENT_TURNS) if HISTORY_COMPACTION_ENABLED else None,
+)
+
+# Only one chain verification runs at a time per instance
+verify_lock = asyncio.Lock()
+
+# --- HELPERS ---
+
+async def _ensure_session(user_id: str, session_id: str):
+    """Creates the session on first use so clients can pick their own session_id."""
+    session = await session_service.get_session(
+        app_name=APP_NAME, user_id=user_id, session_id=session_id
+    )
+    if session is None:
+        session = await session_service.create_session(
+            app_name=APP_NAME, user_id=user_id, session_id=session_id
+        )
+    return session
+
+async def _run_agent(user_input: str, session_id: str, user_id: str, tool_calls: Optional[list] = None) -> str:
+    """
+    Runs the agent to completion and returns the concatenated model text.
+    If `tool_calls` is given, {"name", "args", "status"} of every tool call is appended to it.
+    """
+    await _ensure_session(user_id, session_id)
+    user_msg = types.Content(role="user", parts=[types.Part.from_text(text=user_input)])
+    final_response_text = ""
+    calls = {}
+
+    async for event in runner.run_async(
+        session_id=session_id,
+        user_id=user_id,
+        new_message=user_msg
+    ):
+        for call in event.get_function_calls():
+            calls[call.id] = {"name": call.name, "args": dict(call.args or {}), "status": None}
+        for result in event.get_function_responses():
+            if result.id in calls and isinstance(result.response, dict):
+                calls[result.id]["status"] = result.response.get("status")
+        if event.content and event.content.parts and event.author != "user":
+            for part in event.content.parts:
+                if part.text and not part.thought:
+                    final_response_text += part.text
+
+    if not final_response_text:
+        final_response_text = "The agent processed the request but returned no text content."
+    if tool_calls is not None:
+        tool_calls.extend(calls.values())
+    return final_response_text
+
+async def _record_exchange(user_input: str, response_text: str, session_id: str, user_id: str, source: str):
+    """Adds a prompt and an answer produced without the agent to the session, so follow-ups have them."""
+    session = await _ensure_session(user_id, session_id)
+    invocation_id = f"{source}-{uuid.uuid4().hex}"
+    for author, role, text in (("user", "user", user_input), (root_agent.name, "model", response_text)):
+        await session_service.append_event(session, Event(
+            invocation_id=invocation_id,
+            author=author,
+            content=types.Content(role=role, parts=[types.Part.from_text(text=text)]),
+        ))
+
+async def _cacheable_corpus_versions(tool_calls: list, versions_before: dict) -> Optional[dict]:
+    """
+    The versions of the corpora an answer was retrieved from, as they were before
+    the run (from corpus_versions_snapshot), or None if it must not be cached.
+    A corpus that changed during the run therefore makes the entry stale at once.
+    """
+    corpora = cited_corpora(tool_calls)
+    if corpora is None:
+        return None
+    resource_names = await asyncio.gather(*(run_blocking(get_corpus_resource_name, name) for name in corpora))
+    return {name: versions_before.get(name, 0) for name in resource_names}
+
+async def _is_first_turn(user_id: str, session_id: str) -> bool:
+    """Whether a session has no history yet, so an answer cannot depend on earlier turns."""
+    session = await session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    return session is None or not session.events
+
+# Tool behind each fast-path intent, called with the matched arguments and a tool context
+FAST_PATH_TOOLS = {
+    "list_corpora": lambda args, tool_context: list_corpora(),
+    "list_files": lambda args, tool_context: get_corpus_info(args["corpus"], tool_context),
+    "corpus_summary": lambda args, tool_context: get_corpus_info(args["corpus"], tool_context, summary=True),
+    "delete_document": lambda args, tool_context: delete_document(args["corpus"], args["document_id"], tool_context),
+    "ingestion_status": lambda args, tool_context: get_ingestion_status(args["job_id"], tool_context),
+}
+
+async def _try_fast_path(user_input: str, session_id: str, user_id: str):
+    """
+    Answers an unambiguous management command without the model.
+    Returns (intent, response text), or None to fall back to the agent.
+    """
+    if fast_path is None:
+        return None
+    match = fast_path.match(user_input)
+    if match is None:
+        return None
+
+    # Existence flags are only needed for this call, so a throwaway state is enough
+    tool_context = type("FastPathToolContext", (), {"state": {}})()
+    result = await run_blocking(FAST_PATH_TOOLS[match.intent], match.args, tool_context)
+    response_text = fast_path.render(match, result)
+    if response_text is None:
+        return None
+
+    await _record_exchange(user_input, response_text, session_id, user_id, "fast-path")
+    return match.intent, response_text
+
+def _sse(event: str, data: dict) -> str:
+    """Formats one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _wants_event_stream(request: Request) -> bool:
+    return "text/event-stream" in request.headers.get("accept", "")
+
+async def _json_object(request: Request) -> Optional[dict]:
+    """The request body as a JSON object, or None if it is not one."""
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+async def _stream_agent_run(user_input: str, session_id: str, user_id: str):
+    """
+    Runs the agent in SSE streaming mode and yields frames as they are produced:
+    `start`, `token` (partial text), `tool_call` / `tool_result`, then a final
+    `done` summary (or `error`).
+    """
+    started = time.perf_counter()
+    first_token_ms = None
+    final_response_text = ""
+    tool_calls = []
+    # In SSE mode the model's partial chunks are followed by one aggregated
+    # (non-partial) event repeating the same text, which must not be re-sent.
+    streamed_partial_text = False
+
+    yield _sse("start", {
+        "agent_name": root_agent.name,
+        "session_id": session_id,
+        "user_id": user_id
+    })
+
+    try:
+        fast = await _try_fast_path(user_input, session_id, user_id)
+        if fast:
+            intent, final_response_text = fast
+            yield _sse("token", {"text": final_response_text})
+            if ledger:
+                await ledger.log_action(
+                    action="agent_response_generated",
+                    payload={"response_preview": final_response_text[:200], "session_id": session_id,
+                             "streamed": True, "fast_path": intent},
+                    user_id=user_id
+                )
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            yield _sse("done", {
+                "response": final_response_text,
+                "agent_name": root_agent.name,
+                "session_id": session_id,
+                "user_id": user_id,
+                "tool_calls": [],
+                "fast_path": intent,
+                "time_to_first_token_ms": duration_ms,
+                "duration_ms": duration_ms
+            })
+            return
+
+        await _ensure_session(user_id, session_id)
+        user_msg = types.Content(role="user", parts=[types.Part.from_text(text=user_input)])
+
+        async for event in runner.run_async(
+            session_id=session_id,
+            user_id=user_id,
+            new_message=user_msg,
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE)
+        ):
+            if not event.content or not event.content.parts:
+                continue
+
+            if not event.partial:
+                for call in event.get_function_calls():
+                    tool_calls.append(call.name)
+                    yield _sse("tool_call", {"id": call.id, "name": call.name, "args": call.args})
+                for result in event.get_function_responses():
+                    status = result.response.get("status") if isinstance(result.response, dict) else None
+                    yield _sse("tool_result", {"id": result.id, "name": result.name, "status": status})
+
+            if event.author == "user":
+                continue
+
+            text = "".join(part.text for part in event.content.parts if part.text and not part.thought)
+            if event.partial:
+                streamed_partial_text = True
+            elif streamed_partial_text:
+                # Aggregate of chunks we already streamed
+                streamed_partial_text = False
+                continue
+
+            if text:
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                final_response_text += text
+                yield _sse("token", {"text": text})
+
+        if not final_response_text:
+            final_response_text = "The agent processed the request but returned no text content."
+
+        if ledger:
+            await ledger.log_action(
+                action="agent_response_generated",
+                payload={"response_preview": final_response_text[:200], "session_id": session_id, "streamed": True},
+                user_id=user_id
+            )
+
+        yield _sse("done", {
+            "response": final_response_text,
+            "agent_name": root_agent.name,
+            "session_id": session_id,
+            "user_id": user_id,
+            "tool_calls": tool_calls,
+            "time_to_first_token_ms": first_token_ms,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+
+    except Exception as e:
+        logger.error(f"❌ Agent Streaming Error: {str(e)}")
+        if ledger:
+            await ledger.log_action(action="agent_error", payload={"error": str(e), "streamed": True}, user_id=user_id)
+        yield _sse("error", {"error": str(e)})
+
 # --- ENDPOINTS ---
 
 @app.get("/")
@@ -90,12 +397,34 @@ async def root():
         "status": "running", 
         "service": APP_NAME, 
         "memory_bank": "active" if memory_service else "disabled",
-        "audit_ledger": "active" if ledger else "disabled"
+        "audit_ledger": "active" if ledger else "disabled",
+        "audit_queue": ledger.stats() if ledger else None
+    }
+
+@app.get("/stats")
+async def stats():
+    """Cache and fast-path counters for this instance."""
+    return {
+        "retrieval_cache": retrieval_cache.stats() if retrieval_cache else "disabled",
+        "semantic_cache": semantic_cache.stats() if semantic_cache else "disabled",
+        "embedding_quota": embedding_quota.stats(),
+        "chunk_dedup": chunk_deduplicator.stats() if chunk_deduplicator else "disabled",
+        "session_store": session_store.stats() if session_store else "memory",
+        "model_router": model_router.stats() if model_router else "disabled",
+        "fast_path": fast_path.stats() if fast_path else "disabled",
+        "answer_cache": answer_cache.stats() if answer_cache else "disabled",
+        "local_vector_index": local_vector_indexes.stats() if local_vector_indexes else "disabled",
+        "lexical_index": lexical_index.stats() if lexical_index else "disabled",
+        "reranker": reranker.stats() if reranker else "disabled",
+        "context_packing": context_packer.stats() if context_packer else "disabled"
     }
 
 @app.post("/chat")
 async def chat(request: Request, background_tasks: BackgroundTasks):
-    """Primary Agent Endpoint."""
+    """Primary Agent Endpoint. Streams SSE frames when the client sends `Accept: text/event-stream`."""
+    if _wants_event_stream(request):
+        return await chat_stream(request)
+
     try:
         body = await request.json()
         user_input = body.get("prompt") or body.get("message")
@@ -107,33 +436,60 @@ async def chat(request: Request, background_tasks: BackgroundTasks):
         
         logger.info(f"▶️ Run | User: {user_id} | Session: {session_id}")
 
+        # Answers to repeated prompts are served from the answer cache unless the body says "cache": false.
+        # Only first turns are cached: a follow-up's answer depends on the conversation before it.
+        cache_status = "disabled"
+        final_response_text = None
+        if answer_cache:
+            if body.get("cache", True) is False:
+                answer_cache.record_bypass()
+                cache_status = "bypass"
+            elif not await _is_first_turn(user_id, session_id):
+                answer_cache.record_follow_up()
+                cache_status = "follow_up"
+            else:
+                final_response_text = answer_cache.get(AGENT_FINGERPRINT, user_input, get_corpus_version)
+                cache_status = "hit" if final_response_text is not None else "miss"
+        cached = cache_status == "hit"
+
         if ledger:
-            ledger.log_action(
+            payload = {"prompt": user_input, "session_id": session_id}
+            if cached:
+                payload["cached"] = True
+            await ledger.log_action(
                 action="user_query_received",
-                payload={"prompt": user_input, "session_id": session_id},
+                payload=payload,
                 user_id=user_id
             )
-        
-        user_msg = types.Content(role="user", parts=[types.Part.from_text(text=user_input)])
-        final_response_text = ""
-        
-        async for event in runner.run_async(
-            session_id=session_id, 
-            user_id=user_id, 
-            new_message=user_msg
-        ):
-            if hasattr(event, 'content') and event.content and event.source == "model":
-                 for part in event.content.parts:
-                     if part.text:
-                         final_response_text += part.text
 
-        if not final_response_text:
-            final_response_text = "The agent processed the request but returned no text content."
+        intent = None
+        if cached:
+            await _record_exchange(user_input, final_response_text, session_id, user_id, "answer-cache")
+        else:
+            # Unambiguous management commands skip the model
+            fast = await _try_fast_path(user_input, session_id, user_id)
+            if fast:
+                intent, final_response_text = fast
+            else:
+                started = time.perf_counter()
+                tool_calls = []
+                versions_before = corpus_versions_snapshot()
+                final_response_text = await _run_agent(user_input, session_id, user_id, tool_calls)
+                if cache_status == "miss":
+                    corpus_versions = await _cacheable_corpus_versions(tool_calls, versions_before)
+                    if corpus_versions is not None:
+                        answer_cache.put(AGENT_FINGERPRINT, user_input, final_response_text, corpus_versions,
+                                         miss_seconds=time.perf_counter() - started)
 
         if ledger:
-            ledger.log_action(
+            payload = {"response_preview": final_response_text[:200], "session_id": session_id}
+            if intent:
+                payload["fast_path"] = intent
+            if cached:
+                payload["cached"] = True
+            await ledger.log_action(
                 action="agent_response_generated",
-                payload={"response_preview": final_response_text[:200], "session_id": session_id},
+                payload=payload,
                 user_id=user_id
             )
 
@@ -141,11 +497,195 @@ async def chat(request: Request, background_tasks: BackgroundTasks):
             "response": final_response_text, 
             "agent_name": root_agent.name,
             "session_id": session_id,
-            "user_id": user_id
+            "user_id": user_id,
+            "fast_path": intent,
+            "cache": cache_status
         }
 
     except Exception as e:
         logger.error(f"❌ Agent Execution Error: {str(e)}")
         if ledger:
-            ledger.log_action(action="agent_error", payload={"error": str(e)}, user_id=user_id)
+            await ledger.log_action(action="agent_error", payload={"error": str(e)}, user_id=user_id)
         return JSONResponse({"error": str(e)}, status_code=500)
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request):
+    """Streaming Agent Endpoint (Server-Sent Events)."""
+    body = await _json_object(request)
+    if body is None:
+        return JSONResponse({"error": "Request body must be a JSON object"}, status_code=400)
+    user_input = body.get("prompt") or body.get("message")
+    session_id = body.get("session_id") or str(uuid.uuid4())
+    user_id = body.get("user_id") or "default_user"
+
+    if not user_input:
+        return JSONResponse({"error": "No prompt provided"}, status_code=400)
+
+    logger.info(f"▶️ Stream | User: {user_id} | Session: {session_id}")
+
+    if ledger:
+        await ledger.log_action(
+            action="user_query_received",
+            payload={"prompt": user_input, "session_id": session_id, "streamed": True},
+            user_id=user_id
+        )
+
+    return StreamingResponse(
+        _stream_agent_run(user_input, session_id, user_id),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/ingestion/{job_id}")
+async def ingestion_status(job_id: str):
+    """Progress of a background ingestion job started by add_data(background=True)."""
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": f"Ingestion job '{job_id}' not found"}, status_code=404)
+    return job.snapshot()
+
+@app.post("/audit/verify")
+async def audit_verify(full: bool = False):
+    """
+    Verifies the audit chain. Incremental by default (entries after the last
+    checkpoint); `?full=true` re-verifies everything.
+    """
+    if not ledger:
+        return JSONResponse({"error": "Audit ledger is disabled"}, status_code=503)
+    if verify_lock.locked():
+        return JSONResponse({"error": "A verification is already running"}, status_code=409)
+
+    async with verify_lock:
+        try:
+            report = await asyncio.to_thread(
+                verify_chain,
+                ledger.db,
+                ledger.kms_client,
+                ledger.key_name,
+                collection_name=ledger.collection_name,
+                full=full
+            )
+        except Exception as e:
+            logger.error(f"❌ Audit Verification Error: {str(e)}")
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+    return report
+
+async def _resolve_batch_corpora(corpus_names):
+    """
+    Resolves each distinct corpus name in a retrieval batch once, up front.
+    Returns {corpus_name: resource_name or None if it does not exist}.
+    """
+    # Existence flags are only needed for this batch, so a throwaway state is enough
+    batch_context = type("BatchToolContext", (), {"state": {}})()
+
+    async def resolve(name):
+        if not await run_blocking(check_corpus_exists, name, batch_context):
+            return name, None
+        return name, await run_blocking(get_corpus_resource_name, name)
+
+    return dict(await asyncio.gather(*(resolve(name) for name in corpus_names)))
+
+@app.post("/batch")
+async def batch(request: Request):
+    """
+    Batch Endpoint for evaluation and bulk Q&A.
+
+    Body:
+        mode: "agent" (full agent run per prompt) or "retrieval" (raw rag retrieval per query)
+        items: list of {"id", "prompt"} (agent) or {"id", "query", "corpus_name"} (retrieval);
+               plain strings are accepted as prompts / queries
+        corpus_name: default corpus for retrieval items
+        concurrency: items processed at the same time (capped by BATCH_MAX_CONCURRENCY)
+        item_timeout_seconds: per-item deadline
+
+    Streams one NDJSON line per item as it finishes, then a final {"summary": ...} line.
+    """
+    body = await _json_object(request)
+    if body is None:
+        return JSONResponse({"error": "Request body must be a JSON object"}, status_code=400)
+    mode = body.get("mode", "agent")
+    user_id = body.get("user_id") or "default_user"
+    items = [item if isinstance(item, dict) else {"prompt": item, "query": item} for item in body.get("items") or []]
+    try:
+        concurrency = max(1, min(int(body.get("concurrency", BATCH_DEFAULT_CONCURRENCY)), BATCH_MAX_CONCURRENCY))
+        item_timeout = float(body.get("item_timeout_seconds", BATCH_ITEM_TIMEOUT_SECONDS))
+    except (TypeError, ValueError):
+        return JSONResponse({"error": "concurrency and item_timeout_seconds must be numbers"}, status_code=400)
+    if not 0 < item_timeout < float("inf"):
+        return JSONResponse({"error": "item_timeout_seconds must be a positive number"}, status_code=400)
+
+    if mode not in ("agent", "retrieval"):
+        return JSONResponse({"error": "mode must be 'agent' or 'retrieval'"}, status_code=400)
+    if not items:
+        return JSONResponse({"error": "No items provided"}, status_code=400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return JSONResponse({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}, status_code=400)
+
+    batch_id = str(uuid.uuid4())
+    logger.info(f"▶️ Batch | User: {user_id} | {mode} | {len(items)} items | concurrency {concurrency}")
+
+    if ledger:
+        await ledger.log_action(
+            action="batch_received",
+            payload={"batch_id": batch_id, "mode": mode, "items": len(items), "concurrency": concurrency},
+            user_id=user_id
+        )
+
+    if mode == "retrieval":
+        default_corpus = body.get("corpus_name")
+        for item in items:
+            item.setdefault("corpus_name", default_corpus)
+        resource_names = await _resolve_batch_corpora({item["corpus_name"] for item in items if item["corpus_name"]})
+
+        async def handle(item):
+            corpus_name, query = item.get("corpus_name"), item.get("query")
+            if not query or not resource_names.get(corpus_name):
+                return {"status": "error", "error": f"Missing query or unknown corpus '{corpus_name}'"}
+            results, cache_source = await run_blocking(retrieve_contexts, resource_names[corpus_name], query)
+            return {"corpus_name": corpus_name, "results": results, "cache": cache_source or "miss"}
+    else:
+        async def handle(item):
+            prompt = item.get("prompt")
+            if not prompt:
+                return {"status": "error", "error": "No prompt provided"}
+            session_id = f"batch-{batch_id}-{uuid.uuid4().hex[:8]}"
+            if ledger:
+                await ledger.log_action(
+                    action="user_query_received",
+                    payload={"prompt": prompt, "session_id": session_id, "batch_id": batch_id},
+                    user_id=user_id
+                )
+            try:
+                response_text = await _run_agent(prompt, session_id, user_id)
+            finally:
+                # Batch sessions are single-turn; don't let them pile up
+                await session_service.delete_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+            if ledger:
+                await ledger.log_action(
+                    action="agent_response_generated",
+                    payload={"response_preview": response_text[:200], "session_id": session_id, "batch_id": batch_id},
+                    user_id=user_id
+                )
+            return {"response": response_text}
+
+    async def stream():
+        started = time.perf_counter()
+        counts = {}
+        async for result in run_batch(items, handle, concurrency, item_timeout):
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            yield json.dumps(result, default=str) + "\n"
+
+        summary = {
+            "batch_id": batch_id,
+            "mode": mode,
+            "items": len(items),
+            "counts": counts,
+            "duration_seconds": round(time.perf_counter() - started, 3)
+        }
+        if ledger:
+            await ledger.log_action(action="batch_completed", payload=summary, user_id=user_id)
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -0,0 +1,160 @@
+"""
+Whole-answer cache for repeated /chat prompts.
+
+FAQ-style prompts come back again and again, and each one costs a full agent
+loop (planning turn, retrieval, answer turn). The answer cache stores the
+final response text of an agent run under the normalized prompt and a
+fingerprint of the agent configuration (model, instruction, generation config,
+tools, routing policy), so a redeploy with a different agent never serves old
+answers.
+
+Only first turns of a session are looked up and stored, since a follow-up
+("what about the refund section?") means something different in every
+conversation. Only answers grounded purely in retrieval are stored: the run
+must have called rag_query / rag_query_multi on explicitly named corpora, all
+successfully, and no other tool. Each entry records the versions those corpora
+had when the run started; a lookup after add_data, delete_document or
+delete_corpus changed one of them, even during the run, is a miss. Entries are
+bounded by count and bytes (LRU) and expire after ANSWER_CACHE_TTL_SECONDS,
+which also bounds staleness across instances.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from ..config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_MAX_BYTES,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL_SECONDS,
+)
+from .retrieval_cache import RetrievalCache, normalize_query
+
+# Tools whose results an answer may depend on and still be cached
+RETRIEVAL_TOOLS = ("rag_query", "rag_query_multi")
+
+
+def agent_fingerprint(agent, *extra: Any) -> str:
+    """A short hash of everything about an agent that shapes its answers."""
+    config = agent.generate_content_config
+    description = {
+        "model": str(agent.model),
+        "instruction": str(agent.instruction),
+        "generate_content_config": config.model_dump(mode="json", exclude_none=True) if config else None,
+        "tools": sorted(getattr(tool, "__name__", None) or getattr(tool, "name", str(tool)) for tool in agent.tools),
+        "extra": extra,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def cited_corpora(tool_calls: Iterable[Dict[str, Any]]) -> Optional[List[str]]:
+    """
+    The corpus names an agent run retrieved from, or None if its answer must not
+    be cached (no retrieval, another tool, a failed call or an implicit corpus).
+
+    Args:
+        tool_calls: {"name", "args", "status"} for every tool call of the run
+    """
+    corpora: List[str] = []
+    for call in tool_calls:
+        if call["name"] not in RETRIEVAL_TOOLS or call["status"] not in ("success", "warning"):
+            return None
+        names = call["args"].get("corpus_names") if call["name"] == "rag_query_multi" else [call["args"].get("corpus_name")]
+        if not names or not all(isinstance(name, str) and name for name in names):
+            return None
+        corpora.extend(name for name in names if name not in corpora)
+    return corpora or None
+
+
+class AnswerCache:
+    """
+    Byte-bounded LRU of agent answers keyed by agent fingerprint and normalized prompt.
+
+    Args:
+        max_entries (int): Most answers kept
+        max_bytes (int): Most bytes of answers kept
+        ttl_seconds (float): Lifetime of an answer
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self._entries = RetrievalCache(max_entries, max_bytes, ttl_seconds)
+        self._lock = threading.Lock()
+        self.stale = 0
+        self.bypassed = 0
+        self.follow_ups = 0
+        self._stored = 0
+        self._stored_seconds_total = 0.0
+
+    @staticmethod
+    def _key(fingerprint: str, prompt: str) -> tuple:
+        return (fingerprint, normalize_query(prompt))
+
+    def get(self, fingerprint: str, prompt: str, corpus_version: Callable[[str], int]) -> Optional[str]:
+        """
+        The cached answer, or None if there is none or a corpus it depends on changed.
+
+        Args:
+            fingerprint (str): agent_fingerprint of the answering agent
+            prompt (str): The user prompt
+            corpus_version (Callable): Current version of a corpus resource name
+        """
+        entry = self._entries.get(self._key(fingerprint, prompt))
+        if entry is None:
+            return None
+        if any(corpus_version(corpus) != version for corpus, version in entry["corpus_versions"].items()):
+            with self._lock:
+                self.stale += 1
+            return None
+        return entry["response"]
+
+    def put(self, fingerprint: str, prompt: str, response: str,
+            corpus_versions: Dict[str, int], miss_seconds: float = 0.0) -> None:
+        """
+        Store an answer with the versions of the corpora it was retrieved from.
+
+        Args:
+            corpus_versions (Dict[str, int]): Corpus resource name -> version when the run started
+            miss_seconds (float): How long the agent run took
+        """
+        self._entries.put(self._key(fingerprint, prompt), {"response": response, "corpus_versions": corpus_versions})
+        with self._lock:
+            self._stored += 1
+            self._stored_seconds_total += miss_seconds
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def record_follow_up(self) -> None:
+        with self._lock:
+            self.follow_ups += 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._entries.stats()
+        with self._lock:
+            stale, bypassed, follow_ups = self.stale, self.bypassed, self.follow_ups
+            # Average agent run time of the answers that were stored
+            average_run = self._stored_seconds_total / self._stored if self._stored else 0.0
+        # A stale entry was found but not served
+        hits, misses = stats["hits"] - stale, stats["misses"] + stale
+        del stats["average_miss_ms"]
+        stats.update(
+            hits=hits,
+            misses=misses,
+            hit_rate=round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            average_agent_run_ms=round(average_run * 1000, 1),
+            estimated_seconds_saved=round(hits * average_run, 3),
+            stale=stale,
+            bypassed=bypassed,
+            follow_ups=follow_ups,
+        )
+        return stats
+
+
+answer_cache = AnswerCache(
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    max_bytes=ANSWER_CACHE_MAX_BYTES,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+) if ANSWER_CACHE_ENABLED else None
@@ -1,18 +1,93 @@
 import hashlib
 import json
 import asyncio
+import os
+import threading
 from datetime import datetime, timezone
+from google.api_core.exceptions import AlreadyExists
 from google.cloud import firestore
 from google.cloud import kms
+from .ledger_verifier import (
+    SIGNATURE_SCHEME_ENTRY,
+    SIGNATURE_SCHEME_MERKLE,
+    load_public_key,
+    verify_entry,
+)
+from .merkle import build_merkle_levels, merkle_proof, merkle_root
+
+GENESIS_HASH = "GENESIS_HASH"
+
+# Firestore rejects batched writes with more than 500 operations
+MAX_BATCH_SIZE = 500
+
+# What log_action does when the queue is full
+OVERFLOW_BLOCK = "block"   # wait for room (back-pressure on the request)
+OVERFLOW_SPILL = "spill"   # append the entry to the on-disk journal
+OVERFLOW_SHED = "shed"     # drop the entry and count it
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_SPILL, OVERFLOW_SHED)
 
 class AuditLedger:
-    def __init__(self, project_id, location, key_ring, key_name, version="1"):
+    """
+    Hash-chained, KMS-signed audit log stored in Firestore.
+
+    A single writer task owns the chain: it keeps the head hash and the next
+    sequence number in memory, drains queued entries and commits them in
+    Firestore batches. Each document ID is its zero-padded sequence number, so
+    a second writer (another instance) racing on the same head fails the
+    batch with AlreadyExists instead of forking the chain; the writer then
+    reconciles the head from storage and re-chains the batch.
+
+    With signing_mode="merkle" the writer signs one Merkle root per batch
+    instead of every entry; each entry stores its inclusion proof.
+
+    The queue is bounded (queue_size). When it is full, overflow_policy decides
+    whether log_action waits, spills the entry to a local JSONL journal, or
+    sheds it. Batches that fail to commit are spilled to the journal as well,
+    and a replay task feeds the journal back into the queue. shutdown() drains
+    the queue and the journal within a deadline.
+    """
+
+    def __init__(self, project_id, location, key_ring, key_name, version="1",
+                 batch_size=50, batch_latency_ms=50, signing_mode=SIGNATURE_SCHEME_ENTRY,
+                 queue_size=1000, overflow_policy=OVERFLOW_BLOCK, journal_path=None,
+                 journal_replay_interval=5.0):
+        if signing_mode not in (SIGNATURE_SCHEME_ENTRY, SIGNATURE_SCHEME_MERKLE):
+            raise ValueError(f"Unknown ledger signing mode: {signing_mode}")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown ledger overflow policy: {overflow_policy}")
+        if overflow_policy == OVERFLOW_SPILL and not journal_path:
+            raise ValueError("The 'spill' overflow policy requires a journal_path")
+
         self.db = firestore.Client(project=project_id)
         self.kms_client = kms.KeyManagementServiceClient()
         self.key_name = self.kms_client.crypto_key_version_path(
             project_id, location, key_ring, key_name, version
         )
         self.collection_name = "secure_audit_ledger"
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.batch_latency = batch_latency_ms / 1000
+        self.signing_mode = signing_mode
+        self._public_key = None
+
+        # Chain head, owned by the writer task
+        self._head_hash = None
+        self._next_sequence = None
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.journal_path = journal_path
+        self.journal_replay_interval = journal_replay_interval
+        self._journal_lock = threading.Lock()
+        self._queue = None
+        self._writer_task = None
+        self._replay_task = None
+        self._replay_lock = None
+        # Batch the writer is committing and the task committing it
+        self._in_flight = None
+
+        # Counters reported by stats()
+        self.committed_count = 0
+        self.spilled_count = 0
+        self.dropped_count = 0
 
     def _calculate_hash(self, data_string):
         return hashlib.sha256(data_string.encode()).hexdigest()
@@ -25,26 +100,39 @@ class AuditLedger:
         )
         return response.signature.hex()
 
-    async def _write_log_async(self, action: str, payload: dict, user_id: str):
+    def _reconcile_head(self):
         """
-        Internal async method to perform the heavy lifting (DB read/write + Signing)
-        without blocking the main agent thread.
+        Loads the chain head (last hash and sequence number) from Firestore.
+        Runs when the writer starts and after a commit conflict, never per entry.
         """
-        try:
-            # 1. Get the Last Hash (To create the chain)
-            # In a real high-throughput system, you might cache this or use a distributed counter.
-            query = self.db.collection(self.collection_name)\
-                        .order_by("timestamp", direction=firestore.Query.DESCENDING)\
-                        .limit(1)
-            docs = list(query.stream())
-            
-            prev_hash = "GENESIS_HASH" # Default for first entry
-            if docs:
-                prev_hash = docs[0].get("current_hash")
-
-            # 2. Prepare Data Payload
-            timestamp = datetime.now(timezone.utc).isoformat()
+        collection = self.db.collection(self.collection_name)
+        docs = list(
+            collection.order_by("sequence", direction=firestore.Query.DESCENDING)
+                      .limit(1)
+                      .stream()
+        )
+        if docs:
+            self._head_hash = docs[0].get("current_hash")
+            self._next_sequence = docs[0].get("sequence") + 1
+            return
+
+        # Ledgers written before sequence numbers existed chain by timestamp
+        docs = list(
+            collection.order_by("timestamp", direction=firestore.Query.DESCENDING)
+                      .limit(1)
+                      .stream()
+        )
+        self._head_hash = docs[0].get("current_hash") if docs else GENESIS_HASH
+        self._next_sequence = 0
+
+    def _build_documents(self, entries):
+        """Chains queued entries onto the in-memory head and signs them."""
+        documents = []
+        canonical_strs = []
+        prev_hash = self._head_hash
+        for offset, (timestamp, action, payload, user_id) in enumerate(entries):
             log_entry = {
+                "sequence": self._next_sequence + offset,
                 "previous_hash": prev_hash,
                 "timestamp": timestamp,
                 "user_id": user_id,
@@ -52,29 +140,289 @@ class AuditLedger:
                 "payload": payload
             }
 
-            # 3. Create Canonical String for Hashing (Deterministic JSON)
+            # Canonical string for hashing (deterministic JSON)
             canonical_str = json.dumps(log_entry, sort_keys=True)
-
-            # 4. Calculate Hash & Sign
             current_hash = self._calculate_hash(canonical_str)
-            signature = self._sign_data(canonical_str)
-
-            # 5. Final Document
-            final_doc = {
+            documents.append({
                 **log_entry,
                 "current_hash": current_hash,
-                "signature": signature
-            }
+                "signature_scheme": self.signing_mode
+            })
+            canonical_strs.append(canonical_str)
+            prev_hash = current_hash
+
+        if self.signing_mode == SIGNATURE_SCHEME_MERKLE:
+            # One KMS call per batch: sign the root, store each entry's proof
+            levels = build_merkle_levels([doc["current_hash"] for doc in documents])
+            root = merkle_root(levels)
+            signature = self._sign_data(root)
+            for index, doc in enumerate(documents):
+                doc["merkle_root"] = root
+                doc["merkle_proof"] = merkle_proof(levels, index)
+                doc["signature"] = signature
+        else:
+            for doc, canonical_str in zip(documents, canonical_strs):
+                doc["signature"] = self._sign_data(canonical_str)
+        return documents
+
+    def _commit_batch(self, entries):
+        """
+        Writes one group of entries in a single Firestore batch and advances
+        the head. Blocking; runs on a worker thread.
 
-            # 6. Write to Firestore
-            self.db.collection(self.collection_name).add(final_doc)
-            print(f"✅ Secure Log Written: {current_hash[:8]}...")
+        Returns:
+            bool: True if the batch was committed
+        """
+        for attempt in range(2):
+            try:
+                if self._head_hash is None:
+                    self._reconcile_head()
+
+                documents = self._build_documents(entries)
+                batch = self.db.batch()
+                collection = self.db.collection(self.collection_name)
+                for doc in documents:
+                    batch.create(collection.document(f"{doc['sequence']:020d}"), doc)
+                batch.commit()
+
+                self._head_hash = documents[-1]["current_hash"]
+                self._next_sequence = documents[-1]["sequence"] + 1
+                self.committed_count += len(documents)
+                print(f"✅ Secure Log Batch Written: {len(documents)} entries, head {self._head_hash[:8]}...")
+                return True
+            except AlreadyExists:
+                # Another writer advanced the chain; pick up its head and re-chain
+                print("⚠️ Audit chain head moved, reconciling from storage.")
+                self._head_hash = None
+            except Exception as e:
+                print(f"❌ Audit Log Batch Failed ({len(entries)} entries): {e}")
+                self._head_hash = None
+                return False
+        print(f"❌ Audit Log Batch Failed ({len(entries)} entries): chain head kept moving")
+        return False
+
+    def _spill(self, entries):
+        """Appends entries to the on-disk journal. Blocking; call from a worker thread."""
+        with self._journal_lock:
+            with open(self.journal_path, "a", encoding="utf-8") as journal:
+                for timestamp, action, payload, user_id in entries:
+                    journal.write(json.dumps({
+                        "timestamp": timestamp,
+                        "action": action,
+                        "payload": payload,
+                        "user_id": user_id
+                    }, default=str) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+        self.spilled_count += len(entries)
+
+    def _claim_journal(self):
+        """
+        Moves the journal aside for replay and returns its entries. A claimed
+        journal left behind by a previous run is replayed first.
+        """
+        replay_path = self.journal_path + ".replay"
+        with self._journal_lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.journal_path):
+                    return []
+                os.replace(self.journal_path, replay_path)
+        entries = []
+        with open(replay_path, encoding="utf-8") as journal:
+            for line in journal:
+                if line.strip():
+                    record = json.loads(line)
+                    entries.append((record["timestamp"], record["action"], record["payload"], record["user_id"]))
+        return entries
 
+    def _release_journal(self):
+        os.remove(self.journal_path + ".replay")
+
+    async def _replay_journal(self):
+        """
+        Feeds journaled entries back into the queue. The claimed journal is only
+        deleted once the queue has drained, so a crash mid-replay loses nothing
+        (delivery is at-least-once: such a crash can replay an entry twice).
+        """
+        async with self._replay_lock:
+            entries = await asyncio.to_thread(self._claim_journal)
+            if not entries:
+                return
+            print(f"↩️ Replaying {len(entries)} journaled audit entries.")
+            for entry in entries:
+                await self._queue.put(entry)
+            await self._queue.join()
+            await asyncio.to_thread(self._release_journal)
+
+    async def _next_batch(self):
+        """Waits for one entry, then gathers more until the size or latency limit."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_latency
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _writer(self):
+        """The single task that owns the chain head and commits batches."""
+        while True:
+            batch = await self._next_batch()
+            try:
+                commit = asyncio.ensure_future(asyncio.to_thread(self._commit_batch, batch))
+                self._in_flight = (batch, commit)
+                # Shielded so shutdown can still collect the outcome after cancelling the writer
+                committed = await asyncio.shield(commit)
+                self._in_flight = None
+                if not committed and self.journal_path:
+                    # Keep the entries for the replay task instead of losing them
+                    await asyncio.to_thread(self._spill, batch)
+            except Exception as e:
+                self._in_flight = None
+                print(f"❌ Audit Log Batch Lost ({len(batch)} entries): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _journal_replayer(self):
+        """Periodically replays the journal while the ledger is running."""
+        while True:
+            try:
+                await self._replay_journal()
+            except Exception as e:
+                print(f"❌ Audit Journal Replay Failed: {e}")
+            await asyncio.sleep(self.journal_replay_interval)
+
+    def _ensure_writer(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._replay_lock = asyncio.Lock()
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._writer())
+
+    async def start(self):
+        """Starts the writer and, when a journal is configured, the replay task."""
+        self._ensure_writer()
+        if self.journal_path and (self._replay_task is None or self._replay_task.done()):
+            self._replay_task = asyncio.create_task(self._journal_replayer())
+
+    async def shutdown(self, timeout):
+        """
+        Drains the queue and the journal, giving up after `timeout` seconds.
+        Whatever is still queued at the deadline, and a batch whose commit was
+        still running, is spilled to the journal (when one is configured) so
+        the next start can replay it.
+        """
+        if self._queue is None:
+            return
+
+        async def drain():
+            if self._replay_task is not None:
+                # Let an in-progress replay finish before stopping the task
+                async with self._replay_lock:
+                    self._replay_task.cancel()
+            if self.journal_path:
+                await self._replay_journal()
+            await self._queue.join()
+
+        try:
+            await asyncio.wait_for(drain(), timeout)
+            print("✅ Audit ledger drained.")
+        except asyncio.TimeoutError:
+            leftover = []
+            while not self._queue.empty():
+                leftover.append(self._queue.get_nowait())
+                self._queue.task_done()
+            if leftover and self.journal_path:
+                await asyncio.to_thread(self._spill, leftover)
+                print(f"⚠️ Audit ledger drain timed out; {len(leftover)} entries kept in the journal.")
+            elif leftover:
+                self.dropped_count += len(leftover)
+                print(f"❌ Audit ledger drain timed out; {len(leftover)} entries dropped.")
+        finally:
+            for task in (self._replay_task, self._writer_task):
+                if task is not None:
+                    task.cancel()
+            await self._settle_in_flight()
+
+    async def _settle_in_flight(self):
+        """
+        Waits for the batch the cancelled writer was committing and journals it
+        if the commit failed, so it is not lost with the writer task.
+        """
+        if self._in_flight is None:
+            return
+        batch, commit = self._in_flight
+        self._in_flight = None
+        try:
+            committed = await commit
         except Exception as e:
-            print(f"❌ Audit Log Failed: {e}")
+            print(f"❌ Audit Log Batch Failed ({len(batch)} entries): {e}")
+            committed = False
+        if committed:
+            return
+        if self.journal_path:
+            await asyncio.to_thread(self._spill, batch)
+            print(f"⚠️ In-flight audit batch not committed; {len(batch)} entries kept in the journal.")
+        else:
+            self.dropped_count += len(batch)
+            print(f"❌ In-flight audit batch not committed; {len(batch)} entries dropped.")
 
-    def log_action(self, action: str, payload: dict, user_id: str):
+    def stats(self):
+        """Queue depth and entry counters, for health reporting."""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "overflow_policy": self.overflow_policy,
+            "committed": self.committed_count,
+            "spilled": self.spilled_count,
+            "dropped": self.dropped_count
+        }
+
+    def verify_entry(self, entry):
         """
-        Public non-blocking method. Fires and forgets.
+        Verifies one stored entry against its signature (and Merkle proof).
+        The KMS public key is fetched once and reused.
+
+        Returns:
+            Tuple[bool, str]: Whether the entry is valid, and the reason if not
         """
-        asyncio.create_task(self._write_log_async(action, payload, user_id))
+        if self._public_key is None:
+            self._public_key = load_public_key(self.kms_client, self.key_name)
+        public_key_pem, algorithm = self._public_key
+        return verify_entry(entry, public_key_pem, algorithm)
+
+    async def flush(self):
+        """Waits until every queued entry has been committed (or has failed)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def log_action(self, action: str, payload: dict, user_id: str):
+        """
+        Public method. Queues the entry for the ledger writer; only waits when
+        the queue is full and the overflow policy is 'block' (or 'spill', for
+        the journal write).
+        """
+        self._ensure_writer()
+        entry = (datetime.now(timezone.utc).isoformat(), action, payload, user_id)
+
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            await self._queue.put(entry)
+            return
+
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            if self.overflow_policy == OVERFLOW_SPILL:
+                await asyncio.to_thread(self._spill, [entry])
+            else:
+                self.dropped_count += 1
+                print(f"⚠️ Audit queue full, entry shed ({self.dropped_count} total).")
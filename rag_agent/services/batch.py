@@ -0,0 +1,72 @@
+"""
+Bounded-concurrency batch execution for the /batch endpoint.
+
+A fixed pool of worker tasks pulls items from the input, runs each one under a
+per-item deadline and pushes its result onto a queue as soon as it finishes, so
+results stream back in completion order while memory stays proportional to the
+concurrency rather than to the batch size.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+_DONE = object()
+
+
+async def run_batch(
+    items: List[Dict[str, Any]],
+    handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+    concurrency: int,
+    item_timeout: float,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run `handler` over every item with at most `concurrency` in flight.
+
+    Args:
+        items (List[Dict[str, Any]]): The batch items
+        handler (Callable): Coroutine function returning the result fields for one item
+        concurrency (int): Maximum number of items processed at the same time
+        item_timeout (float): Seconds before an item is abandoned as timed out
+
+    Yields:
+        Dict[str, Any]: One result per item, in completion order, each carrying
+        the item's index, id, status and duration
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    pending = iter(enumerate(items))
+
+    async def run_item(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        outcome = {"index": index, "id": item.get("id", index)}
+        try:
+            outcome.update(await asyncio.wait_for(handler(item), timeout=item_timeout))
+            outcome.setdefault("status", "success")
+        except asyncio.TimeoutError:
+            outcome.update({"status": "timeout", "error": f"No result within {item_timeout}s"})
+        except Exception as e:
+            outcome.update({"status": "error", "error": str(e)})
+        outcome["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return outcome
+
+    async def worker() -> None:
+        try:
+            # Workers share one iterator, so each item is taken exactly once
+            for index, item in pending:
+                await results.put(await run_item(index, item))
+        finally:
+            await results.put(_DONE)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(items))))]
+    try:
+        running = len(workers)
+        while running:
+            result = await results.get()
+            if result is _DONE:
+                running -= 1
+                continue
+            yield result
+    finally:
+        # The client went away or the batch finished: stop any remaining work
+        for task in workers:
+            task.cancel()
@@ -0,0 +1,376 @@
+"""
+Client-side chunking and chunk deduplication before embedding.
+
+With CLIENT_CHUNKING_ENABLED, plain-text sources (see CLIENT_CHUNKING_EXTENSIONS)
+are not handed to rag.import_files. Instead their text is streamed, cut into
+chunks of DEFAULT_CHUNK_SIZE words overlapping by DEFAULT_CHUNK_OVERLAP, and
+every chunk is checked against the chunks already in the corpus:
+
+- exact duplicates by a hash of the whitespace-normalized text
+- near duplicates by MinHash over word shingles, with LSH banding so a lookup
+  only compares against a handful of candidates
+
+Only the stride of each unique chunk (the words it does not share with the
+previous chunk) is written to a temporary file, so the overlaps are not
+uploaded twice. The file is uploaded with rag.upload_file and chunked
+server-side at DEFAULT_CHUNK_SIZE tokens without overlap. The server does not
+report per-file chunk counts, so embeddings_saved is estimated: the chunks a
+plain server-side import of the whole source would embed, minus the chunks of
+the upload, both from the same chars-per-token estimate. The chunk index lives
+in a local SQLite database; it also records which sources relied on another
+source's chunk, so those sources can be re-imported when that chunk goes away.
+
+Other formats (PDF, DOCX, Drive files) keep using server-side import, which
+parses them.
+"""
+
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import (
+    CHUNK_DEDUP_PATH,
+    CHUNK_DEDUP_THRESHOLD,
+    CHUNK_MINHASH_BANDS,
+    CHUNK_MINHASH_PERMUTATIONS,
+    CLIENT_CHUNKING_ENABLED,
+    CLIENT_CHUNKING_EXTENSIONS,
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_CHUNK_SIZE,
+)
+from .history_compaction import CHARS_PER_TOKEN
+
+# Bytes read from the source per block
+READ_BLOCK_SIZE = 64 * 1024
+SHINGLE_SIZE = 3
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    corpus TEXT NOT NULL,
+    chunk_hash TEXT NOT NULL,
+    source_uri TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    PRIMARY KEY (corpus, chunk_hash)
+);
+CREATE INDEX IF NOT EXISTS chunks_source ON chunks (corpus, source_uri);
+CREATE TABLE IF NOT EXISTS bands (
+    corpus TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    chunk_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bands_lookup ON bands (corpus, bucket);
+CREATE INDEX IF NOT EXISTS bands_chunk ON bands (corpus, chunk_hash);
+CREATE TABLE IF NOT EXISTS refs (
+    corpus TEXT NOT NULL,
+    chunk_hash TEXT NOT NULL,
+    source_uri TEXT NOT NULL,
+    PRIMARY KEY (corpus, chunk_hash, source_uri)
+);
+CREATE INDEX IF NOT EXISTS refs_source ON refs (corpus, source_uri);
+"""
+
+
+def is_locally_chunkable(source_uri: str) -> bool:
+    """Whether a source is plain text that the client-side pipeline can chunk."""
+    return source_uri.startswith("gs://") and source_uri.lower().endswith(CLIENT_CHUNKING_EXTENSIONS)
+
+
+def stream_gcs_text(source_uri: str) -> Iterator[str]:
+    """Yield the text of a GCS object block by block."""
+    from google.cloud import storage
+
+    bucket_name, _, blob_name = source_uri[len("gs://"):].partition("/")
+    blob = storage.Client().bucket(bucket_name).blob(blob_name)
+    with blob.open("r", encoding="utf-8", errors="replace") as f:
+        while True:
+            block = f.read(READ_BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+
+def chunk_strides(blocks: Iterable[str], chunk_size: int, chunk_overlap: int) -> Iterator[Tuple[str, str]]:
+    """
+    Cut streamed text into chunks of `chunk_size` words, each overlapping the
+    previous one by `chunk_overlap` words, and yield each chunk with its stride:
+    the words not already in the previous chunk. Joined, the strides are the
+    text without repeats. Only one chunk is held in memory.
+    """
+    step = max(1, chunk_size - chunk_overlap)
+    window: deque = deque()
+    carry = ""
+    fresh = 0  # Words in the window not yet emitted in a chunk
+
+    def emit() -> Tuple[str, str]:
+        return " ".join(window), " ".join(islice(window, len(window) - fresh, None))
+
+    def take(words: List[str]) -> Iterator[Tuple[str, str]]:
+        nonlocal fresh
+        for word in words:
+            window.append(word)
+            fresh += 1
+            if len(window) == chunk_size:
+                yield emit()
+                for _ in range(step):
+                    window.popleft()
+                fresh = 0
+
+    for block in blocks:
+        words = (carry + block).split()
+        # A word may continue in the next block
+        carry = "" if not words or block[-1:].isspace() else words.pop()
+        yield from take(words)
+    yield from take(carry.split())
+    if fresh:
+        yield emit()
+
+
+def chunk_stream(blocks: Iterable[str], chunk_size: int, chunk_overlap: int) -> Iterator[str]:
+    """Cut streamed text into overlapping chunks of `chunk_size` words (see chunk_strides)."""
+    return (chunk for chunk, _ in chunk_strides(blocks, chunk_size, chunk_overlap))
+
+
+def server_chunk_count(chars: int, chunk_size: int, chunk_overlap: int) -> int:
+    """Estimated chunks (hence embeddings) the server cuts `chars` characters of text into."""
+    tokens = math.ceil(chars / CHARS_PER_TOKEN)
+    if not tokens:
+        return 0
+    return 1 + max(0, math.ceil((tokens - chunk_size) / max(1, chunk_size - chunk_overlap)))
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode()).hexdigest()
+
+
+class MinHasher:
+    """MinHash signatures over word shingles, computed with NumPy."""
+
+    def __init__(self, num_perm: int, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # a * x + b stays below 2**64 for 32-bit x, so uint64 arithmetic is exact
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 61, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.casefold())
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little") for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        permuted = (hashes[:, None] * self.a + self.b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+
+class ChunkDeduplicator:
+    """
+    Per-corpus index of the chunks already uploaded, for exact and near-duplicate checks.
+
+    Args:
+        path (str): SQLite database file
+        threshold (float): Estimated Jaccard similarity at which a chunk counts as a near duplicate
+        num_perm (int): MinHash permutations
+        bands (int): LSH bands (num_perm must be a multiple)
+    """
+
+    def __init__(self, path: str, threshold: float, num_perm: int, bands: int):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.chunks_seen = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.embeddings_saved = 0
+
+    def _buckets(self, signature: np.ndarray) -> List[int]:
+        # The band number is part of the hash, so one indexed IN lookup covers every band
+        return [
+            int.from_bytes(
+                hashlib.blake2b(
+                    signature[band * self.rows:(band + 1) * self.rows].tobytes(),
+                    digest_size=8,
+                    salt=band.to_bytes(16, "little"),
+                ).digest(),
+                "little",
+                signed=True,
+            )
+            for band in range(self.bands)
+        ]
+
+    def check_and_add(self, corpus: str, source_uri: str, text: str) -> Optional[str]:
+        """
+        Add a chunk to the index unless it duplicates one already there.
+
+        Returns:
+            Optional[str]: None if the chunk is unique, else "exact" or "near"
+        """
+        digest = chunk_hash(text)
+        signature = self.hasher.signature(text)
+        buckets = self._buckets(signature)
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self.chunks_seen += 1
+            if self._conn.execute(
+                "SELECT 1 FROM chunks WHERE corpus = ? AND chunk_hash = ?", (corpus, digest)
+            ).fetchone():
+                self._add_ref(corpus, digest, source_uri)
+                self.exact_duplicates += 1
+                return "exact"
+
+            candidates = self._conn.execute(
+                "SELECT DISTINCT c.chunk_hash, c.signature FROM bands b JOIN chunks c "
+                "ON c.corpus = b.corpus AND c.chunk_hash = b.chunk_hash "
+                f"WHERE b.corpus = ? AND b.bucket IN ({', '.join('?' * len(buckets))})",
+                [corpus, *buckets],
+            ).fetchall()
+            for candidate_hash, candidate_signature in candidates:
+                similarity = float(np.mean(np.frombuffer(candidate_signature, dtype=np.uint64) == signature))
+                if similarity >= self.threshold:
+                    self._add_ref(corpus, candidate_hash, source_uri)
+                    self.near_duplicates += 1
+                    return "near"
+
+            self._conn.execute(
+                "INSERT INTO chunks (corpus, chunk_hash, source_uri, signature) VALUES (?, ?, ?, ?)",
+                (corpus, digest, source_uri, signature.tobytes()),
+            )
+            self._conn.executemany(
+                "INSERT INTO bands (corpus, bucket, chunk_hash) VALUES (?, ?, ?)",
+                [(corpus, bucket, digest) for bucket in buckets],
+            )
+            return None
+
+    def _add_ref(self, corpus: str, digest: str, source_uri: str) -> None:
+        self._conn.execute(
+            "INSERT OR IGNORE INTO refs (corpus, chunk_hash, source_uri) VALUES (?, ?, ?)",
+            (corpus, digest, source_uri),
+        )
+
+    def forget_source(self, corpus: str, source_uri: str) -> List[str]:
+        """
+        Remove a source's chunks from the index, e.g. before it is replaced or deleted.
+
+        Returns:
+            List[str]: Other sources that had duplicates of those chunks dropped and
+            therefore need to be imported again to keep that content searchable
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            owned = "SELECT chunk_hash FROM chunks WHERE corpus = ? AND source_uri = ?"
+            dependents = [
+                row[0] for row in self._conn.execute(
+                    f"SELECT DISTINCT source_uri FROM refs WHERE corpus = ? AND source_uri != ? AND chunk_hash IN ({owned})",
+                    (corpus, source_uri, corpus, source_uri),
+                )
+            ]
+            self._conn.execute(
+                f"DELETE FROM refs WHERE corpus = ? AND (source_uri = ? OR chunk_hash IN ({owned}))",
+                (corpus, source_uri, corpus, source_uri),
+            )
+            self._conn.execute(
+                f"DELETE FROM bands WHERE corpus = ? AND chunk_hash IN ({owned})",
+                (corpus, corpus, source_uri),
+            )
+            self._conn.execute("DELETE FROM chunks WHERE corpus = ? AND source_uri = ?", (corpus, source_uri))
+        return dependents
+
+    def drop_corpus(self, corpus: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            for table in ("chunks", "bands", "refs"):
+                self._conn.execute(f"DELETE FROM {table} WHERE corpus = ?", (corpus,))
+
+    def record_saved(self, embeddings: int) -> None:
+        with self._lock:
+            self.embeddings_saved += embeddings
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "chunks_seen": self.chunks_seen,
+                "exact_duplicates": self.exact_duplicates,
+                "near_duplicates": self.near_duplicates,
+                "embeddings_saved": self.embeddings_saved,
+            }
+
+
+def chunk_and_upload(corpus_resource_name: str, source_uri: str, deduplicator: ChunkDeduplicator) -> Dict[str, int]:
+    """
+    Stream, chunk and deduplicate one source, then upload the strides of its unique chunks.
+
+    Returns:
+        Dict[str, int]: files_added (0 or 1), chunks, chunks_uploaded, duplicate_chunks
+        and embeddings_saved (server chunks of a plain import minus those of the upload)
+    """
+    from vertexai import rag
+
+    counts = {"files_added": 0, "chunks": 0, "chunks_uploaded": 0, "duplicate_chunks": 0, "embeddings_saved": 0}
+    source_chars = uploaded_chars = 0
+    previous_kept = False
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", encoding="utf-8", delete=False) as f:
+        upload_path = f.name
+        for chunk, stride in chunk_strides(stream_gcs_text(source_uri), DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP):
+            counts["chunks"] += 1
+            source_chars += len(stride) + 1
+            if deduplicator.check_and_add(corpus_resource_name, source_uri, chunk):
+                counts["duplicate_chunks"] += 1
+                previous_kept = False
+                continue
+            # Strides of consecutive kept chunks continue each other; a dropped chunk leaves a break
+            separator = (" " if previous_kept else "\n\n") if uploaded_chars else ""
+            f.write(separator + stride)
+            uploaded_chars += len(separator) + len(stride)
+            counts["chunks_uploaded"] += 1
+            previous_kept = True
+
+    try:
+        if counts["chunks_uploaded"]:
+            rag.upload_file(
+                corpus_resource_name,
+                upload_path,
+                # The manifest maps uploaded RagFiles back to their source by display name
+                display_name=source_uri,
+                description=f"Deduplicated chunks of {source_uri}",
+                transformation_config=rag.TransformationConfig(
+                    chunking_config=rag.ChunkingConfig(chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=0),
+                ),
+            )
+            counts["files_added"] = 1
+        counts["embeddings_saved"] = max(
+            0,
+            server_chunk_count(source_chars, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP)
+            - server_chunk_count(uploaded_chars, DEFAULT_CHUNK_SIZE, 0),
+        )
+        deduplicator.record_saved(counts["embeddings_saved"])
+    except Exception:
+        # Nothing of this source made it into the corpus
+        deduplicator.forget_source(corpus_resource_name, source_uri)
+        raise
+    finally:
+        os.remove(upload_path)
+    return counts
+
+
+chunk_deduplicator: Optional[ChunkDeduplicator] = ChunkDeduplicator(
+    CHUNK_DEDUP_PATH,
+    threshold=CHUNK_DEDUP_THRESHOLD,
+    num_perm=CHUNK_MINHASH_PERMUTATIONS,
+    bands=CHUNK_MINHASH_BANDS,
+) if CLIENT_CHUNKING_ENABLED else None
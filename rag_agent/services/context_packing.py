@@ -0,0 +1,213 @@
+"""
+Token-budgeted packing of retrieval results for the model.
+
+rag_query returns the full text of every context, and neighbouring chunks of a
+source repeat up to DEFAULT_CHUNK_OVERLAP tokens of each other, so the model
+reads the same passage several times. With CONTEXT_PACKING_ENABLED,
+rag_query and rag_query_multi pack their results before returning them:
+
+1. Overlap removal: a context contained in a better-ranked one is dropped, and
+   a prefix or suffix it shares with a better-ranked context of the same
+   source (CONTEXT_MIN_OVERLAP_WORDS words or more) is cut off.
+2. MMR: contexts are ordered by maximal marginal relevance,
+   lambda * relevance - (1 - lambda) * similarity to the contexts already
+   picked, where relevance falls linearly with the retrieval rank and
+   similarity is the cosine of hashed bag-of-words vectors.
+3. Budget: contexts are added in that order while they fit into
+   CONTEXT_TOKEN_BUDGET; the first one that does not fit is cut at a word
+   boundary if enough budget is left.
+
+Packed results are serialized compactly: sources are listed once and each
+result refers to its source by index, with whitespace collapsed and scores
+rounded. The response reports the estimated tokens before and after packing.
+"""
+
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import (
+    CONTEXT_MIN_OVERLAP_WORDS,
+    CONTEXT_MMR_LAMBDA,
+    CONTEXT_PACKING_ENABLED,
+    CONTEXT_TOKEN_BUDGET,
+)
+from .history_compaction import CHARS_PER_TOKEN
+from .semantic_cache import HashingEmbedder
+
+# A context is only cut to fit the budget if at least this many tokens of it fit
+MIN_TRUNCATED_TOKENS = 48
+# Appended to a cut context; reserved out of the budget with its JSON escaping
+TRUNCATION_MARK = " …"
+_TRUNCATION_MARK_CHARS = len(json.dumps(TRUNCATION_MARK)) - 2
+_SOURCE_FIELDS = ("source_uri", "source_name", "corpus_name")
+# Kept under their own names: score is a distance, the others are higher-is-better
+_SCORE_FIELDS = ("score", "lexical_score", "fused_score", "rerank_score")
+
+
+def estimate_tokens(value: Any) -> int:
+    """Approximate tokens of a value serialized as JSON."""
+    return len(json.dumps(value, default=str, separators=(",", ":"))) // CHARS_PER_TOKEN + 1
+
+
+def _overlap(before: List[str], after: List[str], min_words: int) -> int:
+    """The most words at the end of before that are repeated at the start of after (0 if fewer than min_words)."""
+    longest = min(len(before), len(after))
+    for size in range(longest, min_words - 1, -1):
+        if before[-size] == after[0] and before[-size:] == after[:size]:
+            return size
+    return 0
+
+
+def remove_overlaps(results: List[Dict[str, Any]], min_words: int) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Drop contexts contained in better-ranked ones and cut the spans they share
+    with better-ranked contexts of the same source.
+
+    Returns:
+        Tuple[List[Dict], int]: The remaining contexts (in rank order, texts as
+        word lists under "words") and the number of words removed
+    """
+    kept: List[Dict[str, Any]] = []
+    removed = 0
+    for result in results:
+        words = result.get("text", "").split()
+        original = len(words)
+        joined = " ".join(words)
+        if not words or any(joined in " ".join(other["words"]) for other in kept):
+            removed += original
+            continue
+        for other in kept:
+            if other.get("source_uri") != result.get("source_uri"):
+                continue
+            # This context continues the other one, or leads into it
+            head = _overlap(other["words"], words, min_words)
+            words = words[head:]
+            tail = _overlap(words, other["words"], min_words)
+            words = words[:len(words) - tail]
+            if not words:
+                break
+        removed += original - len(words)
+        if words:
+            kept.append({**result, "words": words})
+    return kept, removed
+
+
+def mmr_order(texts: List[str], mmr_lambda: float, embedder: HashingEmbedder) -> List[int]:
+    """Indexes of texts (given best first) in maximal marginal relevance order."""
+    count = len(texts)
+    if count <= 1:
+        return list(range(count))
+    vectors = embedder.embed(texts)
+    similarity = vectors @ vectors.T
+    relevance = 1.0 - np.arange(count) / count
+    order = [0]
+    # Highest similarity of every text to the ones already picked
+    redundancy = similarity[0].copy()
+    remaining = np.ones(count, dtype=bool)
+    remaining[0] = False
+    while remaining.any():
+        scores = np.where(remaining, mmr_lambda * relevance - (1 - mmr_lambda) * redundancy, -np.inf)
+        pick = int(np.argmax(scores))
+        order.append(pick)
+        remaining[pick] = False
+        redundancy = np.maximum(redundancy, similarity[pick])
+    return order
+
+
+class ContextPacker:
+    """
+    Packs retrieval results into a token budget and counts the tokens saved.
+
+    Args:
+        token_budget (int): Most estimated tokens of packed sources and results
+        mmr_lambda (float): Relevance weight of MMR (1 = retrieval order only)
+        min_overlap_words (int): Shortest shared span removed between chunks of a source
+    """
+
+    def __init__(self, token_budget: int, mmr_lambda: float, min_overlap_words: int):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.min_overlap_words = min_overlap_words
+        self._embedder = HashingEmbedder()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def pack(self, results: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Pack ranked results (best first).
+
+        Returns:
+            Tuple: The source table, the packed results ({"source": index, "text" and rounded scores})
+            and a report with tokens_before, tokens_after, tokens_saved, results_dropped
+            and overlap_words_removed
+        """
+        tokens_before = estimate_tokens(results)
+        contexts, overlap_words = remove_overlaps(results, self.min_overlap_words)
+        texts = [" ".join(context["words"]) for context in contexts]
+        order = mmr_order(texts, self.mmr_lambda, self._embedder)
+
+        sources: List[Dict[str, Any]] = []
+        source_ids: Dict[tuple, int] = {}
+        packed: List[Dict[str, Any]] = []
+        used = estimate_tokens({"sources": [], "results": []})
+        for i in order:
+            context = contexts[i]
+            source = {key: context[key] for key in _SOURCE_FIELDS if context.get(key)}
+            source_key = tuple(sorted(source.items()))
+            new_source = source_key not in source_ids
+            item: Dict[str, Any] = {"source": source_ids.get(source_key, len(sources)), "text": texts[i]}
+            item.update({key: round(float(context[key]), 3) for key in _SCORE_FIELDS if context.get(key) is not None})
+
+            cost = estimate_tokens(item) + (estimate_tokens(source) if new_source else 0)
+            if used + cost > self.token_budget:
+                spare = self.token_budget - used - (cost - estimate_tokens(texts[i]))
+                if spare < MIN_TRUNCATED_TOKENS and packed:
+                    continue
+                # Cut at a word boundary; the first context is always included
+                cut = max(spare, MIN_TRUNCATED_TOKENS) * CHARS_PER_TOKEN - _TRUNCATION_MARK_CHARS
+                item["text"] = texts[i][:cut].rsplit(" ", 1)[0] + TRUNCATION_MARK
+                cost = estimate_tokens(item) + (estimate_tokens(source) if new_source else 0)
+            if new_source:
+                source_ids[source_key] = len(sources)
+                sources.append(source)
+            packed.append(item)
+            used += cost
+            if used >= self.token_budget:
+                break
+
+        tokens_after = estimate_tokens({"sources": sources, "results": packed})
+        with self._lock:
+            self.requests += 1
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens_after
+        return sources, packed, {
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": max(tokens_before - tokens_after, 0),
+            "results_dropped": len(results) - len(packed),
+            "overlap_words_removed": overlap_words,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            saved = self.tokens_before - self.tokens_after
+            return {
+                "token_budget": self.token_budget,
+                "requests": self.requests,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": saved,
+                "saved_ratio": round(saved / self.tokens_before, 4) if self.tokens_before else 0.0,
+            }
+
+
+context_packer: Optional[ContextPacker] = ContextPacker(
+    token_budget=CONTEXT_TOKEN_BUDGET,
+    mmr_lambda=CONTEXT_MMR_LAMBDA,
+    min_overlap_words=CONTEXT_MIN_OVERLAP_WORDS,
+) if CONTEXT_PACKING_ENABLED else None
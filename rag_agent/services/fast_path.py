@@ -0,0 +1,186 @@
+"""
+Deterministic fast path for unambiguous management commands in /chat.
+
+"list corpora" costs a Gemini planning turn, a tool call and a second Gemini
+turn that only reformats the tool result. The fast path matches a small set of
+exact command shapes, lets /chat call the tool directly and renders its result
+with a fixed template:
+
+    list corpora                          -> list_corpora
+    show files in <corpus>                -> get_corpus_info
+    summarize corpus <corpus>             -> get_corpus_info(summary=True)
+    delete document <id> from <corpus>    -> delete_document
+    status of job <job_id>                -> get_ingestion_status
+
+Patterns match the whole (normalized) message, so anything with extra words,
+a question about content, or a second request falls back to the agent. So
+does a tool result that is not a success, e.g. a misspelled corpus name the
+agent can resolve. Deleting a whole corpus always goes through the agent,
+which asks for confirmation.
+"""
+
+import re
+import threading
+from typing import Any, Dict, NamedTuple, Optional
+
+from ..config import FAST_PATH_ENABLED
+
+# A corpus name: quoted (may contain spaces) or a single token / resource name
+_CORPUS = r"""(?:"(?P<corpus_q>[^"]+)"|'(?P<corpus_s>[^']+)'|(?P<corpus>[\w.\-/:]+))"""
+_POLITE = r"(?:please\s+|can you\s+|could you\s+)?"
+
+INTENT_PATTERNS = {
+    "list_corpora": [
+        _POLITE + r"(?:list|show)(?:\s+me)?(?:\s+(?:all|my|the|available))*\s+(?:corpora|corpuses|rag corpora)",
+        r"what corpora (?:are there|do i have|exist|are available)",
+    ],
+    "list_files": [
+        _POLITE + r"(?:list|show)(?:\s+me)?(?:\s+(?:all|the))*\s+(?:files|documents|docs)\s+(?:in|of|from)\s+(?:the\s+)?(?:corpus\s+)?"
+        + _CORPUS + r"(?:\s+corpus)?",
+    ],
+    "corpus_summary": [
+        _POLITE + r"(?:summarize|summarise|describe)\s+(?:the\s+)?corpus\s+" + _CORPUS,
+        _POLITE + r"(?:show\s+|get\s+)?(?:corpus\s+)?(?:info|information|stats|statistics)\s+(?:for|on|about)\s+(?:the\s+)?(?:corpus\s+)?"
+        + _CORPUS,
+    ],
+    "delete_document": [
+        _POLITE + r"(?:delete|remove)\s+(?:the\s+)?(?:document|file|doc)\s+(?P<document_id>[\w\-]+)\s+from\s+(?:the\s+)?(?:corpus\s+)?"
+        + _CORPUS + r"(?:\s+corpus)?",
+    ],
+    "ingestion_status": [
+        _POLITE + r"(?:show\s+|get\s+|check\s+)?(?:the\s+)?(?:status|progress)\s+of\s+(?:the\s+)?(?:ingestion\s+|import\s+)?job\s+(?P<job_id>[0-9a-f]{32})",
+        r"(?:ingestion\s+|import\s+)?job\s+(?P<job_id>[0-9a-f]{32})\s+(?:status|progress)",
+    ],
+}
+
+# Listings longer than this are cut off with a hint to ask the agent for more
+MAX_LISTED_ITEMS = 50
+
+
+class FastPathMatch(NamedTuple):
+    intent: str
+    args: Dict[str, str]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.strip().rstrip("?.!").split())
+
+
+def _render_list_corpora(result: Dict[str, Any]) -> str:
+    corpora = result["corpora"]
+    if not corpora:
+        return "There are no corpora yet. Ask me to create one."
+    lines = [f"Found {len(corpora)} {'corpus' if len(corpora) == 1 else 'corpora'}:"]
+    lines += [f"- {c['display_name']} ({c['resource_name']})" for c in corpora[:MAX_LISTED_ITEMS]]
+    if len(corpora) > MAX_LISTED_ITEMS:
+        lines.append(f"...and {len(corpora) - MAX_LISTED_ITEMS} more.")
+    return "\n".join(lines)
+
+
+def _render_list_files(result: Dict[str, Any]) -> str:
+    files = result["files"]
+    if not files:
+        return f"Corpus '{result['corpus_display_name']}' has no files."
+    lines = [f"Files in corpus '{result['corpus_display_name']}':"]
+    lines += [
+        f"- {f['display_name']} (id: {f['file_id']}, {f['source_type']}, {f['state']})"
+        + (f" from {f['source_uri']}" if f["source_uri"] else "")
+        for f in files
+    ]
+    if result.get("next_page_token"):
+        lines.append("More files are available; ask for the next page to see them.")
+    return "\n".join(lines)
+
+
+def _render_corpus_summary(result: Dict[str, Any]) -> str:
+    lines = [f"Corpus '{result['corpus_display_name']}' contains {result['file_count']} file(s)."]
+    if result["by_source_type"]:
+        lines.append("By source: " + ", ".join(f"{k}: {v}" for k, v in sorted(result["by_source_type"].items())))
+    if result["by_state"]:
+        lines.append("By state: " + ", ".join(f"{k}: {v}" for k, v in sorted(result["by_state"].items())))
+    if result["oldest_update_time"]:
+        lines.append(f"Last updated between {result['oldest_update_time']} and {result['newest_update_time']}.")
+    return "\n".join(lines)
+
+
+def _render_delete_document(result: Dict[str, Any]) -> str:
+    text = result["message"] + "."
+    if result.get("requires_reimport"):
+        text += " These sources shared chunks with it and need to be re-imported: " + ", ".join(result["requires_reimport"])
+    return text
+
+
+def _render_ingestion_status(result: Dict[str, Any]) -> str:
+    job = result["job"]
+    counts = ", ".join(f"{count} {status}" for status, count in sorted(job["path_counts"].items()))
+    text = f"Ingestion job {job['job_id']} into '{job['corpus_name']}' is {job['status']} ({counts} of {job['paths_total']} path(s))."
+    if job["error"]:
+        text += f" Error: {job['error']}"
+    return text
+
+
+RENDERERS = {
+    "list_corpora": _render_list_corpora,
+    "list_files": _render_list_files,
+    "corpus_summary": _render_corpus_summary,
+    "delete_document": _render_delete_document,
+    "ingestion_status": _render_ingestion_status,
+}
+
+
+class FastPath:
+    """Intent matcher, result templates and hit-rate counters."""
+
+    def __init__(self):
+        self._patterns = {
+            intent: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for intent, patterns in INTENT_PATTERNS.items()
+        }
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits: Dict[str, int] = {intent: 0 for intent in INTENT_PATTERNS}
+        self.fallbacks = 0
+
+    def match(self, text: str) -> Optional[FastPathMatch]:
+        """The command a message is, or None if it is anything else."""
+        normalized = _normalize(text)
+        with self._lock:
+            self.requests += 1
+        for intent, patterns in self._patterns.items():
+            for pattern in patterns:
+                found = pattern.fullmatch(normalized)
+                if found:
+                    groups = {k: v for k, v in found.groupdict().items() if v}
+                    corpus = groups.pop("corpus_q", None) or groups.pop("corpus_s", None)
+                    if corpus:
+                        groups["corpus"] = corpus
+                    return FastPathMatch(intent, groups)
+        return None
+
+    def render(self, match: FastPathMatch, result: Dict[str, Any]) -> Optional[str]:
+        """
+        The templated answer for a tool result, recording the hit. Returns None
+        (and records a fallback) if the tool did not succeed.
+        """
+        if not isinstance(result, dict) or result.get("status") != "success":
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        text = RENDERERS[match.intent](result)
+        with self._lock:
+            self.hits[match.intent] += 1
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = sum(self.hits.values())
+            return {
+                "requests": self.requests,
+                "hits": hits,
+                "hits_by_intent": dict(self.hits),
+                "fallbacks": self.fallbacks,
+                "hit_rate": round(hits / self.requests, 4) if self.requests else 0.0,
+            }
+
+
+fast_path = FastPath() if FAST_PATH_ENABLED else None
@@ -0,0 +1,166 @@
+"""
+Rank fusion for merging ranked context lists (e.g. from several corpora).
+
+Both methods take lists that are each ordered best-first and return a single
+list ordered by fused score. Contexts that appear in more than one list (the
+same chunk of the same source) are merged into one entry whose fused score
+accumulates the contributions of every list it appears in.
+"""
+
+import hashlib
+from typing import Callable, Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+RRF_K = 60
+# hybrid_score_fusion matches a lexical hit to a vector context of the same source
+# when this share of the smaller text's word 3-grams also occurs in the other
+HYBRID_MIN_TEXT_OVERLAP = 0.5
+SHINGLE_WORDS = 3
+
+
+def context_key(context: Dict) -> Tuple[str, str]:
+    """Identify a context by its source and a digest of its text."""
+    source = context.get("source_uri") or context.get("source_name") or ""
+    digest = hashlib.sha1(context.get("text", "").encode()).hexdigest()
+    return source, digest
+
+
+def _fuse(
+    ranked_lists: List[List[Dict]],
+    contribution: Callable[[List[Dict], int], List[float]],
+    key: Callable[[Dict], Hashable],
+) -> List[Dict]:
+    fused: Dict[Hashable, Dict] = {}
+    for ranked in ranked_lists:
+        for context, score in zip(ranked, contribution(ranked, len(ranked))):
+            context_id = key(context)
+            if context_id in fused:
+                fused[context_id]["fused_score"] += score
+            else:
+                fused[context_id] = {**context, "fused_score": score}
+    merged = sorted(fused.values(), key=lambda c: c["fused_score"], reverse=True)
+    for context in merged:
+        context["fused_score"] = round(context["fused_score"], 6)
+    return merged
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[List[Dict]],
+    k: int = RRF_K,
+    key: Callable[[Dict], Hashable] = context_key,
+) -> List[Dict]:
+    """
+    Merge ranked lists by reciprocal rank fusion: score = sum(1 / (k + rank)).
+    Ignores the raw scores, so lists with incomparable score scales mix fairly.
+    """
+    return _fuse(
+        ranked_lists,
+        lambda ranked, n: [1.0 / (k + rank) for rank in range(1, n + 1)],
+        key,
+    )
+
+
+# Higher-is-better scores that later stages add to a context, the last stage first
+_SIMILARITY_FIELDS = ("rerank_score", "fused_score")
+
+
+def _ranking_scores(ranked: List[Dict]) -> Tuple[List[Optional[float]], bool]:
+    """
+    The scores a list is ranked by and whether higher is better: rerank_score or
+    fused_score when every context has one, otherwise score, a distance.
+    """
+    for field in _SIMILARITY_FIELDS:
+        if all(context.get(field) is not None for context in ranked):
+            return [float(context[field]) for context in ranked], True
+    return [float(context["score"]) if context.get("score") is not None else None for context in ranked], False
+
+
+def _normalized_scores(ranked: List[Dict], n: int) -> List[float]:
+    if n == 0:
+        return []
+    scores, higher_is_better = _ranking_scores(ranked)
+    known = [s for s in scores if s is not None]
+    if not known:
+        return [1.0] * n
+    low, high = min(known), max(known)
+    # A context without a score (e.g. found only by the lexical lookup) counts as the worst of its list
+    if high == low:
+        return [1.0 if s is not None else 0.0 for s in scores]
+    if higher_is_better:
+        return [(s - low) / (high - low) if s is not None else 0.0 for s in scores]
+    return [(high - s) / (high - low) if s is not None else 0.0 for s in scores]
+
+
+def normalized_score_fusion(
+    ranked_lists: List[List[Dict]],
+    key: Callable[[Dict], Hashable] = context_key,
+) -> List[Dict]:
+    """
+    Merge ranked lists by min-max normalized score (1 = best in its list).
+    A list is normalized on the score it was ranked by: rerank_score or
+    fused_score if its contexts carry one, otherwise the score distance.
+    """
+    return _fuse(ranked_lists, _normalized_scores, key)
+
+
+def _shingles(text: str) -> FrozenSet[Tuple[str, ...]]:
+    """The text's runs of SHINGLE_WORDS consecutive words (lowercased)."""
+    words = text.lower().split()
+    return frozenset(zip(*(words[i:] for i in range(SHINGLE_WORDS))))
+
+
+def _text_overlap(a: FrozenSet[Tuple[str, ...]], b: FrozenSet[Tuple[str, ...]]) -> float:
+    """Share of the smaller text's shingles that also occur in the other text."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def hybrid_score_fusion(
+    vector_results: List[Dict],
+    lexical_results: List[Dict],
+    lexical_weight: float,
+    min_overlap: float = HYBRID_MIN_TEXT_OVERLAP,
+) -> List[Dict]:
+    """
+    Merge a vector lookup (score = distance) with a BM25 lookup (lexical_score):
+    fused_score = (1 - lexical_weight) * similarity + lexical_weight * lexical_score / best lexical_score.
+
+    The two lookups chunk the same sources differently (the server's chunks
+    against the client-side chunker's), so a lexical hit is matched to every
+    vector context of the same source that shares at least min_overlap of the
+    smaller text's word 3-grams with it, and a vector context takes the best
+    lexical_score of the hits matched to it. A lexical hit matching no vector
+    context is kept as is and gets the lowest similarity among the vector
+    results (it ranked below all of them); a vector context matching no hit
+    gets 0 lexical. score is None for contexts only the lexical lookup found,
+    lexical_score None for contexts only the vector lookup found.
+    """
+    fused = [{**context, "lexical_score": None} for context in vector_results]
+    vector_shingles = [_shingles(context.get("text", "")) for context in vector_results]
+    for hit in lexical_results:
+        source = hit.get("source_uri") or hit.get("source_name")
+        shingles = _shingles(hit.get("text", ""))
+        matched = False
+        for context, context_shingles in zip(fused, vector_shingles):
+            if (context.get("source_uri") or context.get("source_name")) != source:
+                continue
+            if _text_overlap(shingles, context_shingles) >= min_overlap:
+                matched = True
+                context["lexical_score"] = max(context["lexical_score"] or 0.0, hit["lexical_score"])
+        if not matched:
+            fused.append({**hit, "score": None})
+
+    similarities = [1.0 - c["score"] for c in vector_results if c.get("score") is not None]
+    floor = min(similarities) if similarities else 0.0
+    best_lexical = max((c["lexical_score"] for c in lexical_results), default=0.0) or 1.0
+    for context in fused:
+        similarity = 1.0 - context["score"] if context["score"] is not None else floor
+        lexical = (context["lexical_score"] or 0.0) / best_lexical
+        context["fused_score"] = round((1 - lexical_weight) * similarity + lexical_weight * lexical, 6)
+    return sorted(fused, key=lambda c: c["fused_score"], reverse=True)
+
+
+FUSION_METHODS = {
+    "rrf": reciprocal_rank_fusion,
+    "normalized": normalized_score_fusion,
+}
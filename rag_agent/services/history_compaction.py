@@ -0,0 +1,202 @@
+"""
+History compaction for long sessions.
+
+The runner sends a session's whole event history to the model on every turn,
+including the full text of every rag_query result, so prompt size and
+time-to-first-token grow with the length of the conversation. compact_history
+runs as the agent's before_model_callback and rewrites the request (never the
+stored session) once the estimated prompt exceeds HISTORY_TOKEN_BUDGET:
+
+1. Tool results of turns older than the last HISTORY_KEEP_RECENT_TURNS are
+   trimmed to their citations (source URIs and names, status, message).
+2. If that is not enough, the older turns are replaced by a short extractive
+   summary (question, start of the answer, sources) that is prepended to the
+   first kept turn. The summary is itself capped at HISTORY_SUMMARY_TOKEN_BUDGET
+   and keeps its most recent lines.
+
+The most recent turns are always sent verbatim. The summary is rebuilt
+deterministically from the events on each call, so no extra model call is
+made.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from ..config import (
+    HISTORY_COMPACTION_ENABLED,
+    HISTORY_KEEP_RECENT_TURNS,
+    HISTORY_SUMMARY_TOKEN_BUDGET,
+    HISTORY_TOKEN_BUDGET,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rough size of a token in characters for English text and JSON
+CHARS_PER_TOKEN = 4
+# Characters of each question / answer kept in the summary
+SUMMARY_QUESTION_CHARS = 200
+SUMMARY_ANSWER_CHARS = 300
+
+# Fields of a tool result kept when it is trimmed
+_KEPT_RESULT_FIELDS = ("status", "message", "corpus_name", "query", "results_count")
+_CITATION_FIELDS = ("source_uri", "source_name", "corpus_name")
+
+
+def estimate_tokens(content: types.Content) -> int:
+    """Approximate token count of one request content."""
+    chars = 0
+    for part in content.parts or []:
+        if part.text:
+            chars += len(part.text)
+        elif part.function_call:
+            chars += len(json.dumps(part.function_call.args or {}, default=str)) + len(part.function_call.name or "")
+        elif part.function_response:
+            chars += len(json.dumps(part.function_response.response or {}, default=str))
+    return chars // CHARS_PER_TOKEN + 1
+
+
+def _is_turn_start(content: types.Content) -> bool:
+    """A user message (not a tool result) starts a new turn."""
+    return content.role == "user" and any(part.text and not part.thought for part in content.parts or [])
+
+
+def split_turns(contents: List[types.Content]) -> List[List[types.Content]]:
+    """Group request contents into turns, each starting with a user message."""
+    turns: List[List[types.Content]] = []
+    for content in contents:
+        if not turns or _is_turn_start(content):
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def citations(response: Dict[str, Any]) -> Dict[str, Any]:
+    """A tool result reduced to its status, message and cited sources."""
+    trimmed = {key: response[key] for key in _KEPT_RESULT_FIELDS if key in response}
+    # Packed results refer to a source table instead of repeating their source;
+    # an already trimmed result keeps its citations
+    results = response.get("sources", response.get("results", response.get("citations")))
+    if isinstance(results, list):
+        trimmed["citations"] = [
+            {key: result[key] for key in _CITATION_FIELDS if result.get(key)}
+            for result in results
+            if isinstance(result, dict)
+        ]
+    return trimmed
+
+
+def _trim_tool_results(content: types.Content) -> types.Content:
+    parts = []
+    for part in content.parts or []:
+        if part.function_response and isinstance(part.function_response.response, dict):
+            part = types.Part(function_response=types.FunctionResponse(
+                id=part.function_response.id,
+                name=part.function_response.name,
+                response=citations(part.function_response.response),
+            ))
+        parts.append(part)
+    return types.Content(role=content.role, parts=parts)
+
+
+def _summary_lines(turn: List[types.Content]) -> List[str]:
+    question, answer, sources = "", "", []
+    for content in turn:
+        for part in content.parts or []:
+            if part.thought:
+                continue
+            if part.text and content.role == "user" and not question:
+                question = part.text
+            elif part.text and content.role == "model":
+                answer = part.text
+            elif part.function_response and isinstance(part.function_response.response, dict):
+                for citation in citations(part.function_response.response).get("citations", []):
+                    source = citation.get("source_uri") or citation.get("source_name")
+                    if source and source not in sources:
+                        sources.append(source)
+    lines = [f"- User: {' '.join(question.split())[:SUMMARY_QUESTION_CHARS]}"]
+    if answer:
+        lines.append(f"  Agent: {' '.join(answer.split())[:SUMMARY_ANSWER_CHARS]}")
+    if sources:
+        lines.append(f"  Sources: {', '.join(sources)}")
+    return lines
+
+
+def summarize_turns(turns: List[List[types.Content]], token_budget: int) -> str:
+    """Extractive summary of the given turns, keeping the most recent ones that fit the budget."""
+    kept: List[str] = []
+    chars = 0
+    omitted = 0
+    for turn in reversed(turns):
+        lines = _summary_lines(turn)
+        size = sum(len(line) + 1 for line in lines)
+        if omitted or chars + size > token_budget * CHARS_PER_TOKEN:
+            omitted += 1
+            continue
+        kept = lines + kept
+        chars += size
+    header = "[Summary of the earlier conversation"
+    header += f"; {omitted} older turn(s) omitted]" if omitted else "]"
+    return "\n".join([header] + kept)
+
+
+def compact_contents(
+    contents: List[types.Content],
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+    keep_recent_turns: int = HISTORY_KEEP_RECENT_TURNS,
+    summary_token_budget: int = HISTORY_SUMMARY_TOKEN_BUDGET,
+) -> Optional[Dict[str, Any]]:
+    """
+    Compact request contents in place if they exceed the token budget.
+
+    Returns:
+        Optional[Dict[str, Any]]: What was done (tokens before/after, turns trimmed or
+        summarized), or None if the contents were within the budget
+    """
+    tokens_before = sum(estimate_tokens(content) for content in contents)
+    if tokens_before <= token_budget:
+        return None
+
+    turns = split_turns(contents)
+    keep = max(1, keep_recent_turns)
+    old, recent = turns[:-keep], turns[-keep:]
+    if not old:
+        return None
+
+    old = [[_trim_tool_results(content) for content in turn] for turn in old]
+    compacted = [content for turn in old + recent for content in turn]
+    tokens_after = sum(estimate_tokens(content) for content in compacted)
+    summarized = 0
+    if tokens_after > token_budget:
+        summary = types.Part(text=summarize_turns(old, summary_token_budget))
+        first = recent[0][0]
+        recent[0][0] = types.Content(role=first.role, parts=[summary] + list(first.parts or []))
+        compacted = [content for turn in recent for content in turn]
+        tokens_after = sum(estimate_tokens(content) for content in compacted)
+        summarized = len(old)
+
+    contents[:] = compacted
+    return {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "turns_trimmed": len(old) - summarized,
+        "turns_summarized": summarized,
+    }
+
+
+def compact_history(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """before_model_callback that keeps the prompt history within HISTORY_TOKEN_BUDGET."""
+    if not HISTORY_COMPACTION_ENABLED:
+        return None
+    report = compact_contents(llm_request.contents)
+    if report:
+        logger.info(
+            f"Compacted history: {report['tokens_before']} -> {report['tokens_after']} tokens "
+            f"({report['turns_trimmed']} turn(s) trimmed, {report['turns_summarized']} summarized)"
+        )
+        callback_context.state["temp:history_compaction"] = report
+    return None
@@ -0,0 +1,218 @@
+"""
+Background ingestion jobs for add_data.
+
+add_data(background=True) enqueues a job and returns its id at once; a small
+worker pool runs the import off the request path and records per-path progress
+that get_ingestion_status and GET /ingestion/{job_id} report.
+
+Imports into one corpus run one job at a time. Requests that arrive while a
+corpus is importing are coalesced: paths already covered by a queued or
+running job of the same kind return that job, and anything else is merged
+into a single queued follow-up job per kind ("paths" or "manifest").
+
+Jobs live in process memory and are forgotten INGESTION_JOB_RETENTION_SECONDS
+after they finish.
+"""
+
+import itertools
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import INGESTION_JOB_RETENTION_SECONDS, INGESTION_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class IngestionJob:
+    """One import into one corpus, with per-path progress."""
+
+    def __init__(self, corpus: str, corpus_name: str, paths: List[str],
+                 run: Callable[["IngestionJob"], Dict[str, Any]], kind: str = "paths"):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.corpus = corpus
+        self.corpus_name = corpus_name
+        self.run = run
+        self.status = "queued"
+        self.progress: Dict[str, Dict[str, Any]] = {}
+        self.result: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.add_paths(paths)
+
+    @property
+    def paths(self) -> List[str]:
+        with self._lock:
+            return list(self.progress)
+
+    def covers(self, paths: List[str]) -> bool:
+        with self._lock:
+            return all(path in self.progress for path in paths)
+
+    def add_paths(self, paths: List[str]) -> None:
+        with self._lock:
+            for path in paths:
+                self.progress.setdefault(path, {"status": "pending"})
+
+    def update(self, paths: List[str], **fields: Any) -> None:
+        """Record progress for the given paths (e.g. status, files_added, error)."""
+        with self._lock:
+            for path in paths:
+                self.progress.setdefault(path, {}).update(fields)
+
+    def snapshot(self, include_progress: bool = True) -> Dict[str, Any]:
+        """The job's state; include_progress adds every path's progress entry."""
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for entry in self.progress.values():
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+            now = self.finished_at or time.time()
+            snapshot = {
+                "job_id": self.job_id,
+                "kind": self.kind,
+                "corpus_name": self.corpus_name,
+                "status": self.status,
+                "paths_total": len(self.progress),
+                "path_counts": counts,
+                "result": dict(self.result),
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed_seconds": round(now - (self.started_at or now), 3),
+            }
+            if include_progress:
+                snapshot["progress"] = {path: dict(entry) for path, entry in self.progress.items()}
+            return snapshot
+
+    def failed_paths(self, limit: int) -> Dict[str, Optional[str]]:
+        """Up to limit failed paths with their errors, in the order the paths were added."""
+        with self._lock:
+            failed = ((path, entry.get("error")) for path, entry in self.progress.items() if entry["status"] == "failed")
+            return dict(itertools.islice(failed, limit))
+
+    def progress_page(self, offset: int, limit: int, status: str = "") -> Tuple[List[Dict[str, Any]], int]:
+        """
+        A page of per-path progress entries, optionally only those with a status.
+
+        Returns:
+            Tuple[List[Dict], int]: The entries (each with its "path") and the number of matching paths
+        """
+        with self._lock:
+            matching = [
+                (path, entry) for path, entry in self.progress.items()
+                if not status or entry["status"] == status
+            ]
+            page = [{"path": path, **entry} for path, entry in matching[offset:offset + limit]]
+            return page, len(matching)
+
+
+class IngestionJobManager:
+    """
+    Runs ingestion jobs on a bounded thread pool, one job per corpus at a time.
+
+    Args:
+        max_workers (int): Jobs (hence corpora) importing at the same time
+        retention_seconds (float): How long finished jobs remain queryable
+    """
+
+    def __init__(self, max_workers: int, retention_seconds: float):
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._running: Dict[str, IngestionJob] = {}
+        self._queued: Dict[str, List[IngestionJob]] = {}
+
+    def submit(self, corpus: str, corpus_name: str, paths: List[str],
+               run: Callable[[IngestionJob], Dict[str, Any]], kind: str = "paths") -> Tuple[IngestionJob, bool]:
+        """
+        Enqueue an import, coalescing it with the corpus' active jobs.
+
+        Args:
+            corpus (str): The corpus resource name
+            corpus_name (str): The corpus name as the caller gave it
+            paths (List[str]): Validated paths (or manifest URIs) to import
+            run (Callable): Performs the import for a job and returns its result counts;
+                            it reads job.paths when the job starts
+            kind (str): Only jobs of the same kind are coalesced
+
+        Returns:
+            Tuple[IngestionJob, bool]: The job that will import the paths, and whether
+            the request was coalesced into an existing job
+        """
+        with self._lock:
+            self._prune()
+            queued = self._queued.get(corpus, [])
+            for active in queued + [self._running.get(corpus)]:
+                if active is not None and active.kind == kind and active.covers(paths):
+                    return active, True
+
+            for job in queued:
+                if job.kind == kind:
+                    job.add_paths(paths)
+                    return job, True
+
+            job = IngestionJob(corpus, corpus_name, paths, run, kind)
+            self._jobs[job.job_id] = job
+            if corpus in self._running:
+                # Starts when the corpus' current import finishes
+                self._queued.setdefault(corpus, []).append(job)
+            else:
+                self._start(job)
+            return job, False
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_jobs(self) -> List[IngestionJob]:
+        with self._lock:
+            return [job for job in self._jobs.values() if job.status in ACTIVE_STATUSES]
+
+    def _start(self, job: IngestionJob) -> None:
+        # Called with self._lock held
+        self._running[job.corpus] = job
+        self._executor.submit(self._run, job)
+
+    def _run(self, job: IngestionJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = job.run(job) or {}
+            failed = job.snapshot(include_progress=False)["path_counts"].get("failed", 0)
+            job.status = "failed" if failed == len(job.paths) else "partial" if failed else "succeeded"
+        except Exception as e:
+            logger.error(f"Ingestion job {job.job_id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._running.pop(job.corpus, None)
+                queued = self._queued.get(job.corpus)
+                if queued:
+                    self._start(queued.pop(0))
+                    if not queued:
+                        del self._queued[job.corpus]
+
+    def _prune(self) -> None:
+        # Called with self._lock held
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+ingestion_jobs = IngestionJobManager(
+    max_workers=INGESTION_MAX_WORKERS,
+    retention_seconds=INGESTION_JOB_RETENTION_SECONDS,
+)
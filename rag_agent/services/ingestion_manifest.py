@@ -0,0 +1,322 @@
+"""
+Incremental ingestion manifest for add_data.
+
+A local SQLite database records, per corpus, every imported source: its URI,
+the source revision it was imported at (GCS generation or Drive revision), a
+content hash (GCS md5 / Drive md5Checksum) and the RagFile it became. Before
+importing, add_data expands its paths into concrete sources and diffs them
+against the manifest, so only new or changed sources are re-chunked and
+re-embedded. The RagFile of a changed source is only deleted once its new
+version has been imported and recorded, so a failed import keeps the old one.
+
+The manifest is seeded from `rag.list_files` the first time a corpus is used
+in a process. RagFiles imported before the manifest existed have no recorded
+revision; for those, a source counts as changed only if it was modified after
+its RagFile was last updated.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from ..config import INGESTION_MANIFEST_PATH
+
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files/{file_id}"
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    corpus TEXT NOT NULL,
+    source_uri TEXT NOT NULL,
+    revision TEXT,
+    content_hash TEXT,
+    rag_file_id TEXT,
+    imported_at REAL NOT NULL,
+    PRIMARY KEY (corpus, source_uri)
+);
+CREATE INDEX IF NOT EXISTS sources_rag_file ON sources (corpus, rag_file_id);
+"""
+
+
+class SourceVersion(NamedTuple):
+    """A concrete source as it currently exists in GCS or Drive."""
+
+    source_uri: str
+    revision: Optional[str]
+    content_hash: Optional[str]
+    modified_at: float
+
+
+class ImportPlan(NamedTuple):
+    """What an import has to do to bring a corpus up to date with its sources."""
+
+    new: List[SourceVersion]
+    changed: List[SourceVersion]
+    unchanged: List[SourceVersion]
+    # Source URI -> RagFile id of the old version of a changed source
+    superseded_rag_file_ids: Dict[str, str]
+
+    @property
+    def to_import(self) -> List[SourceVersion]:
+        return self.new + self.changed
+
+
+def drive_url(file_id: str) -> str:
+    """The normalized Drive URL add_data uses for a file id."""
+    return f"https://drive.google.com/file/d/{file_id}/view"
+
+
+def rag_file_source_uri(rag_file) -> Optional[str]:
+    """The source URI a RagFile was imported from, in the form add_data uses."""
+    if rag_file.gcs_source.uris:
+        return rag_file.gcs_source.uris[0]
+    if rag_file.google_drive_source.resource_ids:
+        return drive_url(rag_file.google_drive_source.resource_ids[0].resource_id)
+    # Files uploaded by the client-side chunker are named after their source
+    if rag_file.display_name.startswith(("gs://", "https://drive.google.com/")):
+        return rag_file.display_name
+    return None
+
+
+def rag_file_ids_by_source(rag_files: Iterable, exclude: Iterable[str] = ()) -> Dict[str, str]:
+    """Map each RagFile's source URI to its RagFile id, skipping the ids in exclude."""
+    excluded = set(exclude)
+    ids = {}
+    for rag_file in rag_files:
+        source_uri = rag_file_source_uri(rag_file)
+        rag_file_id = rag_file.name.split("/")[-1]
+        if source_uri and rag_file_id not in excluded:
+            ids[source_uri] = rag_file_id
+    return ids
+
+
+def _timestamp(value) -> float:
+    return value.timestamp() if value else 0.0
+
+
+class IngestionManifest:
+    """
+    Thread-safe SQLite manifest of the sources imported into each corpus.
+
+    Args:
+        path (str): SQLite database file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # Corpora reconciled against rag.list_files by this process
+        self._seeded: Set[str] = set()
+
+    def is_seeded(self, corpus: str) -> bool:
+        return corpus in self._seeded
+
+    def seed(self, corpus: str, rag_files: Iterable) -> int:
+        """
+        Reconcile the manifest with the RagFiles that actually exist in a corpus.
+        Rows whose RagFile is gone are dropped; RagFiles not yet in the manifest
+        are added without a revision.
+
+        Returns:
+            int: The number of RagFiles in the corpus
+        """
+        listed = []
+        for rag_file in rag_files:
+            source_uri = rag_file_source_uri(rag_file)
+            if source_uri:
+                imported_at = _timestamp(rag_file.update_time) or _timestamp(rag_file.create_time)
+                listed.append((source_uri, rag_file.name.split("/")[-1], imported_at))
+
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS listed (source_uri TEXT PRIMARY KEY, rag_file_id TEXT, imported_at REAL)")
+            self._conn.execute("DELETE FROM listed")
+            self._conn.executemany("INSERT OR REPLACE INTO listed VALUES (?, ?, ?)", listed)
+            self._conn.execute(
+                "DELETE FROM sources WHERE corpus = ? AND NOT EXISTS "
+                "(SELECT 1 FROM listed l WHERE l.source_uri = sources.source_uri AND l.rag_file_id = sources.rag_file_id)",
+                (corpus,),
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sources (corpus, source_uri, revision, content_hash, rag_file_id, imported_at) "
+                "SELECT ?, source_uri, NULL, NULL, rag_file_id, imported_at FROM listed",
+                (corpus,),
+            )
+            self._conn.execute("DELETE FROM listed")
+        self._seeded.add(corpus)
+        return len(listed)
+
+    def plan(self, corpus: str, sources: List[SourceVersion]) -> ImportPlan:
+        """Diff the current sources against the manifest."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS incoming "
+                "(source_uri TEXT PRIMARY KEY, revision TEXT, content_hash TEXT, modified_at REAL)"
+            )
+            self._conn.execute("DELETE FROM incoming")
+            self._conn.executemany("INSERT OR REPLACE INTO incoming VALUES (?, ?, ?, ?)", sources)
+            rows = self._conn.execute(
+                "SELECT i.source_uri, s.source_uri IS NOT NULL, s.rag_file_id, "
+                "  CASE "
+                "    WHEN s.source_uri IS NULL THEN 0 "
+                # A re-upload of identical bytes gets a new revision but keeps its hash
+                "    WHEN s.content_hash IS NOT NULL AND i.content_hash IS NOT NULL THEN s.content_hash != i.content_hash "
+                "    WHEN s.revision IS NOT NULL THEN s.revision IS NOT i.revision "
+                "    ELSE i.modified_at > s.imported_at "
+                "  END "
+                "FROM incoming i LEFT JOIN sources s ON s.corpus = ? AND s.source_uri = i.source_uri",
+                (corpus,),
+            ).fetchall()
+            self._conn.execute("DELETE FROM incoming")
+
+        by_uri = {source.source_uri: source for source in sources}
+        plan = ImportPlan([], [], [], {})
+        for source_uri, known, rag_file_id, changed in rows:
+            source = by_uri[source_uri]
+            if not known:
+                plan.new.append(source)
+            elif changed:
+                plan.changed.append(source)
+                if rag_file_id:
+                    plan.superseded_rag_file_ids[source_uri] = rag_file_id
+            else:
+                plan.unchanged.append(source)
+        return plan
+
+    def record(self, corpus: str, sources: List[SourceVersion], rag_file_ids: Dict[str, str]) -> None:
+        """
+        Record the versions that are now in the corpus.
+
+        Args:
+            corpus (str): The corpus resource name
+            sources (List[SourceVersion]): Sources that were imported or confirmed unchanged
+            rag_file_ids (Dict[str, str]): Source URI -> RagFile id, for the sources that have one
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO sources (corpus, source_uri, revision, content_hash, rag_file_id, imported_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (corpus, source_uri) DO UPDATE SET revision = excluded.revision, "
+                "content_hash = excluded.content_hash, "
+                "rag_file_id = COALESCE(excluded.rag_file_id, sources.rag_file_id), "
+                "imported_at = excluded.imported_at",
+                [
+                    (corpus, s.source_uri, s.revision, s.content_hash, rag_file_ids.get(s.source_uri), now)
+                    for s in sources
+                ],
+            )
+
+    def remove_rag_file(self, corpus: str, rag_file_id: str) -> None:
+        """Forget the source of a RagFile that was deleted."""
+        with self._lock:
+            self._conn.execute("DELETE FROM sources WHERE corpus = ? AND rag_file_id = ?", (corpus, rag_file_id))
+
+    def remove_sources(self, corpus: str, source_uris: List[str]) -> None:
+        """Forget sources so the next add_data imports them again."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "DELETE FROM sources WHERE corpus = ? AND source_uri = ?",
+                [(corpus, source_uri) for source_uri in source_uris],
+            )
+
+    def source_for_rag_file(self, corpus: str, rag_file_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source_uri FROM sources WHERE corpus = ? AND rag_file_id = ?", (corpus, rag_file_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def drop_corpus(self, corpus: str) -> None:
+        """Forget everything about a deleted corpus."""
+        with self._lock:
+            self._conn.execute("DELETE FROM sources WHERE corpus = ?", (corpus,))
+        self._seeded.discard(corpus)
+
+    def source_count(self, corpus: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sources WHERE corpus = ?", (corpus,)).fetchone()[0]
+
+
+def _gcs_sources(path: str) -> List[SourceVersion]:
+    """Expand a gs:// object or prefix into its objects and their generations."""
+    from google.cloud import storage
+
+    bucket_name, _, prefix = path[len("gs://"):].partition("/")
+    client = storage.Client()
+    sources = []
+    folder = prefix.rstrip("/") + "/" if prefix else ""
+    for blob in client.list_blobs(bucket_name, prefix=prefix or None):
+        # Import treats the path as one object or as a folder, never as a name prefix
+        if blob.name.endswith("/") or not (blob.name == prefix or blob.name.startswith(folder)):
+            continue
+        sources.append(SourceVersion(
+            source_uri=f"gs://{bucket_name}/{blob.name}",
+            revision=str(blob.generation),
+            content_hash=blob.md5_hash,
+            modified_at=_timestamp(blob.updated),
+        ))
+    return sources
+
+
+def _drive_source(url: str, session) -> SourceVersion:
+    """Look up the current revision of a Drive file."""
+    file_id = re.search(r"/file/d/([a-zA-Z0-9_-]+)", url).group(1)
+    response = session.get(
+        DRIVE_FILES_URL.format(file_id=file_id),
+        params={"fields": "id,version,headRevisionId,md5Checksum,modifiedTime", "supportsAllDrives": "true"},
+        timeout=30,
+    )
+    response.raise_for_status()
+    metadata = response.json()
+    modified = metadata.get("modifiedTime")
+    return SourceVersion(
+        source_uri=url,
+        # Google Docs have no headRevisionId; their version number changes on every edit
+        revision=metadata.get("headRevisionId") or metadata.get("version"),
+        content_hash=metadata.get("md5Checksum"),
+        modified_at=datetime.fromisoformat(modified.replace("Z", "+00:00")).timestamp() if modified else 0.0,
+    )
+
+
+def resolve_sources(paths: List[str]) -> Tuple[List[SourceVersion], List[str]]:
+    """
+    Expand validated add_data paths into concrete sources with their revisions.
+
+    Returns:
+        Tuple[List[SourceVersion], List[str]]: The resolved sources, and the paths
+        whose revision could not be looked up (these are imported unconditionally)
+    """
+    resolved: List[SourceVersion] = []
+    unresolved: List[str] = []
+    drive_session = None
+    for path in paths:
+        try:
+            if path.startswith("gs://"):
+                resolved.extend(_gcs_sources(path))
+            else:
+                if drive_session is None:
+                    import google.auth
+                    from google.auth.transport.requests import AuthorizedSession
+
+                    credentials, _ = google.auth.default(scopes=DRIVE_SCOPES)
+                    drive_session = AuthorizedSession(credentials)
+                resolved.append(_drive_source(path, drive_session))
+        except Exception:
+            unresolved.append(path)
+    return resolved, unresolved
+
+
+ingestion_manifest: Optional[IngestionManifest] = (
+    IngestionManifest(INGESTION_MANIFEST_PATH) if INGESTION_MANIFEST_PATH else None
+)
@@ -0,0 +1,357 @@
+"""
+Verification of audit ledger entries and of the whole chain.
+
+An entry is valid when its `current_hash` matches the hash of its canonical
+JSON and its signature checks out against the ledger's KMS public key:
+- "entry" scheme (and entries written before schemes existed): the signature
+  covers the entry's canonical JSON.
+- "merkle" scheme: the signature covers the batch's Merkle root, and the
+  stored inclusion proof must lead from `current_hash` to that root.
+
+verify_chain() streams the collection in sequence order, checks the hash
+links incrementally on the calling thread and fans signature checks out to a
+process pool. It keeps a checkpoint of the last verified entry so routine runs
+only verify what was written since. Run it from the command line with
+`python -m rag_agent.services.ledger_verifier [--full]`.
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+
+from .merkle import verify_merkle_proof
+
+# Fields added to a document after its hash was computed
+NON_HASHED_FIELDS = (
+    "current_hash",
+    "signature",
+    "signature_scheme",
+    "merkle_root",
+    "merkle_proof",
+)
+
+SIGNATURE_SCHEME_ENTRY = "entry"
+SIGNATURE_SCHEME_MERKLE = "merkle"
+
+CHECKPOINT_COLLECTION = "secure_audit_ledger_checkpoints"
+CHECKPOINT_DOCUMENT = "latest"
+
+# Signatures sent to a worker process per task
+SIGNATURE_CHUNK_SIZE = 256
+
+
+def canonical_entry(entry: Dict[str, Any]) -> str:
+    """Rebuild the canonical JSON string the ledger hashed and signed."""
+    log_entry = {k: v for k, v in entry.items() if k not in NON_HASHED_FIELDS}
+    return json.dumps(log_entry, sort_keys=True)
+
+
+def load_public_key(kms_client, key_version_name: str):
+    """
+    Fetch the public half of the ledger's signing key from Cloud KMS.
+
+    Args:
+        kms_client: A kms.KeyManagementServiceClient
+        key_version_name (str): Full crypto key version resource name
+
+    Returns:
+        Tuple[str, str]: The PEM-encoded public key and the KMS algorithm name
+    """
+    response = kms_client.get_public_key(request={"name": key_version_name})
+    return response.pem, response.algorithm.name
+
+
+@functools.lru_cache(maxsize=4)
+def _load_pem_public_key(public_key_pem: str):
+    return serialization.load_pem_public_key(public_key_pem.encode())
+
+
+def verify_signature(public_key_pem: str, algorithm: str, message: bytes, signature_hex: str) -> bool:
+    """
+    Verify a KMS asymmetric signature over SHA-256(message).
+
+    Args:
+        public_key_pem (str): PEM-encoded public key
+        algorithm (str): KMS algorithm name (e.g. EC_SIGN_P256_SHA256)
+        message (bytes): The data whose SHA-256 digest was signed
+        signature_hex (str): Hex-encoded signature
+
+    Returns:
+        bool: True if the signature is valid
+    """
+    public_key = _load_pem_public_key(public_key_pem)
+    try:
+        signature = bytes.fromhex(signature_hex)
+        if isinstance(public_key, ec.EllipticCurvePublicKey):
+            public_key.verify(signature, message, ec.ECDSA(hashes.SHA256()))
+        elif isinstance(public_key, rsa.RSAPublicKey):
+            if "PSS" in algorithm:
+                pad = padding.PSS(
+                    mgf=padding.MGF1(hashes.SHA256()),
+                    salt_length=padding.PSS.DIGEST_LENGTH,
+                )
+            else:
+                pad = padding.PKCS1v15()
+            public_key.verify(signature, message, pad, hashes.SHA256())
+        else:
+            return False
+    except (InvalidSignature, TypeError, ValueError):
+        return False
+    return True
+
+
+def verify_entry(entry: Dict[str, Any], public_key_pem: str, algorithm: str) -> Tuple[bool, str]:
+    """
+    Verify one ledger entry on its own: hash, inclusion proof and signature.
+    Chain linkage (previous_hash) needs neighbouring entries and is not checked here.
+
+    Args:
+        entry (Dict[str, Any]): The stored ledger document
+        public_key_pem (str): PEM-encoded public key of the ledger's signing key
+        algorithm (str): KMS algorithm name of the signing key
+
+    Returns:
+        Tuple[bool, str]: Whether the entry is valid, and the reason if it is not
+    """
+    canonical_str = canonical_entry(entry)
+    current_hash = entry.get("current_hash")
+    if hashlib.sha256(canonical_str.encode()).hexdigest() != current_hash:
+        return False, "hash mismatch"
+
+    scheme = entry.get("signature_scheme", SIGNATURE_SCHEME_ENTRY)
+    if scheme == SIGNATURE_SCHEME_MERKLE:
+        root = entry.get("merkle_root", "")
+        if not verify_merkle_proof(current_hash, entry.get("merkle_proof", []), root):
+            return False, "invalid merkle proof"
+        signed_message = root.encode()
+    elif scheme == SIGNATURE_SCHEME_ENTRY:
+        signed_message = canonical_str.encode()
+    else:
+        return False, f"unknown signature scheme '{scheme}'"
+
+    if not verify_signature(public_key_pem, algorithm, signed_message, entry.get("signature", "")):
+        return False, "invalid signature"
+    return True, ""
+
+
+def _verify_signature_chunk(public_key_pem: str, algorithm: str, items: List[Tuple[int, bytes, str]]) -> List[int]:
+    """Process-pool task: return the sequence numbers whose signature is invalid."""
+    return [
+        sequence
+        for sequence, message, signature in items
+        if not verify_signature(public_key_pem, algorithm, message, signature)
+    ]
+
+
+def _load_checkpoint(db) -> Optional[Dict[str, Any]]:
+    snapshot = db.collection(CHECKPOINT_COLLECTION).document(CHECKPOINT_DOCUMENT).get()
+    return snapshot.to_dict() if snapshot.exists else None
+
+
+def _save_checkpoint(db, sequence: int, current_hash: str) -> None:
+    db.collection(CHECKPOINT_COLLECTION).document(CHECKPOINT_DOCUMENT).set({
+        "sequence": sequence,
+        "current_hash": current_hash,
+        "verified_at": datetime.now(timezone.utc).isoformat(),
+    })
+
+
+def verify_chain(
+    db,
+    kms_client,
+    key_version_name: str,
+    collection_name: str = "secure_audit_ledger",
+    full: bool = False,
+    page_size: int = 1000,
+    workers: Optional[int] = None,
+    checkpoint_every_pages: int = 50,
+) -> Dict[str, Any]:
+    """
+    Verify the sequenced part of the ledger: sequence continuity, previous_hash
+    links, entry hashes, Merkle proofs and signatures.
+
+    Entries are streamed page by page, so memory stays constant however long
+    the ledger is. Signature checks run on a process pool (all cores by
+    default); the public key is fetched once. The checkpoint only advances over
+    pages whose entries all verified, and never past the first failure.
+
+    Args:
+        db: A firestore.Client
+        kms_client: A kms.KeyManagementServiceClient
+        key_version_name (str): The ledger's crypto key version resource name
+        collection_name (str): The ledger collection
+        full (bool): Ignore the checkpoint and verify from the first entry
+        page_size (int): Documents fetched per Firestore query
+        workers (Optional[int]): Signature worker processes (defaults to the CPU count)
+        checkpoint_every_pages (int): Also save the checkpoint every N verified pages
+
+    Returns:
+        dict: Counts, the checkpoint reached and the first failures found
+    """
+    started = time.perf_counter()
+    public_key_pem, algorithm = load_public_key(kms_client, key_version_name)
+    workers = workers or os.cpu_count() or 1
+
+    checkpoint = None if full else _load_checkpoint(db)
+    last_sequence = checkpoint["sequence"] if checkpoint else -1
+    prev_hash = checkpoint["current_hash"] if checkpoint else None
+    start_sequence = last_sequence + 1
+
+    failures: List[Dict[str, Any]] = []
+    first_failure: Optional[int] = None
+    verified_count = 0
+    signatures_checked = 0
+    checkpoint_sequence, checkpoint_hash = last_sequence, prev_hash
+    pages_since_save = 0
+
+    # Pages whose signature checks are still running: (last sequence, last hash, futures)
+    pending_pages = deque()
+    last_merkle_root = None
+    collection = db.collection(collection_name)
+
+    def record_failure(sequence: int, reason: str) -> None:
+        nonlocal first_failure
+        if first_failure is None or sequence < first_failure:
+            first_failure = sequence
+        if len(failures) < 100:
+            failures.append({"sequence": sequence, "reason": reason})
+
+    def settle_pages(block: bool) -> None:
+        """Collect finished signature checks and advance the checkpoint."""
+        nonlocal checkpoint_sequence, checkpoint_hash, pages_since_save
+        while pending_pages:
+            page_last_sequence, page_last_hash, futures = pending_pages[0]
+            if not block and not all(future.done() for future in futures):
+                return
+            pending_pages.popleft()
+            for future in futures:
+                for sequence in future.result():
+                    record_failure(sequence, "invalid signature")
+            if first_failure is None or first_failure > page_last_sequence:
+                checkpoint_sequence, checkpoint_hash = page_last_sequence, page_last_hash
+                pages_since_save += 1
+                if pages_since_save >= checkpoint_every_pages:
+                    _save_checkpoint(db, checkpoint_sequence, checkpoint_hash)
+                    pages_since_save = 0
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        while True:
+            page = list(
+                collection.where("sequence", ">", last_sequence)
+                          .order_by("sequence")
+                          .limit(page_size)
+                          .stream()
+            )
+            if not page:
+                break
+
+            futures = []
+            chunk: List[Tuple[int, bytes, str]] = []
+            for snapshot in page:
+                entry = snapshot.to_dict()
+                sequence = entry["sequence"]
+                verified_count += 1
+
+                if sequence != last_sequence + 1:
+                    record_failure(sequence, f"sequence gap after {last_sequence}")
+                if prev_hash is not None and entry.get("previous_hash") != prev_hash:
+                    record_failure(sequence, "previous_hash does not match the preceding entry")
+
+                canonical_str = canonical_entry(entry)
+                current_hash = entry.get("current_hash")
+                if hashlib.sha256(canonical_str.encode()).hexdigest() != current_hash:
+                    record_failure(sequence, "hash mismatch")
+
+                scheme = entry.get("signature_scheme", SIGNATURE_SCHEME_ENTRY)
+                if scheme == SIGNATURE_SCHEME_MERKLE:
+                    root = entry.get("merkle_root", "")
+                    if not verify_merkle_proof(current_hash, entry.get("merkle_proof", []), root):
+                        record_failure(sequence, "invalid merkle proof")
+                    # Entries of one batch are contiguous: check each root's signature once
+                    if root != last_merkle_root:
+                        chunk.append((sequence, root.encode(), entry.get("signature", "")))
+                        last_merkle_root = root
+                elif scheme == SIGNATURE_SCHEME_ENTRY:
+                    chunk.append((sequence, canonical_str.encode(), entry.get("signature", "")))
+                else:
+                    record_failure(sequence, f"unknown signature scheme '{scheme}'")
+
+                if len(chunk) >= SIGNATURE_CHUNK_SIZE:
+                    futures.append(pool.submit(_verify_signature_chunk, public_key_pem, algorithm, chunk))
+                    signatures_checked += len(chunk)
+                    chunk = []
+
+                last_sequence, prev_hash = sequence, current_hash
+
+            if chunk:
+                futures.append(pool.submit(_verify_signature_chunk, public_key_pem, algorithm, chunk))
+                signatures_checked += len(chunk)
+            pending_pages.append((last_sequence, prev_hash, futures))
+
+            # Bound the work in flight so memory stays flat on long ledgers
+            settle_pages(block=len(pending_pages) > 2 * workers)
+
+        settle_pages(block=True)
+
+    if checkpoint_sequence >= start_sequence:
+        _save_checkpoint(db, checkpoint_sequence, checkpoint_hash)
+
+    return {
+        "status": "success" if first_failure is None else "failed",
+        "mode": "full" if full or checkpoint is None else "incremental",
+        "start_sequence": start_sequence,
+        "last_sequence": last_sequence,
+        "entries_verified": verified_count,
+        "signatures_checked": signatures_checked,
+        "checkpoint_sequence": checkpoint_sequence,
+        "first_failure_sequence": first_failure,
+        "failures": failures,
+        "duration_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main() -> None:
+    """Command-line entry point: verify the ledger and print the report as JSON."""
+    from google.cloud import firestore
+    from google.cloud import kms
+
+    from ..config import LEDGER_KEY_NAME, LEDGER_KEY_RING, LOCATION, PROJECT_ID
+
+    parser = argparse.ArgumentParser(description="Verify the secure audit ledger chain.")
+    parser.add_argument("--full", action="store_true", help="Ignore the checkpoint and re-verify every entry")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None, help="Signature worker processes (default: all cores)")
+    parser.add_argument("--key-version", default="1")
+    args = parser.parse_args()
+
+    kms_client = kms.KeyManagementServiceClient()
+    key_version_name = kms_client.crypto_key_version_path(
+        PROJECT_ID, LOCATION or "us-central1", LEDGER_KEY_RING, LEDGER_KEY_NAME, args.key_version
+    )
+    report = verify_chain(
+        firestore.Client(project=PROJECT_ID),
+        kms_client,
+        key_version_name,
+        full=args.full,
+        page_size=args.page_size,
+        workers=args.workers,
+    )
+    print(json.dumps(report, indent=2))
+    raise SystemExit(0 if report["status"] == "success" else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+"""
+Local BM25 inverted index for hybrid lexical + vector retrieval.
+
+Vector retrieval is weak on exact identifiers (SKUs, error codes, policy
+numbers): "ERR-4021" and "ERR-4012" embed almost identically. With
+HYBRID_RETRIEVAL_ENABLED, every corpus also gets a BM25 index over the text of
+its plain-text GCS sources, chunked like the client-side chunker does.
+rag_query runs the lexical lookup next to the vector lookup and fuses their
+scores (fusion.hybrid_score_fusion).
+
+The index is maintained incrementally: add_data indexes the sources it
+imported (replacing earlier versions), delete_document and delete_corpus drop
+theirs. A corpus that predates the index is indexed from its RagFiles in a
+background job on its first hybrid query; changes made while that build runs
+are replayed onto it before it is stored, and a failed build is not retried for
+LEXICAL_INDEX_RETRY_SECONDS unless the corpus changes. Sources that are not
+plain-text GCS objects are only found by the vector lookup.
+
+Each corpus is stored as one .npz file in LEXICAL_INDEX_DIR:
+
+    terms            sorted vocabulary, UTF-8, newline-separated
+    term_offsets     (T + 1,) start of each term's postings
+    doc_deltas       (P,) document ids, delta-encoded within each term's postings
+    term_freqs       (P,) term frequency of each posting
+    doc_lengths      (D,) tokens per chunk
+    doc_sources      (D,) index into source_uris / source_names
+    text_offsets     (D + 1,) byte offsets of each chunk in texts
+    texts            UTF-8 chunk texts
+
+doc_deltas, term_freqs and doc_sources use the narrowest unsigned dtype that
+holds their values. All files are loaded when the process starts; the
+vocabulary becomes a dict, nothing is re-tokenized.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import (
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_CHUNK_SIZE,
+    HYBRID_RETRIEVAL_ENABLED,
+    LEXICAL_INDEX_DIR,
+    LEXICAL_INDEX_RETRY_SECONDS,
+)
+from .chunking import chunk_stream, is_locally_chunkable, stream_gcs_text
+from .ingestion_manifest import rag_file_source_uri
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Sources merged into the index at a time when indexing a whole corpus
+BUILD_BATCH_SOURCES = 200
+# Identifiers keep their separators ("err-4021", "v1.2.3", "policy#77") and are
+# also indexed by their parts
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./:#][a-z0-9]+)*")
+_PART = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word and identifier tokens; compound identifiers also yield their parts."""
+    words = _TOKEN.findall(text.lower())
+    if all(word.isalnum() for word in words):
+        return words
+    tokens = []
+    for word in words:
+        tokens.append(word)
+        if not word.isalnum():
+            tokens.extend(_PART.findall(word))
+    return tokens
+
+
+def _narrow(values: np.ndarray) -> np.ndarray:
+    """values in the smallest unsigned dtype that holds them."""
+    return values.astype(np.min_scalar_type(int(values.max()) if len(values) else 0))
+
+
+class CorpusLexicalIndex:
+    """
+    An immutable BM25 index of one corpus. Updates return a new index, so
+    searches never take a lock.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.arrays = arrays
+        vocabulary = arrays["terms"].tobytes().decode("utf-8")
+        self.terms = np.array(vocabulary.split("\n") if vocabulary else [], dtype=str)
+        self.term_offsets = arrays["term_offsets"]
+        self.doc_deltas = arrays["doc_deltas"]
+        self.term_freqs = arrays["term_freqs"]
+        self.doc_lengths = arrays["doc_lengths"]
+        self.doc_sources = arrays["doc_sources"]
+        self.text_offsets = arrays["text_offsets"]
+        self.texts = arrays["texts"]
+        self.source_uris = arrays["source_uris"].tolist()
+        self.source_names = arrays["source_names"].tolist()
+        self.term_ids = dict(zip(self.terms.tolist(), range(len(self.terms))))
+        self.doc_count = len(self.doc_lengths)
+        average_length = float(self.doc_lengths.mean()) if self.doc_count else 1.0
+        # The length-normalization part of the BM25 denominator, per chunk
+        self._norms = (BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / max(average_length, 1.0))).astype(np.float32)
+
+    @classmethod
+    def empty(cls) -> "CorpusLexicalIndex":
+        return cls._encode(
+            np.zeros(0, dtype=str), np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.int64),
+            np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.uint8), np.zeros(0, np.int64), [], [],
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "CorpusLexicalIndex":
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".npz", delete=False) as f:
+            np.savez(f, **self.arrays)
+        os.replace(f.name, path)
+
+    @classmethod
+    def _encode(cls, vocabulary: np.ndarray, posting_terms: np.ndarray, posting_docs: np.ndarray,
+                posting_freqs: np.ndarray, doc_lengths: np.ndarray, doc_sources: np.ndarray,
+                texts: np.ndarray, text_lengths: np.ndarray,
+                source_uris: List[str], source_names: List[str]) -> "CorpusLexicalIndex":
+        """Build the compact arrays from postings sorted by (term, doc) and the concatenated chunk texts."""
+        term_offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum(np.bincount(posting_terms, minlength=len(vocabulary)))
+        deltas = posting_docs.copy()
+        deltas[1:] -= posting_docs[:-1]
+        # The first posting of each term stores its document id as is
+        starts = term_offsets[:-1][term_offsets[:-1] < term_offsets[1:]]
+        deltas[starts] = posting_docs[starts]
+        text_offsets = np.zeros(len(text_lengths) + 1, dtype=np.int64)
+        text_offsets[1:] = np.cumsum(text_lengths)
+        return cls({
+            # Tokens never contain whitespace
+            "terms": np.frombuffer("\n".join(vocabulary.tolist()).encode("utf-8"), dtype=np.uint8),
+            "term_offsets": term_offsets,
+            "doc_deltas": _narrow(deltas),
+            "term_freqs": _narrow(np.minimum(posting_freqs, 65535)),
+            "doc_lengths": doc_lengths.astype(np.uint32),
+            "doc_sources": _narrow(doc_sources),
+            "text_offsets": text_offsets,
+            "texts": texts.astype(np.uint8),
+            "source_uris": np.array(source_uris, dtype=str),
+            "source_names": np.array(source_names, dtype=str),
+        })
+
+    def _decode(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Every posting's term id and document id."""
+        lengths = np.diff(self.term_offsets)
+        posting_terms = np.repeat(np.arange(len(self.terms)), lengths)
+        running = np.cumsum(self.doc_deltas, dtype=np.int64)
+        starts = self.term_offsets[:-1]
+        # Undo the running sum carried over from the previous term's postings
+        before = np.where(starts > 0, running[np.maximum(starts - 1, 0)], 0)
+        return posting_terms, running - np.repeat(before, lengths)
+
+    def _text(self, doc: int) -> bytes:
+        return self.texts[self.text_offsets[doc]:self.text_offsets[doc + 1]].tobytes()
+
+    def _rebuild(self, keep_docs: np.ndarray, additions: List[Tuple[str, str, List[str]]]) -> "CorpusLexicalIndex":
+        """A new index with the kept documents (renumbered) followed by the chunks of each added (uri, name, chunks)."""
+        posting_terms, posting_docs = self._decode()
+        posting_freqs = self.term_freqs.astype(np.int64)
+        text_lengths = np.diff(self.text_offsets)
+        texts = self.texts
+        if not keep_docs.all():
+            keep = keep_docs[posting_docs]
+            renumber = np.cumsum(keep_docs) - 1
+            posting_terms, posting_docs, posting_freqs = posting_terms[keep], renumber[posting_docs[keep]], posting_freqs[keep]
+            texts = texts[np.repeat(keep_docs, text_lengths)]
+            text_lengths = text_lengths[keep_docs]
+        old_vocabulary = self.terms[np.unique(posting_terms)]
+
+        # Sources still referenced, renumbered
+        kept_sources = self.doc_sources[keep_docs].astype(np.int64)
+        used = np.unique(kept_sources)
+        source_uris = [self.source_uris[i] for i in used]
+        source_names = [self.source_names[i] for i in used]
+        doc_sources = [np.searchsorted(used, kept_sources)]
+        doc_lengths = [self.doc_lengths[keep_docs].astype(np.int64)]
+        first_new_doc = len(doc_lengths[0])
+
+        new_terms: List[str] = []
+        new_docs: List[int] = []
+        new_freqs: List[int] = []
+        new_lengths: List[int] = []
+        new_texts: List[bytes] = []
+        for source_uri, source_name, chunks in additions:
+            if not chunks:
+                continue
+            source_uris.append(source_uri)
+            source_names.append(source_name)
+            doc_sources.append(np.full(len(chunks), len(source_uris) - 1, dtype=np.int64))
+            for chunk in chunks:
+                tokens = tokenize(chunk)
+                counts = Counter(tokens)
+                new_terms.extend(counts)
+                new_docs.extend([first_new_doc + len(new_lengths)] * len(counts))
+                new_freqs.extend(counts.values())
+                new_lengths.append(len(tokens))
+                new_texts.append(chunk.encode("utf-8"))
+        doc_lengths.append(np.asarray(new_lengths, dtype=np.int64))
+
+        # Kept postings are still sorted by (term, doc) after mapping their terms into
+        # the merged vocabulary; new postings have higher doc ids, so a stable sort by
+        # term merges the two runs
+        new_terms_array = np.array(new_terms, dtype=str)
+        vocabulary = np.union1d(old_vocabulary, new_terms_array)
+        old_term_ids = np.zeros(len(self.terms), dtype=np.int64)
+        old_term_ids[np.unique(posting_terms)] = np.searchsorted(vocabulary, old_vocabulary)
+        new_term_ids = np.searchsorted(vocabulary, new_terms_array) if new_terms else np.zeros(0, np.int64)
+        new_order = np.argsort(new_term_ids, kind="stable")
+        all_terms = np.concatenate([old_term_ids[posting_terms], new_term_ids[new_order]])
+        all_docs = np.concatenate([posting_docs, np.asarray(new_docs, dtype=np.int64)[new_order]])
+        all_freqs = np.concatenate([posting_freqs, np.asarray(new_freqs, dtype=np.int64)[new_order]])
+        order = np.argsort(all_terms, kind="stable")
+        return self._encode(
+            vocabulary, all_terms[order], all_docs[order], all_freqs[order],
+            np.concatenate(doc_lengths), np.concatenate(doc_sources),
+            np.concatenate([texts, np.frombuffer(b"".join(new_texts), dtype=np.uint8)]),
+            np.concatenate([text_lengths, [len(text) for text in new_texts]]).astype(np.int64),
+            source_uris, source_names,
+        )
+
+    def with_sources(self, additions: List[Tuple[str, str, List[str]]]) -> "CorpusLexicalIndex":
+        """This index with the (uri, name, chunks) sources added, replacing earlier versions of them."""
+        return self._rebuild(self._docs_not_from([uri for uri, _, _ in additions]), additions)
+
+    def without_sources(self, source_uris: List[str]) -> "CorpusLexicalIndex":
+        return self._rebuild(self._docs_not_from(source_uris), [])
+
+    def _docs_not_from(self, source_uris: List[str]) -> np.ndarray:
+        ids = [i for i, uri in enumerate(self.source_uris) if uri in set(source_uris)]
+        return ~np.isin(self.doc_sources, ids)
+
+    def search(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """The top_k chunks by BM25 score, best first; chunks sharing no term with the query are never returned."""
+        term_ids = {self.term_ids[t] for t in tokenize(query) if t in self.term_ids}
+        if not term_ids or not self.doc_count:
+            return []
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term in term_ids:
+            start, end = self.term_offsets[term], self.term_offsets[term + 1]
+            docs = np.cumsum(self.doc_deltas[start:end], dtype=np.int64)
+            freqs = self.term_freqs[start:end].astype(np.float32)
+            idf = np.log1p((self.doc_count - (end - start) + 0.5) / ((end - start) + 0.5))
+            # Each document appears once per term, so plain fancy-index accumulation is exact
+            scores[docs] += idf * freqs * (BM25_K1 + 1) / (freqs + self._norms[docs])
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [
+            {
+                "source_uri": self.source_uris[self.doc_sources[doc]],
+                "source_name": self.source_names[self.doc_sources[doc]],
+                "text": self._text(int(doc)).decode("utf-8"),
+                "lexical_score": round(float(scores[doc]), 6),
+            }
+            for doc in matched
+        ]
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays.values())
+
+
+def source_chunks(source_uri: str) -> List[str]:
+    """A plain-text GCS source's chunks, as the client-side chunker produces them."""
+    return list(chunk_stream(stream_gcs_text(source_uri), DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP))
+
+
+class LexicalIndex:
+    """
+    The BM25 indexes of all corpora, persisted in one directory.
+
+    Args:
+        directory (str): Where each corpus' .npz file is stored
+        search_workers (int): Threads that run lexical lookups next to vector lookups
+        retry_seconds (int): How long a failed build of a corpus version is not retried
+    """
+
+    def __init__(self, directory: str, search_workers: int = 4, retry_seconds: int = 300):
+        self.directory = directory
+        self.retry_seconds = retry_seconds
+        # Guards the index table; a corpus' index is rebuilt and saved under its
+        # own update lock, so searches only wait for the swap
+        self._lock = threading.Lock()
+        self._update_locks: Dict[str, threading.Lock] = {}
+        self._indexes: Dict[str, CorpusLexicalIndex] = {}
+        # Changes to a corpus that arrive while it is being built, replayed onto the build
+        self._builds: Dict[str, List[Callable[[CorpusLexicalIndex], CorpusLexicalIndex]]] = {}
+        # corpus -> (corpus version, monotonic time) of its last failed build
+        self._failed: Dict[str, Tuple[int, float]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix="lexical")
+        self.searches = 0
+        self.builds = 0
+        self.build_failures = 0
+        self._load_all()
+
+    def _path(self, corpus: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(corpus.encode()).hexdigest()[:16] + ".npz")
+
+    def _load_all(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+            try:
+                index = CorpusLexicalIndex.load(os.path.join(self.directory, name))
+                self._indexes[str(index.arrays["corpus"])] = index
+            except Exception as e:
+                logger.warning(f"Skipping unreadable lexical index {name}: {e}")
+
+    def _update_lock(self, corpus: str) -> threading.Lock:
+        with self._lock:
+            return self._update_locks.setdefault(corpus, threading.Lock())
+
+    def _store(self, corpus: str, index: CorpusLexicalIndex) -> None:
+        # Called with the corpus' update lock held
+        index.arrays["corpus"] = np.array(corpus)
+        index.save(self._path(corpus))
+        with self._lock:
+            self._indexes[corpus] = index
+
+    def _update(self, corpus: str, change: Callable[[CorpusLexicalIndex], CorpusLexicalIndex],
+                create: bool = True) -> None:
+        """Apply a change to a corpus' index, or queue it for the build in progress."""
+        with self._update_lock(corpus):
+            with self._lock:
+                pending = self._builds.get(corpus)
+                if pending is not None:
+                    pending.append(change)
+                    return
+                index = self._indexes.get(corpus)
+            if index is None and not create:
+                return
+            self._store(corpus, change(index or CorpusLexicalIndex.empty()))
+
+    def has(self, corpus: str) -> bool:
+        with self._lock:
+            return corpus in self._indexes
+
+    def tracks(self, corpus: str) -> bool:
+        """Whether a corpus is indexed or being built, so changes to it must be indexed too."""
+        with self._lock:
+            return corpus in self._indexes or corpus in self._builds
+
+    def should_build(self, corpus: str, version: int) -> bool:
+        """False while a build of this corpus version failed less than retry_seconds ago."""
+        with self._lock:
+            failed = self._failed.get(corpus)
+        return failed is None or failed[0] != version or time.monotonic() - failed[1] >= self.retry_seconds
+
+    def add_sources(self, corpus: str, source_uris: List[str]) -> int:
+        """
+        Index plain-text GCS sources of a corpus, replacing their earlier versions.
+        Returns the number of chunks indexed.
+        """
+        additions = [(uri, uri.rsplit("/", 1)[-1], source_chunks(uri)) for uri in source_uris]
+        self._update(corpus, lambda index: index.with_sources(additions))
+        return sum(len(chunks) for _, _, chunks in additions)
+
+    def remove_source(self, corpus: str, source_uri: str) -> None:
+        self._update(
+            corpus,
+            lambda index: index.without_sources([source_uri]) if source_uri in index.source_uris else index,
+            create=False,
+        )
+
+    def drop_corpus(self, corpus: str) -> None:
+        with self._update_lock(corpus):
+            with self._lock:
+                self._indexes.pop(corpus, None)
+                # A build in progress finds its change log gone and discards its index
+                self._builds.pop(corpus, None)
+            try:
+                os.remove(self._path(corpus))
+            except FileNotFoundError:
+                pass
+
+    def build(self, corpus: str, version: int, rag_files: Iterable, on_progress=None) -> Dict[str, int]:
+        """
+        Index every plain-text GCS source among a corpus' RagFiles (for corpora
+        that predate the index). Sources added or removed while the build runs
+        are applied to the built index before it is stored.
+        """
+        report = on_progress or (lambda paths, **fields: None)
+        with self._update_lock(corpus):
+            with self._lock:
+                pending = self._builds.setdefault(corpus, [])
+        try:
+            index = CorpusLexicalIndex.empty()
+            batch: List[Tuple[str, str, List[str]]] = []
+            sources = chunks = 0
+            for rag_file in rag_files:
+                source_uri = rag_file_source_uri(rag_file)
+                if not source_uri or not is_locally_chunkable(source_uri):
+                    continue
+                batch.append((source_uri, rag_file.display_name, source_chunks(source_uri)))
+                sources += 1
+                chunks += len(batch[-1][2])
+                if len(batch) == BUILD_BATCH_SOURCES:
+                    index, batch = index.with_sources(batch), []
+                    report([corpus], status="indexing", sources=sources)
+            index = index.with_sources(batch)
+            with self._update_lock(corpus):
+                with self._lock:
+                    current = self._builds.get(corpus) is pending
+                    replay = list(pending) if current else []
+                if current:
+                    for change in replay:
+                        index = change(index)
+                    self._store(corpus, index)
+        except Exception:
+            with self._lock:
+                self._failed[corpus] = (version, time.monotonic())
+                self.build_failures += 1
+            raise
+        finally:
+            with self._lock:
+                if self._builds.get(corpus) is pending:
+                    del self._builds[corpus]
+        with self._lock:
+            self._failed.pop(corpus, None)
+            self.builds += 1
+        if not current:
+            logger.info(f"Discarded the lexical index build of {corpus}: the corpus was deleted meanwhile")
+        report([corpus], status="succeeded", sources=sources, chunks=chunks)
+        return {"sources": sources, "chunks": chunks}
+
+    def search(self, corpus: str, query: str, top_k: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            index = self._indexes.get(corpus)
+            self.searches += 1
+        return index.search(query, top_k) if index is not None else []
+
+    def submit_search(self, corpus: str, query: str, top_k: int) -> Future:
+        """Run search() on the lexical thread pool, so it overlaps the vector lookup."""
+        return self._executor.submit(self.search, corpus, query, top_k)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "corpora": {
+                    corpus: {"chunks": index.doc_count, "terms": len(index.terms),
+                             "postings": len(index.doc_deltas), "bytes": index.nbytes()}
+                    for corpus, index in self._indexes.items()
+                },
+                "searches": self.searches,
+                "builds": self.builds,
+                "build_failures": self.build_failures,
+            }
+
+
+lexical_index: Optional[LexicalIndex] = LexicalIndex(
+    LEXICAL_INDEX_DIR, retry_seconds=LEXICAL_INDEX_RETRY_SECONDS
+) if HYBRID_RETRIEVAL_ENABLED else None
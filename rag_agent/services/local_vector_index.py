@@ -0,0 +1,536 @@
+"""
+Memory-mapped local mirror of small, heavily queried corpora.
+
+Every rag_query is a remote rag.retrieval_query call, even for corpora that
+would fit on one machine. For the corpora selected by LOCAL_VECTOR_CORPORA,
+the corpus' plain-text GCS sources are chunked the way the client-side
+chunker does (DEFAULT_CHUNK_SIZE words, DEFAULT_CHUNK_OVERLAP overlap),
+embedded with the configured embedder and written to a mirror directory:
+
+    meta.json         corpus, dtype, dimension, sources, RagFile fingerprint
+    vectors.npy       (n, dim) float16, or int8 with a per-row scale
+    scales.npy        (n,) float32 dequantization scales (int8 only)
+    source_ids.npy    (n,) uint32 index into meta["sources"]
+    text_spans.npy    (n, 2) int64 byte offset and length of each chunk
+    texts.bin         UTF-8 chunk texts
+    centroids.npy,    IVF partitions, for mirrors of LOCAL_VECTOR_IVF_MIN_VECTORS
+    list_offsets.npy  chunks or more; rows are stored grouped by partition
+
+Every array is opened with mmap, so a loaded mirror costs page cache, not
+heap. Queries score the vectors with one matrix-vector product per block of
+rows (or only the LOCAL_VECTOR_IVF_NPROBE closest partitions) and return the
+same contexts as rag_query: source_uri, source_name, text and score, where
+score is the cosine distance and contexts above the distance threshold are
+dropped.
+
+A mirror is only served while it matches the corpus: meta.json records a
+fingerprint of the corpus' RagFiles, checked when the mirror is loaded and
+every LOCAL_VECTOR_INDEX_REVALIDATE_SECONDS, and the in-process corpus version
+(bumped by add_data, delete_document, delete_corpus) must not have changed
+since. Corpora with sources the mirror cannot read (PDF, Drive, ...) are not
+mirrored and keep using remote retrieval.
+
+Building a mirror embeds the whole corpus. Chunks are sent in requests of at
+most EMBED_BATCH_MAX_TEXTS texts and an estimated EMBED_BATCH_MAX_TOKENS
+tokens, under the embedding model's per-request token limit, and a Vertex AI
+build holds a share of the embedding quota (embedding_quota) like an import
+shard does, pacing its requests to the rate it was granted.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import (
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_CHUNK_SIZE,
+    INGESTION_SHARD_CONCURRENCY,
+    LOCAL_VECTOR_CORPORA,
+    LOCAL_VECTOR_INDEX_DIR,
+    LOCAL_VECTOR_INDEX_DTYPE,
+    LOCAL_VECTOR_INDEX_EMBEDDER,
+    LOCAL_VECTOR_INDEX_REVALIDATE_SECONDS,
+    LOCAL_VECTOR_IVF_MIN_VECTORS,
+    LOCAL_VECTOR_IVF_NPROBE,
+)
+from .chunking import chunk_stream, is_locally_chunkable, stream_gcs_text
+from .history_compaction import CHARS_PER_TOKEN
+from .ingestion_manifest import rag_file_source_uri
+from .rate_limiter import embedding_quota
+from .semantic_cache import Embedder, HashingEmbedder, VertexTextEmbedder
+
+logger = logging.getLogger(__name__)
+
+MIRROR_FORMAT = 1
+# Rows scored per matrix-vector product; the float32 copy of a block stays in cache
+BLOCK_ROWS = 4096
+# Limits of one embedding request; text-embedding-005 accepts 250 texts and 20k tokens
+EMBED_BATCH_MAX_TEXTS = 250
+EMBED_BATCH_MAX_TOKENS = 15000
+KMEANS_ITERATIONS = 10
+
+
+class MirrorUnavailable(Exception):
+    """The corpus cannot be mirrored (e.g. it has sources that are not plain-text GCS objects)."""
+
+
+def files_fingerprint(rag_files: Iterable) -> str:
+    """A digest of a corpus' RagFiles and their update times; changes when files are added, removed or replaced."""
+    entries = sorted(f"{rag_file.name}@{rag_file.update_time}" for rag_file in rag_files)
+    return hashlib.sha256("\n".join(entries).encode()).hexdigest()
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Store unit vectors as float16, or as int8 with a per-row scale."""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unknown local vector index dtype: {dtype}")
+
+
+def _kmeans(sample: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids of unit vectors."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=nlist)
+        empty = counts == 0
+        # Reseed empty partitions with random points
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class MirrorWriter:
+    """
+    Streams chunks and their embeddings into a new mirror directory.
+
+    Args:
+        path (str): Directory to create (replaced atomically by finish())
+        dtype (str): "float16" or "int8"
+    """
+
+    def __init__(self, path: str, dtype: str):
+        self.path = path
+        self.dtype = dtype
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._tmp = tempfile.mkdtemp(dir=parent, prefix=".building-")
+        self._texts = open(os.path.join(self._tmp, "texts.bin"), "wb")
+        self._offset = 0
+        self._vectors: List[np.ndarray] = []
+        self._scales: List[np.ndarray] = []
+        self._source_ids: List[np.ndarray] = []
+        self._spans: List[Tuple[int, int]] = []
+        self.sources: List[Tuple[str, str]] = []
+
+    def add_source(self, source_uri: str, source_name: str) -> int:
+        self.sources.append((source_uri, source_name))
+        return len(self.sources) - 1
+
+    def add(self, source_id: int, texts: List[str], vectors: np.ndarray) -> None:
+        """Append chunks of one source with their unit-normalized embeddings."""
+        stored, scales = quantize(vectors, self.dtype)
+        self._vectors.append(stored)
+        if scales is not None:
+            self._scales.append(scales)
+        self._source_ids.append(np.full(len(texts), source_id, dtype=np.uint32))
+        for text in texts:
+            data = text.encode("utf-8")
+            self._texts.write(data)
+            self._spans.append((self._offset, len(data)))
+            self._offset += len(data)
+
+    def finish(self, meta: Dict[str, Any], ivf_min_vectors: int) -> Dict[str, Any]:
+        """Write the arrays (IVF-ordered if large enough) and meta.json, then swap the mirror into place."""
+        self._texts.close()
+        try:
+            dim = meta["dim"]
+            vectors = np.concatenate(self._vectors) if self._vectors else np.zeros((0, dim), dtype=self.dtype)
+            scales = np.concatenate(self._scales) if self._scales else None
+            source_ids = np.concatenate(self._source_ids) if self._source_ids else np.zeros(0, dtype=np.uint32)
+            spans = np.asarray(self._spans, dtype=np.int64).reshape(-1, 2)
+            count = len(vectors)
+
+            ivf = None
+            if count >= ivf_min_vectors:
+                nlist = int(min(4096, max(16, 4 * np.sqrt(count))))
+                rng = np.random.default_rng(0)
+                sample_rows = np.sort(rng.choice(count, min(count, max(nlist * 64, 20000)), replace=False))
+                centroids = _kmeans(_dequantize(vectors[sample_rows], scales[sample_rows] if scales is not None else None), nlist)
+                assignment = np.concatenate([
+                    np.argmax(
+                        _dequantize(vectors[start:start + BLOCK_ROWS],
+                                    scales[start:start + BLOCK_ROWS] if scales is not None else None) @ centroids.T,
+                        axis=1,
+                    )
+                    for start in range(0, count, BLOCK_ROWS)
+                ])
+                order = np.argsort(assignment, kind="stable")
+                vectors, source_ids, spans = vectors[order], source_ids[order], spans[order]
+                scales = scales[order] if scales is not None else None
+                list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+                list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=nlist))
+                np.save(os.path.join(self._tmp, "centroids.npy"), centroids)
+                np.save(os.path.join(self._tmp, "list_offsets.npy"), list_offsets)
+                ivf = {"nlist": nlist}
+
+            np.save(os.path.join(self._tmp, "vectors.npy"), vectors)
+            if scales is not None:
+                np.save(os.path.join(self._tmp, "scales.npy"), scales)
+            np.save(os.path.join(self._tmp, "source_ids.npy"), source_ids)
+            np.save(os.path.join(self._tmp, "text_spans.npy"), spans)
+            meta = {
+                **meta,
+                "format": MIRROR_FORMAT,
+                "dtype": self.dtype,
+                "count": count,
+                "sources": self.sources,
+                "ivf": ivf,
+                "built_at": time.time(),
+            }
+            with open(os.path.join(self._tmp, "meta.json"), "w") as f:
+                json.dump(meta, f)
+
+            # Readers that still map the old mirror keep their (unlinked) files
+            if os.path.exists(self.path):
+                retired = self.path + f".old-{os.getpid()}-{time.monotonic_ns()}"
+                os.replace(self.path, retired)
+                os.replace(self._tmp, self.path)
+                shutil.rmtree(retired, ignore_errors=True)
+            else:
+                os.replace(self._tmp, self.path)
+            return meta
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self) -> None:
+        self._texts.close()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+def _dequantize(block: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    values = block.astype(np.float32)
+    return values * scales[:, None] if scales is not None else values
+
+
+class LocalVectorIndex:
+    """
+    A read-only, memory-mapped mirror of one corpus.
+
+    Args:
+        path (str): Mirror directory written by MirrorWriter
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != MIRROR_FORMAT:
+            raise ValueError(f"Unsupported mirror format in {path}")
+        self.count = self.meta["count"]
+        self.sources = self.meta["sources"]
+
+        def load(name: str) -> Optional[np.ndarray]:
+            file = os.path.join(path, name)
+            return np.load(file, mmap_mode="r") if os.path.exists(file) else None
+
+        self.vectors = load("vectors.npy")
+        self.scales = load("scales.npy")
+        self.source_ids = load("source_ids.npy")
+        self.text_spans = load("text_spans.npy")
+        self.centroids = load("centroids.npy")
+        self.list_offsets = load("list_offsets.npy")
+        self._texts = (
+            np.memmap(os.path.join(path, "texts.bin"), dtype=np.uint8, mode="r")
+            if os.path.getsize(os.path.join(path, "texts.bin")) else np.zeros(0, dtype=np.uint8)
+        )
+
+    def _row_ranges(self, query: np.ndarray, nprobe: int) -> List[Tuple[int, int]]:
+        if self.centroids is None:
+            return [(start, min(start + BLOCK_ROWS, self.count)) for start in range(0, self.count, BLOCK_ROWS)]
+        nprobe = min(nprobe, len(self.centroids))
+        probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        ranges = []
+        for partition in np.sort(probed):
+            start, end = int(self.list_offsets[partition]), int(self.list_offsets[partition + 1])
+            ranges.extend((s, min(s + BLOCK_ROWS, end)) for s in range(start, end, BLOCK_ROWS))
+        return ranges
+
+    def search_rows(self, query: np.ndarray, top_k: int, distance_threshold: float,
+                    nprobe: int = LOCAL_VECTOR_IVF_NPROBE) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows of the closest chunks and their cosine distances, closest first.
+
+        Args:
+            query (np.ndarray): Unit-normalized query embedding
+            top_k (int): Most rows to return
+            distance_threshold (float): Largest cosine distance returned
+            nprobe (int): IVF partitions scanned (ignored without IVF)
+        """
+        query = np.asarray(query, dtype=np.float32)
+        best_rows: List[np.ndarray] = []
+        best_distances: List[np.ndarray] = []
+        block = np.empty((BLOCK_ROWS, self.vectors.shape[1]), dtype=np.float32)
+        for start, end in self._row_ranges(query, nprobe):
+            np.copyto(block[:end - start], self.vectors[start:end])
+            similarities = block[:end - start] @ query
+            if self.scales is not None:
+                similarities *= self.scales[start:end]
+            distances = 1.0 - similarities
+            keep = np.flatnonzero(distances <= distance_threshold)
+            if len(keep) > top_k:
+                keep = keep[np.argpartition(distances[keep], top_k - 1)[:top_k]]
+            best_rows.append(keep + start)
+            best_distances.append(distances[keep])
+        if not best_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows, distances = np.concatenate(best_rows), np.concatenate(best_distances)
+        order = np.argsort(distances, kind="stable")[:top_k]
+        return rows[order], distances[order]
+
+    def context(self, row: int, distance: float) -> Dict[str, Any]:
+        """One result in the shape rag_query returns."""
+        offset, length = self.text_spans[row]
+        source_uri, source_name = self.sources[int(self.source_ids[row])]
+        return {
+            "source_uri": source_uri,
+            "source_name": source_name,
+            "text": bytes(self._texts[offset:offset + length]).decode("utf-8"),
+            "score": round(float(distance), 6),
+        }
+
+    def search(self, query: np.ndarray, top_k: int, distance_threshold: float,
+               nprobe: int = LOCAL_VECTOR_IVF_NPROBE) -> List[Dict[str, Any]]:
+        rows, distances = self.search_rows(query, top_k, distance_threshold, nprobe)
+        return [self.context(int(row), float(distance)) for row, distance in zip(rows, distances)]
+
+
+def embedding_batches(chunks: Iterable[str]) -> Iterator[List[str]]:
+    """Group chunks into embedding requests of at most EMBED_BATCH_MAX_TEXTS texts and EMBED_BATCH_MAX_TOKENS tokens."""
+    batch: List[str] = []
+    tokens = 0
+    for chunk in chunks:
+        chunk_tokens = len(chunk) // CHARS_PER_TOKEN + 1
+        if batch and (len(batch) == EMBED_BATCH_MAX_TEXTS or tokens + chunk_tokens > EMBED_BATCH_MAX_TOKENS):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(chunk)
+        tokens += chunk_tokens
+    if batch:
+        yield batch
+
+
+@contextmanager
+def _embedding_pace(embedder: Embedder) -> Iterator[Callable[[], None]]:
+    """
+    Hold a share of the embedding quota for a build and yield a function to call
+    before each embedding request; it waits so requests stay within the share.
+    The hashing embedder makes no API calls and is not paced.
+    """
+    if isinstance(embedder, HashingEmbedder):
+        yield lambda: None
+        return
+    fair_share = max(1, embedding_quota.quota_per_min // INGESTION_SHARD_CONCURRENCY)
+    with embedding_quota.reserve(want=fair_share, minimum=max(1, fair_share // 4)) as rate:
+        interval = 60.0 / rate
+        next_slot = time.monotonic()
+
+        def pace() -> None:
+            nonlocal next_slot
+            delay = next_slot - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_slot = max(next_slot, time.monotonic()) + interval
+
+        yield pace
+
+
+def build_mirror(
+    corpus_resource_name: str,
+    rag_files: Iterable,
+    embedder: Embedder,
+    path: str,
+    dtype: str = LOCAL_VECTOR_INDEX_DTYPE,
+    ivf_min_vectors: int = LOCAL_VECTOR_IVF_MIN_VECTORS,
+    on_progress: Optional[Callable[..., None]] = None,
+) -> Dict[str, Any]:
+    """
+    Chunk, embed and write a mirror of a corpus.
+
+    Raises:
+        MirrorUnavailable: A RagFile's source is not a plain-text GCS object
+
+    Returns:
+        Dict[str, Any]: The mirror's meta (chunk count, sources, IVF layout)
+    """
+    report = on_progress or (lambda paths, **fields: None)
+    rag_files = list(rag_files)
+    unreadable = [f.display_name for f in rag_files if not is_locally_chunkable(rag_file_source_uri(f) or "")]
+    if unreadable:
+        raise MirrorUnavailable(
+            f"{len(unreadable)} file(s) are not plain-text GCS sources, e.g. {unreadable[0]}"
+        )
+
+    writer = MirrorWriter(path, dtype)
+    try:
+        with _embedding_pace(embedder) as pace:
+            for rag_file in rag_files:
+                source_uri = rag_file_source_uri(rag_file)
+                source_id = writer.add_source(source_uri, rag_file.display_name)
+                chunks = chunk_stream(stream_gcs_text(source_uri), DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP)
+                for batch in embedding_batches(chunks):
+                    pace()
+                    writer.add(source_id, batch, embedder.embed(batch))
+                report([corpus_resource_name], status="mirroring", last_source=source_uri)
+        return writer.finish(
+            {
+                "corpus": corpus_resource_name,
+                "dim": embedder.dim,
+                "embedder": type(embedder).__name__,
+                "files_fingerprint": files_fingerprint(rag_files),
+                "chunk_size": DEFAULT_CHUNK_SIZE,
+                "chunk_overlap": DEFAULT_CHUNK_OVERLAP,
+            },
+            ivf_min_vectors,
+        )
+    except BaseException:
+        writer.abort()
+        raise
+
+
+class LocalVectorIndexes:
+    """
+    The mirrors this process serves, keyed by corpus resource name.
+
+    Args:
+        directory (str): Where mirrors are stored, one subdirectory per corpus
+        embedder (Embedder): Embeds chunks and queries; must match the mirrors on disk
+        revalidate_seconds (float): How often a mirror is checked against the RagFile listing
+    """
+
+    def __init__(self, directory: str, embedder: Embedder, revalidate_seconds: float):
+        self.directory = directory
+        self.embedder = embedder
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        # corpus -> (index, corpus version it is valid for, monotonic time of last validation)
+        self._loaded: Dict[str, Tuple[LocalVectorIndex, int, float]] = {}
+        # corpus -> (corpus version, monotonic time) of its last failed build
+        self._failed: Dict[str, Tuple[int, float]] = {}
+        self.queries = 0
+        self.unavailable = 0
+        self.builds = 0
+        self.build_failures = 0
+
+    def path(self, corpus_resource_name: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(corpus_resource_name.encode()).hexdigest()[:16])
+
+    def get(self, corpus_resource_name: str, version: int,
+            list_rag_files: Callable[[], Iterable]) -> Optional[LocalVectorIndex]:
+        """
+        The corpus' mirror if it is current, else None (a rebuild is needed).
+
+        Args:
+            version (int): The in-process corpus version
+            list_rag_files (Callable): Lists the corpus' RagFiles, to validate the mirror
+        """
+        with self._lock:
+            loaded = self._loaded.get(corpus_resource_name)
+        now = time.monotonic()
+        if loaded and loaded[1] == version and now - loaded[2] < self.revalidate_seconds:
+            return loaded[0]
+
+        index = loaded[0] if loaded and loaded[1] == version else None
+        if index is None:
+            try:
+                index = LocalVectorIndex(self.path(corpus_resource_name))
+            except (OSError, ValueError):
+                index = None
+        if index is None or index.meta["embedder"] != type(self.embedder).__name__ \
+                or index.meta["files_fingerprint"] != files_fingerprint(list_rag_files()):
+            with self._lock:
+                self._loaded.pop(corpus_resource_name, None)
+                self.unavailable += 1
+            return None
+        with self._lock:
+            self._loaded[corpus_resource_name] = (index, version, now)
+        return index
+
+    def search(self, corpus_resource_name: str, version: int, query: str, top_k: int,
+               distance_threshold: float, list_rag_files: Callable[[], Iterable]) -> Optional[List[Dict[str, Any]]]:
+        """rag_query-shaped contexts from the corpus' mirror, or None if it has no current mirror."""
+        index = self.get(corpus_resource_name, version, list_rag_files)
+        if index is None:
+            return None
+        with self._lock:
+            self.queries += 1
+        return index.search(self.embedder.embed([query])[0], top_k, distance_threshold)
+
+    def should_build(self, corpus_resource_name: str, version: int) -> bool:
+        """False while a build of this corpus version failed less than revalidate_seconds ago."""
+        with self._lock:
+            failed = self._failed.get(corpus_resource_name)
+        return failed is None or failed[0] != version or time.monotonic() - failed[1] >= self.revalidate_seconds
+
+    def build(self, corpus_resource_name: str, version: int, rag_files: Iterable,
+              on_progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+        """(Re)build a corpus' mirror and serve it for the given corpus version."""
+        try:
+            meta = build_mirror(corpus_resource_name, rag_files, self.embedder, self.path(corpus_resource_name),
+                                on_progress=on_progress)
+        except Exception:
+            with self._lock:
+                self._failed[corpus_resource_name] = (version, time.monotonic())
+                self.build_failures += 1
+            raise
+        index = LocalVectorIndex(self.path(corpus_resource_name))
+        with self._lock:
+            self._loaded[corpus_resource_name] = (index, version, time.monotonic())
+            self._failed.pop(corpus_resource_name, None)
+            self.builds += 1
+        if on_progress is not None:
+            on_progress([corpus_resource_name], status="succeeded", chunks=meta["count"])
+        return {"chunks": meta["count"], "sources": len(meta["sources"]), "ivf": meta["ivf"]}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "corpora": {corpus: index.count for corpus, (index, _, _) in self._loaded.items()},
+                "queries": self.queries,
+                "unavailable": self.unavailable,
+                "builds": self.builds,
+                "build_failures": self.build_failures,
+            }
+
+
+def _make_embedder(name: str) -> Embedder:
+    if name == "vertex":
+        return VertexTextEmbedder()
+    if name == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"Unknown local vector index embedder: {name}")
+
+
+local_vector_indexes: Optional[LocalVectorIndexes] = None
+if LOCAL_VECTOR_CORPORA:
+    local_vector_indexes = LocalVectorIndexes(
+        LOCAL_VECTOR_INDEX_DIR,
+        embedder=_make_embedder(LOCAL_VECTOR_INDEX_EMBEDDER),
+        revalidate_seconds=LOCAL_VECTOR_INDEX_REVALIDATE_SECONDS,
+    )
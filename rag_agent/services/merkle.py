@@ -0,0 +1,102 @@
+"""
+Merkle tree helpers for batch-signing audit ledger entries.
+
+Leaves are the hex SHA-256 `current_hash` values of the entries in one batch.
+Leaf and interior nodes are domain-separated (0x00 / 0x01 prefixes) so an
+interior node can never be passed off as a leaf, and an odd node at the end of
+a level is carried up unchanged instead of being paired with a copy of itself.
+"""
+
+import hashlib
+from typing import Dict, List
+
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+
+def _leaf_hash(entry_hash: str) -> bytes:
+    return hashlib.sha256(_LEAF_PREFIX + bytes.fromhex(entry_hash)).digest()
+
+
+def _node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(_NODE_PREFIX + left + right).digest()
+
+
+def build_merkle_levels(entry_hashes: List[str]) -> List[List[bytes]]:
+    """
+    Build every level of the tree, leaves first and the root level last.
+
+    Args:
+        entry_hashes (List[str]): Hex entry hashes, in ledger order
+
+    Returns:
+        List[List[bytes]]: The node digests of each level
+    """
+    if not entry_hashes:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+
+    levels = [[_leaf_hash(entry_hash) for entry_hash in entry_hashes]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def merkle_root(levels: List[List[bytes]]) -> str:
+    """Return the hex root of a tree built by build_merkle_levels."""
+    return levels[-1][0].hex()
+
+
+def merkle_proof(levels: List[List[bytes]], index: int) -> List[Dict[str, str]]:
+    """
+    Return the inclusion proof for the leaf at `index`.
+
+    Each step names the sibling digest and the side it sits on, from the leaf
+    level up to just below the root. Levels where the node was carried up
+    without a sibling contribute no step.
+
+    Args:
+        levels (List[List[bytes]]): The tree, as returned by build_merkle_levels
+        index (int): Position of the leaf in the batch
+
+    Returns:
+        List[Dict[str, str]]: Steps of the form {"side": "L" | "R", "hash": hex}
+    """
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({
+                "side": "L" if sibling < index else "R",
+                "hash": level[sibling].hex(),
+            })
+        index //= 2
+    return proof
+
+
+def verify_merkle_proof(entry_hash: str, proof: List[Dict[str, str]], root: str) -> bool:
+    """
+    Check that `entry_hash` is included in the tree with the given root.
+
+    Args:
+        entry_hash (str): Hex hash of the entry
+        proof (List[Dict[str, str]]): Inclusion proof from merkle_proof
+        root (str): Hex Merkle root
+
+    Returns:
+        bool: True if the proof leads from the entry to the root
+    """
+    try:
+        node = _leaf_hash(entry_hash)
+        for step in proof:
+            sibling = bytes.fromhex(step["hash"])
+            if step["side"] == "L":
+                node = _node_hash(sibling, node)
+            else:
+                node = _node_hash(node, sibling)
+    except (KeyError, TypeError, ValueError):
+        return False
+    return node.hex() == root
@@ -0,0 +1,138 @@
+"""
+Per-request model and thinking-level routing.
+
+The agent is declared with its most capable tier (gemini-3-pro-preview with
+HIGH thinking), which is wasted on "list my corpora". route_model runs as a
+before_model_callback and picks a tier for the turn from cheap local features
+of the user's message:
+
+- fast:     short management commands (list, show files, status, delete ...)
+            that need at most one tool
+- deep:     long prompts, analysis wording (compare, why, explain ...) or
+            requests that look like they need several different tools
+- standard: everything else
+
+A tier is a model plus a thinking level (or thinking budget). The tiers,
+patterns and thresholds come from MODEL_ROUTER_POLICY and can be overridden
+with a JSON object in the MODEL_ROUTER_POLICY environment variable. The
+decision is made once per invocation, kept in temp: state so the follow-up
+model calls of the same turn use the same tier, logged, and counted in
+/stats.
+"""
+
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from ..config import MODEL_ROUTER_ENABLED, MODEL_ROUTER_POLICY
+
+logger = logging.getLogger(__name__)
+
+ROUTE_STATE_KEY = "temp:model_route"
+
+
+class ModelRouter:
+    """
+    Chooses a tier for a user message.
+
+    Args:
+        policy (Dict[str, Any]): Tiers, tool keywords, patterns and thresholds
+                                 (see MODEL_ROUTER_POLICY in config.py)
+    """
+
+    def __init__(self, policy: Dict[str, Any]):
+        self.policy = policy
+        self.tiers: Dict[str, Dict[str, Any]] = policy["tiers"]
+        self.default_tier = policy["default_tier"]
+        self._fast = [re.compile(p, re.IGNORECASE) for p in policy["fast_patterns"]]
+        self._deep = [re.compile(p, re.IGNORECASE) for p in policy["deep_patterns"]]
+        self._tools = {
+            tool: re.compile(r"\b(?:" + "|".join(words) + r")\b", re.IGNORECASE)
+            for tool, words in policy["tool_keywords"].items()
+        }
+        self._lock = threading.Lock()
+        self.decisions: Dict[str, int] = {tier: 0 for tier in self.tiers}
+
+    def features(self, text: str) -> Dict[str, Any]:
+        return {
+            "chars": len(text),
+            "fast_match": any(p.search(text) for p in self._fast),
+            "deep_match": any(p.search(text) for p in self._deep),
+            "tools": sorted(tool for tool, pattern in self._tools.items() if pattern.search(text)),
+        }
+
+    def choose(self, text: str) -> Dict[str, Any]:
+        """The tier for a message, with the features that decided it."""
+        features = self.features(text)
+        tools_needed = len(features["tools"])
+        # Deep signals win: "show me ... and explain why" starts like a command but needs reasoning
+        if (
+            features["deep_match"]
+            or features["chars"] >= self.policy["deep_min_chars"]
+            or tools_needed >= self.policy["deep_min_tools"]
+        ):
+            tier = "deep"
+        elif features["fast_match"] and features["chars"] <= self.policy["fast_max_chars"] and tools_needed <= 1:
+            tier = "fast"
+        else:
+            tier = self.default_tier
+        if tier not in self.tiers:
+            tier = self.default_tier
+        with self._lock:
+            self.decisions[tier] = self.decisions.get(tier, 0) + 1
+        return {"tier": tier, **self.tiers[tier], "features": features}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"decisions": dict(self.decisions), "tiers": self.tiers}
+
+
+def thinking_config(tier: Dict[str, Any]) -> Optional[types.ThinkingConfig]:
+    """The ThinkingConfig for a tier: a thinking_level (Gemini 3) or a thinking_budget (Gemini 2.5)."""
+    if tier.get("thinking_level"):
+        return types.ThinkingConfig(thinking_level=types.ThinkingLevel(tier["thinking_level"].upper()))
+    if tier.get("thinking_budget") is not None:
+        return types.ThinkingConfig(thinking_budget=int(tier["thinking_budget"]))
+    return None
+
+
+def _user_text(callback_context: CallbackContext, llm_request: LlmRequest) -> str:
+    content = callback_context.user_content
+    if content is None:
+        for candidate in reversed(llm_request.contents):
+            if candidate.role == "user" and any(part.text for part in candidate.parts or []):
+                content = candidate
+                break
+    parts: List[types.Part] = content.parts if content and content.parts else []
+    return " ".join(part.text for part in parts if part.text)
+
+
+def route_model(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """before_model_callback that applies the routed tier's model and thinking level."""
+    if model_router is None:
+        return None
+    route = callback_context.state.get(ROUTE_STATE_KEY)
+    if route is None:
+        route = model_router.choose(_user_text(callback_context, llm_request))
+        callback_context.state[ROUTE_STATE_KEY] = route
+        logger.info(
+            f"Routed invocation {callback_context.invocation_id} to tier '{route['tier']}' "
+            f"({route['model']}, thinking={route.get('thinking_level') or route.get('thinking_budget')}): "
+            f"{route['features']}"
+        )
+
+    llm_request.model = route["model"]
+    config = thinking_config(route)
+    if config is not None:
+        if llm_request.config is None:
+            llm_request.config = types.GenerateContentConfig()
+        llm_request.config.thinking_config = config
+    return None
+
+
+model_router = ModelRouter(MODEL_ROUTER_POLICY) if MODEL_ROUTER_ENABLED else None
@@ -0,0 +1,161 @@
+"""
+Embedding quota shared by concurrent imports, across threads and processes.
+
+rag.import_files paces its own embedding calls to the
+`max_embedding_requests_per_min` it is given, so the quota is handed out as
+rate: the limiter is a pool of tokens, one per embedding request per minute of
+the project quota. An import shard reserves tokens for as long as it runs and
+returns them when it finishes. The sum of the rates of every shard running on
+the machine therefore never exceeds the quota, and imports stay under it
+instead of all retrying on 429 at once.
+
+Reservations live in a small JSON file guarded by an fcntl lock, so every
+worker process on the host shares one pool. Reservations of processes that
+died are reclaimed. The pool is not shared between hosts: each instance
+enforces EMBEDDING_REQUESTS_PER_MIN_QUOTA on its own, so a deployment with
+several instances must give each one its share of the project quota.
+"""
+
+import fcntl
+import json
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from ..config import (
+    EMBEDDING_QUOTA_PATH,
+    EMBEDDING_REQUESTS_PER_MIN_QUOTA,
+)
+
+
+class QuotaTimeout(Exception):
+    """No tokens became available before the deadline."""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedRateLimiter:
+    """
+    File-backed pool of per-minute request tokens.
+
+    Args:
+        path (str): State file shared by every process using the quota
+        quota_per_min (int): Total requests per minute to divide
+        lease_seconds (float): A reservation older than this is reclaimed even if
+                               its process is still alive
+    """
+
+    def __init__(self, path: str, quota_per_min: int, lease_seconds: float = 3600.0):
+        self.path = path
+        self.quota_per_min = quota_per_min
+        self.lease_seconds = lease_seconds
+
+    def _try_reserve(self, want: int, minimum: int) -> Optional[tuple]:
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                leases: Dict[str, Dict] = json.loads(content) if content.strip() else {}
+                now = time.time()
+                leases = {
+                    lease_id: lease for lease_id, lease in leases.items()
+                    if lease["expires_at"] > now and _pid_alive(lease["pid"])
+                }
+                available = self.quota_per_min - sum(lease["rate"] for lease in leases.values())
+                granted = min(want, available)
+                lease_id = None
+                if granted >= minimum:
+                    lease_id = uuid.uuid4().hex
+                    leases[lease_id] = {"rate": granted, "pid": os.getpid(), "expires_at": now + self.lease_seconds}
+                f.seek(0)
+                f.truncate()
+                json.dump(leases, f)
+                f.flush()
+                return (lease_id, granted) if lease_id else None
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _release(self, lease_id: str) -> None:
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                leases = json.loads(content) if content.strip() else {}
+                leases.pop(lease_id, None)
+                f.seek(0)
+                f.truncate()
+                json.dump(leases, f)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def reserve(self, want: int, minimum: int = 1, timeout: Optional[float] = None) -> Iterator[int]:
+        """
+        Hold up to `want` tokens (requests per minute) for the duration of the block.
+
+        Args:
+            want (int): Tokens the caller would like
+            minimum (int): Smallest grant worth running with; waits until this many are free
+            timeout (float): Seconds to wait before raising QuotaTimeout (None waits forever)
+
+        Yields:
+            int: The granted rate, between minimum and want
+        """
+        want = max(1, min(want, self.quota_per_min))
+        minimum = max(1, min(minimum, want))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.2
+        while True:
+            reservation = self._try_reserve(want, minimum)
+            if reservation:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                raise QuotaTimeout(f"No embedding quota available within {timeout}s")
+            # Jitter keeps waiting shards from polling in lockstep
+            time.sleep(delay * (0.5 + random.random()))
+            delay = min(delay * 2, 5.0)
+
+        lease_id, granted = reservation
+        try:
+            yield granted
+        finally:
+            self._release(lease_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Tokens currently reserved and available."""
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                f.seek(0)
+                content = f.read()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        leases = json.loads(content) if content.strip() else {}
+        now = time.time()
+        reserved = sum(
+            lease["rate"] for lease in leases.values()
+            if lease["expires_at"] > now and _pid_alive(lease["pid"])
+        )
+        return {
+            "quota_per_min": self.quota_per_min,
+            "reserved_per_min": reserved,
+            "available_per_min": self.quota_per_min - reserved,
+            "reservations": len(leases),
+        }
+
+
+embedding_quota = SharedRateLimiter(EMBEDDING_QUOTA_PATH, EMBEDDING_REQUESTS_PER_MIN_QUOTA)
@@ -0,0 +1,160 @@
+"""
+Second-stage reranking of rag_query candidates.
+
+With RERANK_ENABLED, retrieve_contexts over-fetches RERANK_OVERFETCH_FACTOR x
+top_k candidates from the first stage (vector lookup, fused with the lexical
+lookup if hybrid retrieval is on), scores them all with the configured scorer
+and returns the best top_k. Scorers are pluggable: anything with
+score(query, candidates) -> one float per candidate can be registered in
+SCORERS.
+
+The built-in "features" scorer needs no model. It tokenizes the candidates once,
+builds a (candidates x query terms) count matrix, stopwords excluded, and
+computes every feature for all candidates with array operations:
+
+    bm25         BM25 of the query over the candidate pool (smoothed idf from the pool)
+    coverage     idf-weighted share of the query terms the candidate contains
+    phrase       share of the query's adjacent term pairs found in the candidate
+    first_stage  1 for the first-stage top candidate, falling linearly with rank
+
+The score is a weighted sum (RERANK_FEATURE_WEIGHTS) of the features, each
+scaled to [0, 1].
+"""
+
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Protocol
+
+import numpy as np
+
+from ..config import (
+    RERANK_ENABLED,
+    RERANK_FEATURE_WEIGHTS,
+    RERANK_OVERFETCH_FACTOR,
+    RERANK_SCORER,
+)
+from .lexical_index import BM25_B, BM25_K1, tokenize
+
+FEATURES = ("bm25", "coverage", "phrase", "first_stage")
+# Query words that carry no topic; ignored by the term features
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or our "
+    "please show tell that the this to was what when where which who why will with you your".split()
+)
+
+
+class Scorer(Protocol):
+    """Anything that scores candidates for a query (higher is better)."""
+
+    def score(self, query: str, candidates: List[Dict[str, Any]]) -> np.ndarray:
+        ...
+
+
+def feature_matrix(query: str, candidates: List[Dict[str, Any]]) -> np.ndarray:
+    """The (candidates x FEATURES) matrix of the features scorer, each column in [0, 1]."""
+    query_tokens = [token for token in tokenize(query) if token not in STOPWORDS]
+    terms = list(dict.fromkeys(query_tokens))
+    features = np.zeros((len(candidates), len(FEATURES)), dtype=np.float32)
+    if not candidates:
+        return features
+    features[:, 3] = 1.0 - np.arange(len(candidates)) / len(candidates)
+    if not terms:
+        return features
+
+    pairs = list(dict.fromkeys(zip(query_tokens, query_tokens[1:])))
+    counts = np.zeros((len(candidates), len(terms)), dtype=np.float32)
+    pair_hits = np.zeros((len(candidates), max(len(pairs), 1)), dtype=bool)
+    lengths = np.zeros(len(candidates), dtype=np.float32)
+    for row, candidate in enumerate(candidates):
+        tokens = tokenize(candidate.get("text", ""))
+        lengths[row] = len(tokens)
+        token_counts = Counter(tokens)
+        counts[row] = [token_counts.get(term, 0) for term in terms]
+        if pairs:
+            candidate_pairs = set(zip(tokens, tokens[1:]))
+            pair_hits[row] = [pair in candidate_pairs for pair in pairs]
+
+    present = counts > 0
+    # Candidates are all about the query, so terms common among them still count
+    idf = np.log1p(len(candidates) / np.maximum(present.sum(axis=0), 1))
+    norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(float(lengths.mean()), 1.0))
+    bm25 = (idf * counts * (BM25_K1 + 1) / (counts + norms[:, None])).sum(axis=1)
+    features[:, 0] = bm25 / bm25.max() if bm25.max() > 0 else 0.0
+    features[:, 1] = present @ idf / idf.sum()
+    if pairs:
+        features[:, 2] = pair_hits.mean(axis=1)
+    return features
+
+
+class FeatureScorer:
+    """
+    Weighted sum of lexical and first-stage features; no model calls.
+
+    Args:
+        weights (Dict[str, float]): Weight of each of FEATURES
+    """
+
+    def __init__(self, weights: Dict[str, float]):
+        self.weights = np.array([weights.get(feature, 0.0) for feature in FEATURES], dtype=np.float32)
+
+    def score(self, query: str, candidates: List[Dict[str, Any]]) -> np.ndarray:
+        return feature_matrix(query, candidates) @ self.weights
+
+
+SCORERS = {
+    "features": lambda: FeatureScorer(RERANK_FEATURE_WEIGHTS),
+}
+
+
+class Reranker:
+    """
+    Over-fetch size, scorer and per-stage timing counters.
+
+    Args:
+        scorer (Scorer): Scores candidates
+        overfetch_factor (int): Candidates fetched per returned result
+    """
+
+    def __init__(self, scorer: Scorer, overfetch_factor: int):
+        self.scorer = scorer
+        self.overfetch_factor = overfetch_factor
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.candidates = 0
+        self.first_stage_seconds = 0.0
+        self.rerank_seconds = 0.0
+
+    def candidate_count(self, top_k: int) -> int:
+        return top_k * self.overfetch_factor
+
+    def rerank(self, query: str, candidates: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """The top_k candidates by scorer score, each with its rerank_score."""
+        if not candidates:
+            return []
+        scores = np.asarray(self.scorer.score(query, candidates), dtype=np.float32)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [{**candidates[i], "rerank_score": round(float(scores[i]), 6)} for i in order]
+
+    def record(self, candidates: int, first_stage_seconds: float, rerank_seconds: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.candidates += candidates
+            self.first_stage_seconds += first_stage_seconds
+            self.rerank_seconds += rerank_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.requests or 1
+            return {
+                "scorer": RERANK_SCORER,
+                "overfetch_factor": self.overfetch_factor,
+                "requests": self.requests,
+                "average_candidates": round(self.candidates / requests, 1),
+                "average_first_stage_ms": round(self.first_stage_seconds / requests * 1000, 2),
+                "average_rerank_ms": round(self.rerank_seconds / requests * 1000, 2),
+            }
+
+
+reranker: Optional[Reranker] = (
+    Reranker(SCORERS[RERANK_SCORER](), RERANK_OVERFETCH_FACTOR) if RERANK_ENABLED else None
+)
@@ -0,0 +1,123 @@
+"""
+In-process LRU cache for rag_query retrieval results.
+
+Entries are bounded by count and by (approximate) size in bytes, and expire
+after a TTL. Callers put the corpus version into the key, so bumping a corpus'
+version after add_data, delete_document or delete_corpus makes its old entries
+unreachable; they then age out through LRU eviction or the TTL. Versions live
+in process memory, so other workers and instances only see a change once their
+entries expire; the cache is opt-in (RETRIEVAL_CACHE_ENABLED) for that reason.
+"""
+
+import copy
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from ..config import (
+    RETRIEVAL_CACHE_ENABLED,
+    RETRIEVAL_CACHE_MAX_BYTES,
+    RETRIEVAL_CACHE_MAX_ENTRIES,
+    RETRIEVAL_CACHE_TTL_SECONDS,
+)
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold and collapse whitespace so trivially different queries share an entry."""
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+
+class RetrievalCache:
+    """
+    Thread-safe LRU cache with entry-count, byte and TTL bounds.
+
+    Also tracks hits, misses and the average latency of a miss, so stats() can
+    estimate how much retrieval time the cache has saved.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # key -> (expires_at, size_bytes, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._miss_seconds_total = 0.0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a copy of the cached value, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[2]
+        # Callers may mutate what they get back
+        return copy.deepcopy(value)
+
+    def put(self, key: Hashable, value: Any, miss_seconds: float = 0.0) -> None:
+        """
+        Store a value, evicting least recently used entries to stay within bounds.
+
+        Args:
+            key (Hashable): The cache key
+            value (Any): A JSON-serializable value
+            miss_seconds (float): How long producing the value took
+        """
+        size = len(json.dumps(value, default=str).encode())
+        with self._lock:
+            self._miss_seconds_total += miss_seconds
+            if size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, copy.deepcopy(value))
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, current size and the estimated time saved."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            average_miss = self._miss_seconds_total / self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "average_miss_ms": round(average_miss * 1000, 1),
+                "estimated_seconds_saved": round(self.hits * average_miss, 3),
+            }
+
+
+retrieval_cache = RetrievalCache(
+    max_entries=RETRIEVAL_CACHE_MAX_ENTRIES,
+    max_bytes=RETRIEVAL_CACHE_MAX_BYTES,
+    ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS,
+) if RETRIEVAL_CACHE_ENABLED else None
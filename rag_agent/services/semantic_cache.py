@@ -0,0 +1,329 @@
+"""
+Semantic cache for rag_query: serves paraphrased queries from earlier results.
+
+Queries are embedded with a pluggable embedder and compared, per corpus and
+retrieval config, against the queries answered before using a vectorized
+cosine similarity over a NumPy matrix. A match at or above the threshold
+returns the cached contexts. Each index has a fixed capacity and evicts the
+least recently used entry (entries from an older corpus version go first).
+
+Embeddings barely separate queries that differ only in an identifier
+("ERR-4021" and "ERR-4012", "building A" and "building B"), so a match also
+needs the same identifiers: tokens with a digit and single letters (other than
+the words "a" and "I") must be equal in both queries.
+
+The index is persisted as one `.npy` matrix (loadable memory-mapped) plus a
+JSON sidecar with the queries and cached contexts.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from ..config import (
+    DEFAULT_EMBEDDING_MODEL,
+    SEMANTIC_CACHE_CAPACITY,
+    SEMANTIC_CACHE_EMBEDDER,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_PATH,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+)
+
+# Words that carry no meaning for matching "what's the refund policy" to "refund policy?"
+_STOPWORDS = frozenset(
+    "a an and are can could do does for from how i in is it me my of on or "
+    "please s show tell that the there this to us was we what whats when where "
+    "which who why will with you your".split()
+)
+# Tokens and compound identifiers; a letter after an apostrophe ("what's") is not one
+_IDENTIFIER = re.compile(r"(?<!['’])\b[a-z0-9]+(?:[-_./:#][a-z0-9]+)*", re.IGNORECASE)
+
+
+def identifiers(query: str) -> frozenset:
+    """
+    The tokens of a query that must match exactly: those with a digit, and
+    single letters. "a" and "i" only count as a capital "A" after the first word.
+    """
+    found = set()
+    for position, match in enumerate(_IDENTIFIER.finditer(query)):
+        token = match.group()
+        if any(char.isdigit() for char in token):
+            found.add(token.casefold())
+        elif len(token) == 1 and (token.casefold() not in "ai" or (token == "A" and position > 0)):
+            found.add(token.casefold())
+    return frozenset(found)
+
+
+def _signature(query: str) -> int:
+    """A 63-bit digest of a query's identifiers."""
+    digest = hashlib.blake2b("\n".join(sorted(identifiers(query))).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") >> 1
+
+
+class Embedder(Protocol):
+    """Anything that turns texts into an (n, dim) float32 array."""
+
+    dim: int
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder:
+    """
+    Deterministic, offline embedder: signed feature hashing of content words
+    and their character trigrams. Runs without network access or model files.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = [w for w in re.findall(r"[a-z0-9]+", text.casefold()) if w not in _STOPWORDS]
+        features = [f"w:{w}" for w in words]
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vectors[row, value % self.dim] += 1.0 if (value >> 63) & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class VertexTextEmbedder:
+    """Embeds queries with the corpus' Vertex AI embedding model."""
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL):
+        from vertexai.language_models import TextEmbeddingModel
+
+        self._model = TextEmbeddingModel.from_pretrained(model_name.split("/")[-1])
+        self.dim = len(self._model.get_embeddings(["dimension probe"])[0].values)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        embeddings = self._model.get_embeddings(list(texts))
+        vectors = np.asarray([e.values for e in embeddings], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class _QueryIndex:
+    """Fixed-capacity vector index of the queries answered for one corpus and config."""
+
+    def __init__(self, capacity: int, dim: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.versions = np.zeros(capacity, dtype=np.int64)
+        self.created_at = np.zeros(capacity, dtype=np.float64)
+        self.signatures = np.zeros(capacity, dtype=np.int64)
+        self.queries: List[str] = []
+        self.payloads: List[Any] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    def search(self, vector: np.ndarray, signature: int, version: int,
+               min_created_at: float) -> Tuple[int, float]:
+        count = self.count
+        if not count:
+            return -1, -1.0
+        scores = self.vectors[:count] @ vector
+        # Entries from an older corpus version, past the TTL or for other identifiers never match
+        stale = (
+            (self.versions[:count] != version)
+            | (self.created_at[:count] < min_created_at)
+            | (self.signatures[:count] != signature)
+        )
+        scores[stale] = -np.inf
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def insert(self, vector: np.ndarray, query: str, payload: Any, version: int,
+               tick: int, created_at: float) -> None:
+        if self.count < len(self.vectors):
+            slot = self.count
+            self.queries.append(query)
+            self.payloads.append(payload)
+        else:
+            # Evict stale-version entries first, then the least recently used
+            priority = self.last_used.copy()
+            priority[self.versions != version] = -1
+            slot = int(np.argmin(priority))
+            self.queries[slot] = query
+            self.payloads[slot] = payload
+        self.vectors[slot] = vector
+        self.signatures[slot] = _signature(query)
+        self.versions[slot] = version
+        self.last_used[slot] = tick
+        self.created_at[slot] = created_at
+
+
+class SemanticCache:
+    """
+    Per-corpus semantic query cache.
+
+    Args:
+        embedder (Embedder): Turns query texts into unit vectors
+        threshold (float): Minimum cosine similarity for a hit
+        capacity (int): Maximum cached queries per corpus and retrieval config
+        ttl_seconds (float): Maximum age of a cached result
+    """
+
+    def __init__(self, embedder: Embedder, threshold: float, capacity: int, ttl_seconds: float):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._indexes: Dict[Tuple, _QueryIndex] = {}
+        self._tick = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _index(self, key: Tuple) -> _QueryIndex:
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = _QueryIndex(self.capacity, self.embedder.dim)
+        return index
+
+    def lookup(self, key: Tuple, version: int, query: str) -> Optional[Tuple[Any, float, str]]:
+        """
+        Find a previously answered query similar to this one and with the same identifiers.
+
+        Args:
+            key (Tuple): Corpus resource name and retrieval config
+            version (int): The corpus' current version
+            query (str): The incoming query
+
+        Returns:
+            Optional[Tuple[Any, float, str]]: The cached payload, its similarity and the
+            query it was cached for, or None on a miss
+        """
+        vector = self.embedder.embed([query])[0]
+        with self._lock:
+            index = self._indexes.get(key)
+            slot, score = (-1, -1.0)
+            if index is not None:
+                slot, score = index.search(vector, _signature(query), version, time.time() - self.ttl_seconds)
+            if slot < 0 or score < self.threshold:
+                self.misses += 1
+                return None
+            self._tick += 1
+            index.last_used[slot] = self._tick
+            self.hits += 1
+            return copy.deepcopy(index.payloads[slot]), score, index.queries[slot]
+
+    def insert(self, key: Tuple, version: int, query: str, payload: Any) -> None:
+        """Cache the payload retrieved for a query."""
+        vector = self.embedder.embed([query])[0]
+        with self._lock:
+            self._tick += 1
+            self._index(key).insert(vector, query, copy.deepcopy(payload), version, self._tick, time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": sum(index.count for index in self._indexes.values()),
+                "threshold": self.threshold,
+            }
+
+    def save(self, path: str) -> None:
+        """
+        Persist the cache to `path` (a directory): vectors.npy holds every
+        cached query vector, entries.json the matching metadata and contexts.
+        """
+        with self._lock:
+            rows, entries = [], []
+            for key, index in self._indexes.items():
+                for slot in range(index.count):
+                    rows.append(index.vectors[slot])
+                    entries.append({
+                        "key": list(key),
+                        "query": index.queries[slot],
+                        "created_at": float(index.created_at[slot]),
+                        "payload": index.payloads[slot],
+                    })
+            matrix = np.stack(rows) if rows else np.zeros((0, self.embedder.dim), dtype=np.float32)
+
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "vectors.npy.tmp"), "wb") as f:
+            np.save(f, matrix, allow_pickle=False)
+        os.replace(os.path.join(path, "vectors.npy.tmp"), os.path.join(path, "vectors.npy"))
+        with open(os.path.join(path, "entries.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({"dim": self.embedder.dim, "entries": entries}, f)
+        os.replace(os.path.join(path, "entries.json.tmp"), os.path.join(path, "entries.json"))
+
+    def load(self, path: str) -> int:
+        """
+        Load a cache saved by save(). Corpus versions are per process, so loaded
+        entries are attached to the current versions and bounded by the TTL only.
+
+        Returns:
+            int: The number of entries loaded
+        """
+        vectors_path = os.path.join(path, "vectors.npy")
+        entries_path = os.path.join(path, "entries.json")
+        if not (os.path.exists(vectors_path) and os.path.exists(entries_path)):
+            return 0
+        with open(entries_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved["dim"] != self.embedder.dim:
+            return 0
+
+        matrix = np.load(vectors_path, mmap_mode="r", allow_pickle=False)
+        min_created_at = time.time() - self.ttl_seconds
+        loaded = 0
+        with self._lock:
+            for row, entry in enumerate(saved["entries"]):
+                if entry["created_at"] < min_created_at:
+                    continue
+                self._tick += 1
+                self._index(tuple(entry["key"])).insert(
+                    np.asarray(matrix[row], dtype=np.float32),
+                    entry["query"],
+                    entry["payload"],
+                    0,
+                    self._tick,
+                    entry["created_at"],
+                )
+                loaded += 1
+        return loaded
+
+
+def _make_embedder(name: str) -> Embedder:
+    if name == "vertex":
+        return VertexTextEmbedder()
+    if name == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"Unknown semantic cache embedder: {name}")
+
+
+semantic_cache: Optional[SemanticCache] = None
+if SEMANTIC_CACHE_ENABLED:
+    semantic_cache = SemanticCache(
+        embedder=_make_embedder(SEMANTIC_CACHE_EMBEDDER),
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        capacity=SEMANTIC_CACHE_CAPACITY,
+        ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+    )
+    if SEMANTIC_CACHE_PATH:
+        semantic_cache.load(SEMANTIC_CACHE_PATH)
@@ -0,0 +1,355 @@
+"""
+Persistent ADK session service: SQLite on disk, hot sessions in memory.
+
+InMemorySessionService loses every conversation when the instance restarts.
+SqliteSessionService keeps sessions in a SQLite database (SESSION_DB_PATH)
+and follows the InMemorySessionService semantics otherwise:
+
+- Events are stored one row each and appended as they happen, so a turn
+  writes its new events and the session's state, never the whole history.
+- "app:" and "user:" state is stored once per key and merged into every
+  session of that app / user; "temp:" state is never stored.
+- The most recently used sessions (SESSION_CACHE_SIZE) stay deserialized in
+  an LRU. Each session row carries a version that every append bumps; a load
+  checks it with one primary-key lookup and only re-reads the events when
+  another process has appended since, so several workers can share the file.
+
+The statements are short indexed reads and writes on a WAL database with
+synchronous=NORMAL (no fsync per commit) and run inline on the event loop.
+"""
+
+import copy
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import (
+    BaseSessionService,
+    GetSessionConfig,
+    ListSessionsResponse,
+)
+from google.adk.sessions.state import State
+
+try:
+    from google.adk.errors.already_exists_error import AlreadyExistsError
+except ImportError:  # google-adk releases before the errors package
+    AlreadyExistsError = ValueError
+
+from ..config import SESSION_BACKEND, SESSION_CACHE_SIZE, SESSION_DB_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    last_update_time REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_session ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_state (
+    app_name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (app_name, key)
+);
+CREATE TABLE IF NOT EXISTS user_state (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, key)
+);
+"""
+
+SessionKey = Tuple[str, str, str]
+
+
+def _split_state(state: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Split a state (or state delta) into its app, user and session parts; temp keys are dropped."""
+    app_state, user_state, session_state = {}, {}, {}
+    for key, value in state.items():
+        if key.startswith(State.APP_PREFIX):
+            app_state[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_state[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_state[key] = value
+    return app_state, user_state, session_state
+
+
+def _filter_events(events: List[Event], config: Optional[GetSessionConfig]) -> List[Event]:
+    if not config:
+        return events
+    if config.num_recent_events is not None:
+        events = events[-config.num_recent_events:] if config.num_recent_events else []
+    if config.after_timestamp:
+        events = [event for event in events if event.timestamp >= config.after_timestamp]
+    return events
+
+
+class SqliteSessionService(BaseSessionService):
+    """
+    SQLite-backed session service with an LRU of hot sessions.
+
+    Args:
+        path (str): SQLite database file
+        cache_size (int): Sessions kept deserialized in memory
+    """
+
+    def __init__(self, path: str, cache_size: int = 1000):
+        self.path = path
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # Session key -> (session with session-scoped state only, version)
+        self._cache: "OrderedDict[SessionKey, Tuple[Session, int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # --- storage ---
+
+    def _load(self, key: SessionKey) -> Optional[Session]:
+        """The stored session (shared, not a copy), from the hot tier when it is current."""
+        app_name, user_id, session_id = key
+        row = self._conn.execute(
+            "SELECT state, last_update_time, version FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            self._cache.pop(key, None)
+            return None
+
+        state, last_update_time, version = row
+        cached = self._cache.get(key)
+        if cached and cached[1] == version:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached[0]
+
+        self.misses += 1
+        events = [
+            Event.model_validate_json(event)
+            for (event,) in self._conn.execute(
+                "SELECT event FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq",
+                key,
+            )
+        ]
+        session = Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=json.loads(state),
+            events=events,
+            last_update_time=last_update_time,
+        )
+        self._remember(key, session, version)
+        return session
+
+    def _remember(self, key: SessionKey, session: Session, version: int) -> None:
+        self._cache[key] = (session, version)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _write_scoped_state(self, app_name: str, user_id: str,
+                            app_state: Dict[str, Any], user_state: Dict[str, Any]) -> None:
+        # Called inside a transaction
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO app_state VALUES (?, ?, ?)",
+            [(app_name, k, json.dumps(v)) for k, v in app_state.items()],
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO user_state VALUES (?, ?, ?, ?)",
+            [(app_name, user_id, k, json.dumps(v)) for k, v in user_state.items()],
+        )
+
+    def _scoped_state(self, app_name: str, user_id: str) -> Dict[str, Any]:
+        """The app: and user: state to merge into a session, with prefixes."""
+        state = {
+            State.APP_PREFIX + key: json.loads(value)
+            for key, value in self._conn.execute("SELECT key, value FROM app_state WHERE app_name = ?", (app_name,))
+        }
+        state.update(
+            (State.USER_PREFIX + key, json.loads(value))
+            for key, value in self._conn.execute(
+                "SELECT key, value FROM user_state WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+            )
+        )
+        return state
+
+    def _copy(self, session: Session, events: List[Event]) -> Session:
+        """A copy for the caller, with app and user state merged in."""
+        copied = session.model_copy(deep=False)
+        copied.events = list(events)
+        copied.state = copy.deepcopy(session.state)
+        copied.state.update(self._scoped_state(session.app_name, session.user_id))
+        return copied
+
+    # --- BaseSessionService ---
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id.strip() if session_id else None) or uuid.uuid4().hex
+        app_state, user_state, session_state = _split_state(state or {})
+        session = Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=session_state,
+            last_update_time=time.time(),
+        )
+        key = (app_name, user_id, session_id)
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO sessions (app_name, user_id, id, state, last_update_time) VALUES (?, ?, ?, ?, ?)",
+                    key + (json.dumps(session_state), session.last_update_time),
+                )
+            except sqlite3.IntegrityError:
+                raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+            self._write_scoped_state(app_name, user_id, app_state, user_state)
+            self._remember(key, session, 0)
+            return self._copy(session, session.events)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        with self._lock:
+            session = self._load((app_name, user_id, session_id.strip() if session_id else session_id))
+            if session is None:
+                return None
+            return self._copy(session, _filter_events(session.events, config))
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        query = "SELECT user_id, id, state, last_update_time FROM sessions WHERE app_name = ?"
+        params: Tuple = (app_name,)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params += (user_id,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY last_update_time, user_id, id", params).fetchall()
+            scoped = {uid: self._scoped_state(app_name, uid) for uid in {row[0] for row in rows}}
+        sessions = []
+        for uid, session_id, state, last_update_time in rows:
+            state = json.loads(state)
+            state.update(scoped[uid])
+            sessions.append(Session(
+                app_name=app_name, user_id=uid, id=session_id, state=state, last_update_time=last_update_time,
+            ))
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id.strip() if session_id else session_id)
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+            self._conn.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key)
+            self._cache.pop(key, None)
+
+    async def get_user_state(self, *, app_name: str, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                key: json.loads(value)
+                for key, value in self._conn.execute(
+                    "SELECT key, value FROM user_state WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+                )
+            }
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+
+        key = (session.app_name, session.user_id, session.id)
+        with self._lock:
+            stored = self._load(key)
+            if stored is None:
+                raise ValueError(f"Session {session.id} not found.")
+            # The same event can be delivered to several references of one session
+            if any(e == event for e in stored.events if e.id == event.id):
+                return event
+
+        # Applies the delta to the caller's session and drops temp: keys from the event
+        event = await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        app_state, user_state, session_state = _split_state(
+            event.actions.state_delta if event.actions and event.actions.state_delta else {}
+        )
+
+        with self._lock:
+            stored = self._load(key)
+            if stored is None:
+                raise ValueError(f"Session {session.id} not found.")
+            expected_version = self._cache[key][1] + 1
+            stored.events.append(event)
+            stored.state.update(session_state)
+            stored.last_update_time = event.timestamp
+
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute(
+                    "INSERT INTO events (app_name, user_id, session_id, timestamp, event) VALUES (?, ?, ?, ?, ?)",
+                    key + (event.timestamp, event.model_dump_json(exclude_none=True)),
+                )
+                self._conn.execute(
+                    "UPDATE sessions SET state = ?, last_update_time = ?, version = version + 1 "
+                    "WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (json.dumps(stored.state), event.timestamp) + key,
+                )
+                self._write_scoped_state(session.app_name, session.user_id, app_state, user_state)
+                version = self._conn.execute(
+                    "SELECT version FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+                ).fetchone()[0]
+
+            if version == expected_version:
+                self._remember(key, stored, version)
+            else:
+                # Another process appended in between; reload on next use
+                self._cache.pop(key, None)
+        return event
+
+    def stats(self) -> Dict[str, int]:
+        """Hot-tier counters for /stats."""
+        with self._lock:
+            return {
+                "cached_sessions": len(self._cache),
+                "cache_size": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+session_store = (
+    SqliteSessionService(SESSION_DB_PATH, cache_size=SESSION_CACHE_SIZE)
+    if SESSION_BACKEND == "sqlite" else None
+)
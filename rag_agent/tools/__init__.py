@@ -3,27 +3,61 @@ RAG Tools package for interacting with Vertex AI RAG corpora.
 """
 
 from .add_data import add_data
+from .add_data_from_manifest import add_data_from_manifest
+from .async_tools import (
+    add_data_async,
+    add_data_from_manifest_async,
+    create_corpus_async,
+    delete_corpus_async,
+    delete_document_async,
+    get_corpus_info_async,
+    list_corpora_async,
+    rag_query_async,
+    run_blocking,
+)
 from .create_corpus import create_corpus
 from .delete_corpus import delete_corpus
 from .delete_document import delete_document
 from .get_corpus_info import get_corpus_info
+from .get_ingestion_status import get_ingestion_status
 from .list_corpora import list_corpora
 from .rag_query import rag_query
+from .rag_query_multi import rag_query_multi
 from .utils import (
+    bump_corpus_version,
     check_corpus_exists,
+    get_corpus_version,
     get_corpus_resource_name,
+    invalidate_corpus_cache,
+    iter_rag_files,
     set_current_corpus,
 )
 
 __all__ = [
     "add_data",
+    "add_data_from_manifest",
     "create_corpus",
     "list_corpora",
     "rag_query",
+    "rag_query_multi",
     "get_corpus_info",
+    "get_ingestion_status",
     "delete_corpus",
     "delete_document",
+    "add_data_async",
+    "add_data_from_manifest_async",
+    "create_corpus_async",
+    "list_corpora_async",
+    "rag_query_async",
+    "get_corpus_info_async",
+    "delete_corpus_async",
+    "delete_document_async",
+    "run_blocking",
+    "bump_corpus_version",
     "check_corpus_exists",
+    "get_corpus_version",
     "get_corpus_resource_name",
+    "invalidate_corpus_cache",
+    "iter_rag_files",
     "set_current_corpus",
 ]
@@ -2,60 +2,51 @@
 Tool for adding new data sources to a Vertex AI RAG corpus.
 """
 
+import logging
+import os
+import random
 import re
-from typing import List
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from google.adk.tools.tool_context import ToolContext
+from google.api_core.exceptions import ResourceExhausted, TooManyRequests
 from vertexai import rag
 
 from ..config import (
     DEFAULT_CHUNK_OVERLAP,
     DEFAULT_CHUNK_SIZE,
-    DEFAULT_EMBEDDING_REQUESTS_PER_MIN,
+    INGESTION_IMPORT_MAX_RETRIES,
+    INGESTION_SHARD_CONCURRENCY,
+    INGESTION_SHARD_SIZE,
+    INGESTION_STATUS_FAILED_SAMPLE,
+)
+from ..services.chunking import chunk_and_upload, chunk_deduplicator, is_locally_chunkable
+from ..services.ingestion_jobs import ingestion_jobs
+from ..services.ingestion_manifest import (
+    ingestion_manifest,
+    rag_file_ids_by_source,
+    resolve_sources,
+)
+from ..services.lexical_index import lexical_index
+from ..services.rate_limiter import embedding_quota
+from .utils import (
+    bump_corpus_version,
+    check_corpus_exists,
+    get_corpus_resource_name,
+    iter_rag_files,
 )
-from .utils import check_corpus_exists, get_corpus_resource_name
 
 
-def add_data(
-    corpus_name: str,
-    paths: List[str],
-    tool_context: ToolContext,
-) -> dict:
+def validate_paths(paths: List[str]) -> Tuple[List[str], List[str], List[str]]:
     """
-    Add new data sources to a Vertex AI RAG corpus.
-
-    Args:
-        corpus_name (str): The name of the corpus to add data to. If empty, the current corpus will be used.
-        paths (List[str]): List of URLs or GCS paths to add to the corpus.
-                          Supported formats:
-                          - Google Drive: "https://drive.google.com/file/d/{FILE_ID}/view"
-                          - Google Docs/Sheets/Slides: "https://docs.google.com/{type}/d/{FILE_ID}/..."
-                          - Google Cloud Storage: "gs://{BUCKET}/{PATH}"
-                          Example: ["https://drive.google.com/file/d/123", "gs://my_bucket/my_files_dir"]
-        tool_context (ToolContext): The tool context
+    Validate add_data paths and convert Google Docs URLs to Drive format.
 
     Returns:
-        dict: Information about the added data and status
+        Tuple[List[str], List[str], List[str]]: The validated paths, the invalid
+        paths with the reason, and the conversions that were made
     """
-    # Check if the corpus exists
-    if not check_corpus_exists(corpus_name, tool_context):
-        return {
-            "status": "error",
-            "message": f"Corpus '{corpus_name}' does not exist. Please create it first using the create_corpus tool.",
-            "corpus_name": corpus_name,
-            "paths": paths,
-        }
-
-    # Validate inputs
-    if not paths or not all(isinstance(path, str) for path in paths):
-        return {
-            "status": "error",
-            "message": "Invalid paths: Please provide a list of URLs or GCS paths",
-            "corpus_name": corpus_name,
-            "paths": paths,
-        }
-
-    # Pre-process paths to validate and convert Google Docs URLs to Drive format if needed
     validated_paths = []
     invalid_paths = []
     conversions = []
@@ -99,6 +90,292 @@ def add_data(
         # If we're here, the path wasn't in a recognized format
         invalid_paths.append(f"{path} (Invalid format)")
 
+    return validated_paths, invalid_paths, conversions
+
+
+def _index_lexically(corpus_resource_name: str, shard: List[str]) -> None:
+    """Add the plain-text GCS sources of an imported shard to the corpus' lexical index."""
+    source_uris = [path for path in shard if is_locally_chunkable(path)]
+    try:
+        folders = [
+            path for path in shard
+            if path.startswith("gs://") and (path.endswith("/") or not os.path.splitext(path)[1])
+        ]
+        if folders:
+            # Without the ingestion manifest, shards hold folders as given
+            sources, _ = resolve_sources(folders)
+            source_uris += [source.source_uri for source in sources if is_locally_chunkable(source.source_uri)]
+        if source_uris:
+            lexical_index.add_sources(corpus_resource_name, source_uris)
+    except Exception as e:
+        # The sources are imported; only exact-term matches on them are missing
+        logging.warning(f"Could not add {len(source_uris)} source(s) to the lexical index: {e}")
+
+
+def _is_quota_error(error: Optional[BaseException]) -> bool:
+    """Whether an import failed on a 429. rag.import_files wraps client errors in a RuntimeError."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, (ResourceExhausted, TooManyRequests)):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or next((arg for arg in reversed(error.args) if isinstance(arg, BaseException)), None)
+    return False
+
+
+def _import_shard(corpus_resource_name: str, shard: List[str], transformation_config) -> Dict[str, int]:
+    """Import one shard under a share of the embedding quota, backing off on 429s."""
+    counts = {"files_added": 0, "embeddings_saved": 0}
+    local = [path for path in shard if chunk_deduplicator and is_locally_chunkable(path)]
+    remote = [path for path in shard if path not in local]
+    fair_share = embedding_quota.quota_per_min // INGESTION_SHARD_CONCURRENCY
+    with embedding_quota.reserve(want=fair_share, minimum=max(1, fair_share // 4)) as rate:
+        # Plain-text sources are chunked and deduplicated here, then uploaded
+        for source_uri in local:
+            uploaded = chunk_and_upload(corpus_resource_name, source_uri, chunk_deduplicator)
+            counts["files_added"] += uploaded["files_added"]
+            counts["embeddings_saved"] += uploaded["embeddings_saved"]
+
+        for attempt in range(INGESTION_IMPORT_MAX_RETRIES + 1):
+            if not remote:
+                break
+            try:
+                import_result = rag.import_files(
+                    corpus_resource_name,
+                    remote,
+                    transformation_config=transformation_config,
+                    max_embedding_requests_per_min=rate,
+                )
+                counts["files_added"] += import_result.imported_rag_files_count
+                break
+            except Exception as e:
+                if not _is_quota_error(e) or attempt == INGESTION_IMPORT_MAX_RETRIES:
+                    raise
+                time.sleep(min(2 ** attempt, 60) * (0.5 + random.random()))
+
+    # Corpora not indexed yet are indexed in full on their first hybrid query
+    if lexical_index is not None and lexical_index.tracks(corpus_resource_name):
+        _index_lexically(corpus_resource_name, shard)
+    return counts
+
+
+def _path_groups(paths: List[str]) -> Iterable[List[str]]:
+    """Split paths into groups of INGESTION_SHARD_SIZE."""
+    return (paths[i:i + INGESTION_SHARD_SIZE] for i in range(0, len(paths), INGESTION_SHARD_SIZE))
+
+
+def ingest_paths(
+    corpus_resource_name: str,
+    path_groups: Iterable[List[str]],
+    on_progress: Optional[Callable[..., None]] = None,
+) -> Dict[str, Any]:
+    """
+    Import validated paths into a corpus. With the ingestion manifest enabled,
+    only new or changed sources are imported.
+
+    Each group's sources are split into shards of INGESTION_SHARD_SIZE, and up to
+    INGESTION_SHARD_CONCURRENCY shards import in parallel, each with its share of
+    the embedding quota. Groups are consumed lazily, so a generator can stream them.
+
+    Args:
+        corpus_resource_name (str): The corpus resource name
+        path_groups (Iterable[List[str]]): Validated paths, grouped for source resolution and progress
+        on_progress (Callable): Called as on_progress(paths, status=..., shards_total=..., shards_done=..., **counts)
+                                when a group starts, after each of its shards, and when it finishes;
+                                the counts are those of the whole group
+
+    Returns:
+        Dict[str, Any]: files_added, files_replaced, files_skipped and embeddings_saved
+        totals, failed_paths mapping each path of a failed group to its error, and
+        requires_reimport listing sources whose deduplicated chunks were removed
+    """
+    report = on_progress or (lambda group, **fields: None)
+    totals = {
+        "files_added": 0,
+        "files_replaced": 0,
+        "files_skipped": 0,
+        "embeddings_saved": 0,
+        "failed_paths": {},
+        "requires_reimport": [],
+    }
+    plans = []
+    modified = False
+    # future -> (group state, shard); a group finishes when its last shard does
+    in_flight: Dict[Any, Tuple[Dict[str, Any], List[str]]] = {}
+
+    # Set up chunking configuration
+    transformation_config = rag.TransformationConfig(
+        chunking_config=rag.ChunkingConfig(
+            chunk_size=DEFAULT_CHUNK_SIZE,
+            chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+        ),
+    )
+
+    def shard_progress(state: Dict[str, Any]) -> Dict[str, Any]:
+        return {"shards_total": state["shards"], "shards_done": state["shards"] - state["pending"], **state["counts"]}
+
+    def finish_group(state: Dict[str, Any]) -> None:
+        for key, value in state["counts"].items():
+            totals[key] += value
+        # A path failed if one of its sources (itself, or the objects under a folder) was in a failed shard
+        failed = {}
+        for path in state["group"]:
+            folder = path.rstrip("/") + "/"
+            errors = [error for source, error in state["failed"].items() if source == path or source.startswith(folder)]
+            if errors:
+                failed[path] = "; ".join(dict.fromkeys(errors))
+        totals["failed_paths"].update(failed)
+        for path, error in failed.items():
+            report([path], status="failed", error=error, **shard_progress(state))
+        succeeded = [path for path in state["group"] if path not in failed]
+        if succeeded:
+            report(succeeded, status="imported" if state["shards"] else "skipped", **shard_progress(state))
+
+    def collect(return_when) -> None:
+        done, _ = wait(list(in_flight), return_when=return_when)
+        for future in done:
+            state, shard = in_flight.pop(future)
+            try:
+                for key, value in future.result().items():
+                    state["counts"][key] += value
+            except Exception as e:
+                state["failed"].update({source: str(e) for source in shard})
+            state["pending"] -= 1
+            if state["pending"]:
+                report(state["group"], status="importing", **shard_progress(state))
+            else:
+                finish_group(state)
+
+    try:
+        if ingestion_manifest and not ingestion_manifest.is_seeded(corpus_resource_name):
+            ingestion_manifest.seed(corpus_resource_name, iter_rag_files(corpus_resource_name))
+
+        with ThreadPoolExecutor(max_workers=INGESTION_SHARD_CONCURRENCY, thread_name_prefix="import-shard") as executor:
+            for group in path_groups:
+                report(group, status="importing")
+                try:
+                    # Only import sources that are new or changed since they were last imported
+                    import_paths, plan = group, None
+                    if ingestion_manifest:
+                        sources, unresolved = resolve_sources(group)
+                        plan = ingestion_manifest.plan(corpus_resource_name, sources)
+                        if chunk_deduplicator:
+                            for source in plan.changed:
+                                # Sources that leaned on the old version's chunks must be re-imported
+                                dependents = chunk_deduplicator.forget_source(corpus_resource_name, source.source_uri)
+                                ingestion_manifest.remove_sources(corpus_resource_name, dependents)
+                                totals["requires_reimport"].extend(dependents)
+                        import_paths = [source.source_uri for source in plan.to_import] + unresolved
+                        plans.append(plan)
+                except Exception as e:
+                    totals["failed_paths"].update({path: str(e) for path in group})
+                    report(group, status="failed", error=str(e))
+                    continue
+
+                shards = [import_paths[i:i + INGESTION_SHARD_SIZE] for i in range(0, len(import_paths), INGESTION_SHARD_SIZE)]
+                state = {
+                    "group": group,
+                    "shards": len(shards),
+                    "pending": len(shards),
+                    # Source -> error, for the sources of failed shards
+                    "failed": {},
+                    "counts": {
+                        "files_added": 0,
+                        "embeddings_saved": 0,
+                        "files_replaced": len(plan.changed) if plan else 0,
+                        "files_skipped": len(plan.unchanged) if plan else 0,
+                    },
+                }
+                if not shards:
+                    finish_group(state)
+                    continue
+
+                modified = True
+                report(group, status="importing", **shard_progress(state))
+                for shard in shards:
+                    # Keep the queue short so streamed groups are read only as fast as they import
+                    while len(in_flight) >= 2 * INGESTION_SHARD_CONCURRENCY:
+                        collect(FIRST_COMPLETED)
+                    in_flight[executor.submit(_import_shard, corpus_resource_name, shard, transformation_config)] = (state, shard)
+
+            while in_flight:
+                collect(FIRST_COMPLETED)
+
+        if plans:
+            superseded = {uri: rag_file_id for plan in plans for uri, rag_file_id in plan.superseded_rag_file_ids.items()}
+            # Sources whose import failed have no new RagFile: new ones stay out of the
+            # manifest, changed ones keep their old RagFile and manifest row
+            rag_file_ids = (
+                rag_file_ids_by_source(iter_rag_files(corpus_resource_name), exclude=superseded.values())
+                if modified else {}
+            )
+            ingestion_manifest.record(
+                corpus_resource_name,
+                [source for plan in plans for source in plan.to_import if source.source_uri in rag_file_ids]
+                + [source for plan in plans for source in plan.unchanged],
+                rag_file_ids,
+            )
+            # Old versions are deleted only now that their replacement is imported and recorded
+            for source_uri, rag_file_id in superseded.items():
+                if source_uri not in rag_file_ids:
+                    continue
+                try:
+                    rag.delete_file(f"{corpus_resource_name}/ragFiles/{rag_file_id}")
+                except Exception as e:
+                    logging.warning(f"Could not delete superseded RagFile {rag_file_id} of {source_uri}: {e}")
+    finally:
+        if modified:
+            # Retrieval results cached for this corpus are stale
+            bump_corpus_version(corpus_resource_name)
+
+    return totals
+
+
+def add_data(
+    corpus_name: str,
+    paths: List[str],
+    tool_context: ToolContext,
+    background: bool = False,
+) -> dict:
+    """
+    Add new data sources to a Vertex AI RAG corpus.
+
+    Args:
+        corpus_name (str): The name of the corpus to add data to. If empty, the current corpus will be used.
+        paths (List[str]): List of URLs or GCS paths to add to the corpus.
+                          Supported formats:
+                          - Google Drive: "https://drive.google.com/file/d/{FILE_ID}/view"
+                          - Google Docs/Sheets/Slides: "https://docs.google.com/{type}/d/{FILE_ID}/..."
+                          - Google Cloud Storage: "gs://{BUCKET}/{PATH}"
+                          Example: ["https://drive.google.com/file/d/123", "gs://my_bucket/my_files_dir"]
+        tool_context (ToolContext): The tool context
+        background (bool): Queue the import as a background job and return its job_id right away.
+                           Use this for large folders; check progress with get_ingestion_status.
+
+    Returns:
+        dict: Information about the added data and status
+    """
+    # Check if the corpus exists
+    if not check_corpus_exists(corpus_name, tool_context):
+        return {
+            "status": "error",
+            "message": f"Corpus '{corpus_name}' does not exist. Please create it first using the create_corpus tool.",
+            "corpus_name": corpus_name,
+            "paths": paths,
+        }
+
+    # Validate inputs
+    if not paths or not all(isinstance(path, str) for path in paths):
+        return {
+            "status": "error",
+            "message": "Invalid paths: Please provide a list of URLs or GCS paths",
+            "corpus_name": corpus_name,
+            "paths": paths,
+        }
+
+    # Pre-process paths to validate and convert Google Docs URLs to Drive format if needed
+    validated_paths, invalid_paths, conversions = validate_paths(paths)
+
     # Check if we have any valid paths after validation
     if not validated_paths:
         return {
@@ -112,21 +389,36 @@ def add_data(
         # Get the corpus resource name
         corpus_resource_name = get_corpus_resource_name(corpus_name)
 
-        # Set up chunking configuration
-        transformation_config = rag.TransformationConfig(
-            chunking_config=rag.ChunkingConfig(
-                chunk_size=DEFAULT_CHUNK_SIZE,
-                chunk_overlap=DEFAULT_CHUNK_OVERLAP,
-            ),
-        )
+        if background:
+            job, coalesced = ingestion_jobs.submit(
+                corpus_resource_name,
+                corpus_name,
+                validated_paths,
+                # Shard-sized groups: sources are resolved and imported in batches, with progress per shard
+                lambda job: ingest_paths(corpus_resource_name, _path_groups(job.paths), job.update),
+            )
+            if not tool_context.state.get("current_corpus"):
+                tool_context.state["current_corpus"] = corpus_name
+            return {
+                "status": "success",
+                "message": (
+                    f"Import of {len(validated_paths)} path(s) into corpus '{corpus_name}' "
+                    f"{'was merged into' if coalesced else 'was queued as'} job {job.job_id}. "
+                    "Use get_ingestion_status to check its progress."
+                ),
+                "corpus_name": corpus_name,
+                "job_id": job.job_id,
+                "job_status": job.status,
+                "coalesced": coalesced,
+                "paths": validated_paths,
+                "invalid_paths": invalid_paths,
+                "conversions": conversions,
+            }
 
-        # Import files to the corpus
-        import_result = rag.import_files(
-            corpus_resource_name,
-            validated_paths,
-            transformation_config=transformation_config,
-            max_embedding_requests_per_min=DEFAULT_EMBEDDING_REQUESTS_PER_MIN,
-        )
+        totals = ingest_paths(corpus_resource_name, [validated_paths])
+        failed_paths = totals.pop("failed_paths")
+        if len(failed_paths) == len(validated_paths):
+            raise RuntimeError(next(iter(failed_paths.values())))
 
         # Set this as the current corpus if not already set
         if not tool_context.state.get("current_corpus"):
@@ -137,12 +429,31 @@ def add_data(
         if conversions:
             conversion_msg = " (Converted Google Docs URLs to Drive format)"
 
+        skipped_msg = ""
+        if totals["files_skipped"]:
+            skipped_msg = f", skipped {totals['files_skipped']} unchanged file(s)"
+
+        if failed_paths:
+            # Other paths were imported; report them along with the failures
+            message = (
+                f"Added {totals['files_added']} file(s) to corpus '{corpus_name}'{skipped_msg}, "
+                f"but {len(failed_paths)} of {len(validated_paths)} path(s) failed{conversion_msg}"
+            )
+        else:
+            message = f"Successfully added {totals['files_added']} file(s) to corpus '{corpus_name}'{skipped_msg}{conversion_msg}"
+
         return {
-            "status": "success",
-            "message": f"Successfully added {import_result.imported_rag_files_count} file(s) to corpus '{corpus_name}'{conversion_msg}",
+            "status": "success" if not failed_paths else "warning",
+            "message": message,
             "corpus_name": corpus_name,
-            "files_added": import_result.imported_rag_files_count,
+            "files_added": totals["files_added"],
+            "files_replaced": totals["files_replaced"],
+            "files_skipped": totals["files_skipped"],
+            "embeddings_saved": totals["embeddings_saved"],
+            "requires_reimport": totals["requires_reimport"],
             "paths": validated_paths,
+            "failed_count": len(failed_paths),
+            "failed_paths": dict(list(failed_paths.items())[:INGESTION_STATUS_FAILED_SAMPLE]),
             "invalid_paths": invalid_paths,
             "conversions": conversions,
         }
@@ -0,0 +1,203 @@
+"""
+Tool for bulk-importing the sources listed in a JSONL manifest into a Vertex AI RAG corpus.
+"""
+
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from google.adk.tools.tool_context import ToolContext
+
+from ..config import INGESTION_SHARD_SIZE
+from ..services.ingestion_jobs import ingestion_jobs
+from .add_data import ingest_paths, validate_paths
+from .utils import check_corpus_exists, get_corpus_resource_name
+
+# Invalid and failed paths reported back in full; the rest are only counted
+MAX_REPORTED_INVALID_LINES = 100
+
+
+def iter_manifest_paths(manifest_uri: str) -> Iterator[Optional[str]]:
+    """
+    Stream the source URIs listed in a JSONL manifest stored in GCS.
+
+    Each line is either a JSON string or an object with a "uri" (or "path") field.
+    Lines that cannot be parsed yield None.
+    """
+    from google.cloud import storage
+
+    bucket_name, _, blob_name = manifest_uri[len("gs://"):].partition("/")
+    blob = storage.Client().bucket(bucket_name).blob(blob_name)
+    with blob.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+                continue
+            yield record if isinstance(record, str) else (record.get("uri") or record.get("path"))
+
+
+def ingest_manifests(
+    corpus_resource_name: str,
+    manifest_uris: List[str],
+    on_progress: Optional[Callable[..., None]] = None,
+) -> Dict[str, Any]:
+    """
+    Import every source listed in the manifests, streaming them in shard-sized groups.
+
+    Returns:
+        Dict[str, Any]: The ingest_paths totals plus the number of manifest lines
+        read and the invalid lines found
+    """
+    report = on_progress or (lambda group, **fields: None)
+    totals: Dict[str, Any] = {
+        "files_added": 0,
+        "files_replaced": 0,
+        "files_skipped": 0,
+        "embeddings_saved": 0,
+        "failed_paths": {},
+        "lines_read": 0,
+        "invalid_lines": 0,
+        "invalid_paths": [],
+    }
+
+    for manifest_uri in manifest_uris:
+        manifest = {"lines_read": 0, "invalid_lines": 0}
+
+        def groups() -> Iterator[List[str]]:
+            group: List[str] = []
+            for line_number, path in enumerate(iter_manifest_paths(manifest_uri), start=1):
+                manifest["lines_read"] += 1
+                validated, invalid, _ = validate_paths([path])
+                if invalid:
+                    manifest["invalid_lines"] += 1
+                    if len(totals["invalid_paths"]) < MAX_REPORTED_INVALID_LINES:
+                        totals["invalid_paths"].append(f"{manifest_uri}:{line_number}: {invalid[0]}")
+                    continue
+                group.extend(validated)
+                if len(group) >= INGESTION_SHARD_SIZE:
+                    yield group
+                    group = []
+            if group:
+                yield group
+
+        report([manifest_uri], status="importing")
+        try:
+            result = ingest_paths(corpus_resource_name, groups(), on_progress)
+        except Exception as e:
+            report([manifest_uri], status="failed", error=str(e), **manifest)
+            totals["failed_paths"][manifest_uri] = str(e)
+            continue
+
+        for key in ("files_added", "files_replaced", "files_skipped", "embeddings_saved"):
+            totals[key] += result[key]
+        totals["failed_paths"].update(result["failed_paths"])
+        totals["lines_read"] += manifest["lines_read"]
+        totals["invalid_lines"] += manifest["invalid_lines"]
+        report(
+            [manifest_uri],
+            status="imported",
+            files_added=result["files_added"],
+            files_failed=len(result["failed_paths"]),
+            **manifest,
+        )
+
+    return totals
+
+
+def add_data_from_manifest(
+    corpus_name: str,
+    manifest_uri: str,
+    tool_context: ToolContext,
+    background: bool = True,
+) -> dict:
+    """
+    Import all sources listed in a JSONL manifest file into a Vertex AI RAG corpus.
+    Use this for thousands of files; the sources are imported in parallel shards.
+
+    Args:
+        corpus_name (str): The name of the corpus to add data to
+        manifest_uri (str): GCS path of the manifest, e.g. "gs://my_bucket/manifests/docs.jsonl".
+                            Each line is a JSON string or an object with a "uri" field holding
+                            a GCS path or Google Drive URL.
+        tool_context (ToolContext): The tool context
+        background (bool): Run as a background job and return its job_id right away (default).
+                           Check progress with get_ingestion_status.
+
+    Returns:
+        dict: The job_id (background) or the import counts, and status
+    """
+    if not check_corpus_exists(corpus_name, tool_context):
+        return {
+            "status": "error",
+            "message": f"Corpus '{corpus_name}' does not exist. Please create it first using the create_corpus tool.",
+            "corpus_name": corpus_name,
+            "manifest_uri": manifest_uri,
+        }
+
+    if not isinstance(manifest_uri, str) or not manifest_uri.startswith("gs://"):
+        return {
+            "status": "error",
+            "message": "Invalid manifest_uri: Please provide a GCS path (gs://...) to a JSONL file",
+            "corpus_name": corpus_name,
+            "manifest_uri": manifest_uri,
+        }
+
+    try:
+        corpus_resource_name = get_corpus_resource_name(corpus_name)
+
+        if not tool_context.state.get("current_corpus"):
+            tool_context.state["current_corpus"] = corpus_name
+
+        if background:
+            job, coalesced = ingestion_jobs.submit(
+                corpus_resource_name,
+                corpus_name,
+                [manifest_uri],
+                # The manifests submitted before the job starts are all imported by it
+                lambda job: ingest_manifests(corpus_resource_name, job.paths, job.update),
+                kind="manifest",
+            )
+            return {
+                "status": "success",
+                "message": (
+                    f"Import of manifest '{manifest_uri}' into corpus '{corpus_name}' "
+                    f"{'was merged into' if coalesced else 'was queued as'} job {job.job_id}. "
+                    "Use get_ingestion_status to check its progress."
+                ),
+                "corpus_name": corpus_name,
+                "manifest_uri": manifest_uri,
+                "job_id": job.job_id,
+                "job_status": job.status,
+                "coalesced": coalesced,
+            }
+
+        totals = ingest_manifests(corpus_resource_name, [manifest_uri])
+        if manifest_uri in totals["failed_paths"]:
+            raise RuntimeError(totals["failed_paths"][manifest_uri])
+
+        failed_paths = totals.pop("failed_paths")
+        return {
+            "status": "success" if not failed_paths else "warning",
+            "message": (
+                f"Added {totals['files_added']} file(s) from {totals['lines_read']} manifest line(s) "
+                f"to corpus '{corpus_name}', skipped {totals['files_skipped']} unchanged, "
+                f"{len(failed_paths)} failed, {totals['invalid_lines']} invalid"
+            ),
+            "corpus_name": corpus_name,
+            "manifest_uri": manifest_uri,
+            **totals,
+            "failed_count": len(failed_paths),
+            "failed_paths": dict(list(failed_paths.items())[:MAX_REPORTED_INVALID_LINES]),
+        }
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Error adding data from manifest: {str(e)}",
+            "corpus_name": corpus_name,
+            "manifest_uri": manifest_uri,
+        }
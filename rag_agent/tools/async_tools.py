@@ -0,0 +1,81 @@
+"""
+Async variants of the RAG tools.
+
+The Vertex AI SDK calls made by the tools (rag.retrieval_query, rag.import_files, ...)
+are blocking. Each variant here runs the corresponding tool on a bounded thread pool,
+so a slow retrieval or import never stalls the event loop that serves other requests.
+The variants keep the name, docstring and signature of the wrapped tool, so the
+model sees exactly the same function declarations.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, TypeVar
+
+from ..config import TOOL_EXECUTOR_MAX_WORKERS
+from .add_data import add_data
+from .add_data_from_manifest import add_data_from_manifest
+from .create_corpus import create_corpus
+from .delete_corpus import delete_corpus
+from .delete_document import delete_document
+from .get_corpus_info import get_corpus_info
+from .list_corpora import list_corpora
+from .rag_query import rag_query
+
+T = TypeVar("T")
+
+# Shared by every tool call in the process; extra calls queue instead of spawning threads
+_executor = ThreadPoolExecutor(
+    max_workers=TOOL_EXECUTOR_MAX_WORKERS,
+    thread_name_prefix="rag-tool",
+)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking callable on the tool executor and await its result.
+
+    Args:
+        func (Callable): The blocking function to run
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The return value of func
+    """
+    loop = asyncio.get_running_loop()
+    # Carry context variables (tracing, logging) over to the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _executor, functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+def make_async_tool(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    """
+    Wrap a synchronous tool so that it runs on the tool executor.
+
+    Args:
+        func (Callable): The synchronous tool function
+
+    Returns:
+        Callable: An async function with the same name, docstring and signature
+    """
+
+    @functools.wraps(func)
+    async def async_tool(*args: Any, **kwargs: Any) -> T:
+        return await run_blocking(func, *args, **kwargs)
+
+    return async_tool
+
+
+add_data_async = make_async_tool(add_data)
+add_data_from_manifest_async = make_async_tool(add_data_from_manifest)
+create_corpus_async = make_async_tool(create_corpus)
+delete_corpus_async = make_async_tool(delete_corpus)
+delete_document_async = make_async_tool(delete_document)
+get_corpus_info_async = make_async_tool(get_corpus_info)
+list_corpora_async = make_async_tool(list_corpora)
+rag_query_async = make_async_tool(rag_query)
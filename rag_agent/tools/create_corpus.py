@@ -10,7 +10,7 @@ from vertexai import rag
 from ..config import (
     DEFAULT_EMBEDDING_MODEL,
 )
-from .utils import check_corpus_exists
+from .utils import check_corpus_exists, invalidate_corpus_cache
 
 
 def create_corpus(
@@ -55,6 +55,9 @@ def create_corpus(
             ),
         )
 
+        # The cached corpus directory no longer reflects the project
+        invalidate_corpus_cache()
+
         # Update state to track corpus existence
         tool_context.state[f"corpus_exists_{corpus_name}"] = True
 
@@ -5,7 +5,15 @@ Tool for deleting a Vertex AI RAG corpus when it's no longer needed.
 from google.adk.tools.tool_context import ToolContext
 from vertexai import rag
 
-from .utils import check_corpus_exists, get_corpus_resource_name
+from ..services.chunking import chunk_deduplicator
+from ..services.ingestion_manifest import ingestion_manifest
+from ..services.lexical_index import lexical_index
+from .utils import (
+    bump_corpus_version,
+    check_corpus_exists,
+    get_corpus_resource_name,
+    invalidate_corpus_cache,
+)
 
 
 def delete_corpus(
@@ -49,6 +57,17 @@ def delete_corpus(
         # Delete the corpus
         rag.delete_corpus(corpus_resource_name)
 
+        # The cached corpus directory no longer reflects the project
+        invalidate_corpus_cache()
+        # Retrieval results cached for this corpus are stale
+        bump_corpus_version(corpus_resource_name)
+        if ingestion_manifest:
+            ingestion_manifest.drop_corpus(corpus_resource_name)
+        if chunk_deduplicator:
+            chunk_deduplicator.drop_corpus(corpus_resource_name)
+        if lexical_index:
+            lexical_index.drop_corpus(corpus_resource_name)
+
         # Remove from state by setting to False
         state_key = f"corpus_exists_{corpus_name}"
         if state_key in tool_context.state:
@@ -5,7 +5,10 @@ Tool for deleting a specific document from a Vertex AI RAG corpus.
 from google.adk.tools.tool_context import ToolContext
 from vertexai import rag
 
-from .utils import check_corpus_exists, get_corpus_resource_name
+from ..services.chunking import chunk_deduplicator
+from ..services.ingestion_manifest import ingestion_manifest, rag_file_source_uri
+from ..services.lexical_index import lexical_index
+from .utils import bump_corpus_version, check_corpus_exists, get_corpus_resource_name
 
 
 def delete_document(
@@ -41,13 +44,30 @@ def delete_document(
 
         # Delete the document
         rag_file_path = f"{corpus_resource_name}/ragFiles/{document_id}"
+        lexical_source = None
+        if lexical_index is not None and lexical_index.tracks(corpus_resource_name):
+            lexical_source = rag_file_source_uri(rag.get_file(rag_file_path))
         rag.delete_file(rag_file_path)
+        if lexical_source:
+            lexical_index.remove_source(corpus_resource_name, lexical_source)
+        requires_reimport = []
+        if ingestion_manifest:
+            source_uri = ingestion_manifest.source_for_rag_file(corpus_resource_name, document_id)
+            if chunk_deduplicator and source_uri:
+                # Documents whose duplicate chunks were dropped in favour of this one lose them too
+                requires_reimport = chunk_deduplicator.forget_source(corpus_resource_name, source_uri)
+                ingestion_manifest.remove_sources(corpus_resource_name, requires_reimport)
+            ingestion_manifest.remove_rag_file(corpus_resource_name, document_id)
+
+        # Retrieval results cached for this corpus are stale
+        bump_corpus_version(corpus_resource_name)
 
         return {
             "status": "success",
             "message": f"Successfully deleted document '{document_id}' from corpus '{corpus_name}'",
             "corpus_name": corpus_name,
             "document_id": document_id,
+            "requires_reimport": requires_reimport,
         }
     except Exception as e:
         return {
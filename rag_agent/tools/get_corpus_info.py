@@ -2,26 +2,87 @@
 Tool for retrieving detailed information about a specific RAG corpus.
 """
 
+from typing import Dict, Iterable, Optional
+
 from google.adk.tools.tool_context import ToolContext
-from vertexai import rag
 
-from .utils import check_corpus_exists, get_corpus_resource_name
+from ..config import CORPUS_INFO_DEFAULT_PAGE_SIZE, CORPUS_INFO_MAX_PAGE_SIZE
+from ..services.ingestion_manifest import rag_file_source_uri
+from .utils import (
+    check_corpus_exists,
+    get_corpus_resource_name,
+    iter_rag_files,
+    list_rag_files_page,
+    rag_file_source_type,
+)
+
+
+def _file_info(rag_file) -> dict:
+    return {
+        # Extract the file ID from the name
+        "file_id": rag_file.name.split("/")[-1],
+        "display_name": rag_file.display_name,
+        "source_uri": rag_file_source_uri(rag_file) or "",
+        "source_type": rag_file_source_type(rag_file),
+        "state": rag_file.file_status.state.name,
+        "create_time": str(rag_file.create_time) if rag_file.create_time else "",
+        "update_time": str(rag_file.update_time) if rag_file.update_time else "",
+    }
+
+
+def summarize_rag_files(rag_files: Iterable) -> dict:
+    """
+    Aggregate a stream of RagFiles in constant memory: counts, the oldest and
+    newest update times, and breakdowns by source type and state.
+    """
+    file_count = 0
+    by_source_type: Dict[str, int] = {}
+    by_state: Dict[str, int] = {}
+    oldest: Optional[object] = None
+    newest: Optional[object] = None
+    for rag_file in rag_files:
+        file_count += 1
+        source_type = rag_file_source_type(rag_file)
+        by_source_type[source_type] = by_source_type.get(source_type, 0) + 1
+        state = rag_file.file_status.state.name
+        by_state[state] = by_state.get(state, 0) + 1
+        updated = rag_file.update_time or rag_file.create_time
+        if updated:
+            oldest = updated if oldest is None or updated < oldest else oldest
+            newest = updated if newest is None or updated > newest else newest
+    return {
+        "file_count": file_count,
+        "by_source_type": by_source_type,
+        "by_state": by_state,
+        "oldest_update_time": str(oldest) if oldest else "",
+        "newest_update_time": str(newest) if newest else "",
+    }
 
 
 def get_corpus_info(
     corpus_name: str,
     tool_context: ToolContext,
+    page_size: int = CORPUS_INFO_DEFAULT_PAGE_SIZE,
+    page_token: str = "",
+    summary: bool = False,
 ) -> dict:
     """
-    Get detailed information about a specific RAG corpus, including its files.
+    Get information about a specific RAG corpus: one page of its files, or summary statistics.
 
     Args:
         corpus_name (str): The full resource name of the corpus to get information about.
                            Preferably use the resource_name from list_corpora results.
         tool_context (ToolContext): The tool context
+        page_size (int): Number of files to return (at most 200)
+        page_token (str): The next_page_token of a previous call, to get the following page
+        summary (bool): Return only aggregates (file count, oldest/newest update time,
+                        counts by source type and state) instead of listing files.
+                        Prefer this for large corpora or when individual files are not needed.
 
     Returns:
-        dict: Information about the corpus and its files
+        dict: Information about the corpus and a page of its files (or its summary).
+        page_file_count is the number of files on this page; file_count, the corpus
+        total, is only included when the page holds every file.
     """
     try:
         # Check if corpus exists
@@ -38,58 +99,36 @@ def get_corpus_info(
         # Try to get corpus details first
         corpus_display_name = corpus_name  # Default if we can't get actual display name
 
-        # Process file information
-        file_details = []
-        try:
-            # Get the list of files
-            files = rag.list_files(corpus_resource_name)
-            for rag_file in files:
-                # Get document specific details
-                try:
-                    # Extract the file ID from the name
-                    file_id = rag_file.name.split("/")[-1]
-
-                    file_info = {
-                        "file_id": file_id,
-                        "display_name": (
-                            rag_file.display_name
-                            if hasattr(rag_file, "display_name")
-                            else ""
-                        ),
-                        "source_uri": (
-                            rag_file.source_uri
-                            if hasattr(rag_file, "source_uri")
-                            else ""
-                        ),
-                        "create_time": (
-                            str(rag_file.create_time)
-                            if hasattr(rag_file, "create_time")
-                            else ""
-                        ),
-                        "update_time": (
-                            str(rag_file.update_time)
-                            if hasattr(rag_file, "update_time")
-                            else ""
-                        ),
-                    }
-
-                    file_details.append(file_info)
-                except Exception:
-                    # Continue to the next file
-                    continue
-        except Exception:
-            # Continue without file details
-            pass
-
-        # Basic corpus info
-        return {
+        if summary:
+            stats = summarize_rag_files(iter_rag_files(corpus_resource_name))
+            return {
+                "status": "success",
+                "message": f"Corpus '{corpus_display_name}' contains {stats['file_count']} file(s)",
+                "corpus_name": corpus_name,
+                "corpus_display_name": corpus_display_name,
+                **stats,
+            }
+
+        page_size = max(1, min(int(page_size or CORPUS_INFO_DEFAULT_PAGE_SIZE), CORPUS_INFO_MAX_PAGE_SIZE))
+        rag_files, next_page_token = list_rag_files_page(corpus_resource_name, page_size, page_token)
+        file_details = [_file_info(rag_file) for rag_file in rag_files]
+
+        more_msg = " More files are available; pass next_page_token to get them." if next_page_token else ""
+        result = {
             "status": "success",
-            "message": f"Successfully retrieved information for corpus '{corpus_display_name}'",
+            "message": (
+                f"Successfully retrieved {len(file_details)} file(s) for corpus '{corpus_display_name}'{more_msg}"
+            ),
             "corpus_name": corpus_name,
             "corpus_display_name": corpus_display_name,
-            "file_count": len(file_details),
+            "page_file_count": len(file_details),
             "files": file_details,
+            "next_page_token": next_page_token,
         }
+        # The corpus total is only known when a single page holds every file; use summary=True otherwise
+        if not page_token and not next_page_token:
+            result["file_count"] = len(file_details)
+        return result
 
     except Exception as e:
         return {
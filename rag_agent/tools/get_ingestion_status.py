@@ -0,0 +1,69 @@
+"""
+Tool for checking the progress of background ingestion jobs started by add_data.
+"""
+
+from google.adk.tools.tool_context import ToolContext
+
+from ..config import INGESTION_STATUS_FAILED_SAMPLE, INGESTION_STATUS_MAX_PAGE_SIZE
+from ..services.ingestion_jobs import ingestion_jobs
+
+
+def get_ingestion_status(
+    job_id: str,
+    tool_context: ToolContext,
+    offset: int = 0,
+    limit: int = 0,
+    path_status: str = "",
+) -> dict:
+    """
+    Get the progress of a background ingestion job started with add_data(background=True).
+
+    Args:
+        job_id (str): The job_id returned by add_data. If empty, all active jobs are listed.
+        tool_context (ToolContext): The tool context
+        offset (int): First per-path entry to return when paging through a job's paths
+        limit (int): Number of per-path entries to return (at most 100). 0 returns only
+                     the counts by status and a sample of failed paths.
+        path_status (str): Only page through paths with this status (e.g. "failed", "pending")
+
+    Returns:
+        dict: The job status, path counts by status, a sample of failed paths with
+        their errors, and the requested page of per-path progress
+    """
+    if not job_id:
+        jobs = [job.snapshot(include_progress=False) for job in ingestion_jobs.active_jobs()]
+        return {
+            "status": "success",
+            "message": f"{len(jobs)} ingestion job(s) queued or running",
+            "jobs": jobs,
+        }
+
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        return {
+            "status": "error",
+            "message": f"Ingestion job '{job_id}' not found. It may have expired or been started by another instance.",
+            "job_id": job_id,
+        }
+
+    snapshot = job.snapshot(include_progress=False)
+    snapshot["failed_paths"] = job.failed_paths(INGESTION_STATUS_FAILED_SAMPLE)
+    response = {
+        "status": "success",
+        "message": (
+            f"Job {job_id} is {snapshot['status']}: "
+            f"{snapshot['path_counts']} of {snapshot['paths_total']} path(s)"
+        ),
+        "job": snapshot,
+    }
+    limit = max(0, min(limit, INGESTION_STATUS_MAX_PAGE_SIZE))
+    if limit:
+        offset = max(0, offset)
+        page, matching = job.progress_page(offset, limit, path_status)
+        response.update({
+            "progress": page,
+            "offset": offset,
+            "paths_matching": matching,
+            "next_offset": offset + len(page) if offset + len(page) < matching else None,
+        })
+    return response
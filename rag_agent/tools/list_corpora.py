@@ -6,6 +6,8 @@ from typing import Dict, List, Union
 
 from vertexai import rag
 
+from .utils import prime_corpus_cache
+
 
 def list_corpora() -> dict:
     """
@@ -20,7 +22,10 @@ def list_corpora() -> dict:
     """
     try:
         # Get the list of corpora
-        corpora = rag.list_corpora()
+        corpora = list(rag.list_corpora())
+
+        # Refresh the shared corpus directory with the listing we already have
+        prime_corpus_cache(corpora)
 
         # Process corpus information into a more usable format
         corpus_info: List[Dict[str, Union[str, int]]] = []
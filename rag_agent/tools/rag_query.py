@@ -3,6 +3,8 @@ Tool for querying Vertex AI RAG corpora and retrieving relevant information.
 """
 
 import logging
+import time
+from typing import Dict, List, Optional, Tuple
 
 from google.adk.tools.tool_context import ToolContext
 from vertexai import rag
@@ -10,8 +12,209 @@ from vertexai import rag
 from ..config import (
     DEFAULT_DISTANCE_THRESHOLD,
     DEFAULT_TOP_K,
+    HYBRID_LEXICAL_WEIGHT,
+    LOCAL_VECTOR_CORPORA,
 )
-from .utils import check_corpus_exists, get_corpus_resource_name
+from ..services.context_packing import context_packer
+from ..services.fusion import hybrid_score_fusion
+from ..services.ingestion_jobs import ingestion_jobs
+from ..services.lexical_index import lexical_index
+from ..services.local_vector_index import local_vector_indexes
+from ..services.reranker import reranker
+from ..services.retrieval_cache import normalize_query, retrieval_cache
+from ..services.semantic_cache import semantic_cache
+from .utils import (
+    check_corpus_exists,
+    get_corpus_resource_name,
+    get_corpus_version,
+    iter_rag_files,
+)
+
+
+def is_mirrored(corpus_resource_name: str) -> bool:
+    """Whether LOCAL_VECTOR_CORPORA selects a corpus for the local vector mirror."""
+    if local_vector_indexes is None:
+        return False
+    return "*" in LOCAL_VECTOR_CORPORA or any(
+        get_corpus_resource_name(name) == corpus_resource_name for name in LOCAL_VECTOR_CORPORA
+    )
+
+
+def _schedule_mirror_build(corpus_resource_name: str, corpus_version: int) -> None:
+    """Queue a background (re)build of a corpus' mirror, unless one is queued or recently failed."""
+    if not local_vector_indexes.should_build(corpus_resource_name, corpus_version):
+        return
+
+    def build(job):
+        try:
+            return local_vector_indexes.build(
+                corpus_resource_name, corpus_version, iter_rag_files(corpus_resource_name), job.update
+            )
+        except Exception as e:
+            logging.info(f"Corpus {corpus_resource_name} stays on remote retrieval: {e}")
+            raise
+
+    # Coalesced with an already queued or running build of the same corpus
+    ingestion_jobs.submit(corpus_resource_name, corpus_resource_name, [corpus_resource_name], build, kind="mirror")
+
+
+def _schedule_lexical_build(corpus_resource_name: str, corpus_version: int) -> None:
+    """Queue indexing a corpus that predates the lexical index, unless one is queued or recently failed."""
+    if not lexical_index.should_build(corpus_resource_name, corpus_version):
+        return
+    # Coalesced with an already queued or running build of the same corpus
+    ingestion_jobs.submit(
+        corpus_resource_name,
+        corpus_resource_name,
+        [corpus_resource_name],
+        lambda job: lexical_index.build(
+            corpus_resource_name, corpus_version, iter_rag_files(corpus_resource_name), job.update
+        ),
+        kind="lexical",
+    )
+
+
+def _vector_contexts(
+    corpus_resource_name: str,
+    corpus_version: int,
+    query: str,
+    top_k: int,
+    distance_threshold: float,
+) -> Tuple[List[Dict], Optional[str]]:
+    """The vector lookup of retrieve_contexts: the local mirror if current, else rag.retrieval_query."""
+    if is_mirrored(corpus_resource_name):
+        results = local_vector_indexes.search(
+            corpus_resource_name,
+            corpus_version,
+            query,
+            top_k,
+            distance_threshold,
+            list_rag_files=lambda: iter_rag_files(corpus_resource_name),
+        )
+        if results is not None:
+            return results, "local"
+        _schedule_mirror_build(corpus_resource_name, corpus_version)
+
+    # Configure retrieval parameters
+    rag_retrieval_config = rag.RagRetrievalConfig(
+        top_k=top_k,
+        filter=rag.Filter(vector_distance_threshold=distance_threshold),
+    )
+
+    # Perform the query
+    print("Performing retrieval query...")
+    response = rag.retrieval_query(
+        rag_resources=[
+            rag.RagResource(
+                rag_corpus=corpus_resource_name,
+            )
+        ],
+        text=query,
+        rag_retrieval_config=rag_retrieval_config,
+    )
+
+    # Process the response into a more usable format
+    results = []
+    if hasattr(response, "contexts") and response.contexts:
+        for ctx_group in response.contexts.contexts:
+            result = {
+                "source_uri": (
+                    ctx_group.source_uri if hasattr(ctx_group, "source_uri") else ""
+                ),
+                "source_name": (
+                    ctx_group.source_display_name
+                    if hasattr(ctx_group, "source_display_name")
+                    else ""
+                ),
+                "text": ctx_group.text if hasattr(ctx_group, "text") else "",
+                "score": ctx_group.score if hasattr(ctx_group, "score") else 0.0,
+            }
+            results.append(result)
+    return results, None
+
+
+def retrieve_contexts(
+    corpus_resource_name: str,
+    query: str,
+    top_k: int = DEFAULT_TOP_K,
+    distance_threshold: float = DEFAULT_DISTANCE_THRESHOLD,
+    timings: Optional[Dict[str, float]] = None,
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Retrieve the contexts matching a query from one corpus, serving repeated
+    queries from the retrieval cache and, when enabled, paraphrases from the
+    semantic cache. Corpora selected by LOCAL_VECTOR_CORPORA are searched in
+    their local mirror when it is current. With hybrid retrieval, a BM25 lookup
+    runs concurrently with the vector lookup and the two rankings are fused.
+    With reranking, the first stage over-fetches candidates and the reranker
+    keeps the best top_k.
+
+    Args:
+        corpus_resource_name (str): The full resource name of the corpus
+        query (str): The text query
+        top_k (int): Maximum number of contexts to return
+        distance_threshold (float): Vector distance threshold for matches
+        timings (Dict[str, float]): If given, receives the milliseconds spent in
+                                    each stage (first_stage, rerank) of a retrieval
+
+    Returns:
+        Tuple[List[Dict], Optional[str]]: The contexts, and "exact" or "semantic"
+        if they came from a cache, "local" if from the local mirror (None if they
+        were retrieved remotely)
+    """
+    corpus_version = get_corpus_version(corpus_resource_name)
+    normalized_query = normalize_query(query)
+    cache_key = (
+        corpus_resource_name,
+        corpus_version,
+        normalized_query,
+        top_k,
+        distance_threshold,
+    )
+    if retrieval_cache is not None:
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached, "exact"
+
+    semantic_key = (corpus_resource_name, top_k, distance_threshold)
+    if semantic_cache is not None:
+        match = semantic_cache.lookup(semantic_key, corpus_version, normalized_query)
+        if match is not None:
+            cached, similarity, matched_query = match
+            logging.info(f"Semantic cache hit ({similarity:.3f}) for '{query}' via '{matched_query}'")
+            return cached, "semantic"
+
+    # Over-fetch candidates for the reranker
+    candidates = reranker.candidate_count(top_k) if reranker is not None else top_k
+    lexical = None
+    if lexical_index is not None:
+        if lexical_index.has(corpus_resource_name):
+            lexical = lexical_index.submit_search(corpus_resource_name, query, candidates)
+        else:
+            _schedule_lexical_build(corpus_resource_name, corpus_version)
+
+    started = time.perf_counter()
+    results, source = _vector_contexts(corpus_resource_name, corpus_version, query, candidates, distance_threshold)
+    if lexical is not None:
+        results = hybrid_score_fusion(results, lexical.result(), HYBRID_LEXICAL_WEIGHT)[:candidates]
+    first_stage_seconds = time.perf_counter() - started
+    stage_ms = {"first_stage": round(first_stage_seconds * 1000, 2)}
+
+    if reranker is not None:
+        rerank_started = time.perf_counter()
+        fetched = len(results)
+        results = reranker.rerank(query, results, top_k)
+        rerank_seconds = time.perf_counter() - rerank_started
+        reranker.record(fetched, first_stage_seconds, rerank_seconds)
+        stage_ms["rerank"] = round(rerank_seconds * 1000, 2)
+    if timings is not None:
+        timings.update(stage_ms)
+
+    if retrieval_cache is not None:
+        retrieval_cache.put(cache_key, results, miss_seconds=time.perf_counter() - started)
+    if semantic_cache is not None and results and source is None:
+        semantic_cache.insert(semantic_key, corpus_version, normalized_query, results)
+    return results, source
 
 
 def rag_query(
@@ -45,41 +248,9 @@ def rag_query(
         # Get the corpus resource name
         corpus_resource_name = get_corpus_resource_name(corpus_name)
 
-        # Configure retrieval parameters
-        rag_retrieval_config = rag.RagRetrievalConfig(
-            top_k=DEFAULT_TOP_K,
-            filter=rag.Filter(vector_distance_threshold=DEFAULT_DISTANCE_THRESHOLD),
-        )
-
-        # Perform the query
-        print("Performing retrieval query...")
-        response = rag.retrieval_query(
-            rag_resources=[
-                rag.RagResource(
-                    rag_corpus=corpus_resource_name,
-                )
-            ],
-            text=query,
-            rag_retrieval_config=rag_retrieval_config,
-        )
-
-        # Process the response into a more usable format
-        results = []
-        if hasattr(response, "contexts") and response.contexts:
-            for ctx_group in response.contexts.contexts:
-                result = {
-                    "source_uri": (
-                        ctx_group.source_uri if hasattr(ctx_group, "source_uri") else ""
-                    ),
-                    "source_name": (
-                        ctx_group.source_display_name
-                        if hasattr(ctx_group, "source_display_name")
-                        else ""
-                    ),
-                    "text": ctx_group.text if hasattr(ctx_group, "text") else "",
-                    "score": ctx_group.score if hasattr(ctx_group, "score") else 0.0,
-                }
-                results.append(result)
+        # Retrieve matching contexts (served from a cache for repeated queries)
+        timings: Dict[str, float] = {}
+        results, cache_source = retrieve_contexts(corpus_resource_name, query, timings=timings)
 
         # If we didn't find any results
         if not results:
@@ -90,15 +261,27 @@ def rag_query(
                 "corpus_name": corpus_name,
                 "results": [],
                 "results_count": 0,
+                "cache": cache_source or "miss",
+                **({"timings_ms": timings} if timings else {}),
             }
 
+        # Pack the contexts into the token budget for the model
+        packed = {"results": results}
+        if context_packer is not None:
+            started = time.perf_counter()
+            sources, packed_results, packing = context_packer.pack(results)
+            timings["packing"] = round((time.perf_counter() - started) * 1000, 2)
+            packed = {"sources": sources, "results": packed_results, "packing": packing}
+
         return {
             "status": "success",
             "message": f"Successfully queried corpus '{corpus_name}'",
             "query": query,
             "corpus_name": corpus_name,
-            "results": results,
-            "results_count": len(results),
+            **packed,
+            "results_count": len(packed["results"]),
+            "cache": cache_source or "miss",
+            **({"timings_ms": timings} if timings else {}),
         }
 
     except Exception as e:
@@ -0,0 +1,136 @@
+"""
+Tool for querying several Vertex AI RAG corpora at once and merging the results.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List
+
+from google.adk.tools.tool_context import ToolContext
+
+from ..config import (
+    DEFAULT_FUSION_METHOD,
+    DEFAULT_MULTI_CORPUS_TIMEOUT_SECONDS,
+    DEFAULT_TOP_K,
+)
+from ..services.context_packing import context_packer
+from ..services.fusion import FUSION_METHODS
+from .async_tools import run_blocking
+from .rag_query import retrieve_contexts
+from .utils import check_corpus_exists, get_corpus_resource_name
+
+
+async def _query_corpus(corpus_name: str, query: str, tool_context: ToolContext) -> dict:
+    """Resolve and query one corpus; blocking SDK calls run on the tool executor."""
+    if not await run_blocking(check_corpus_exists, corpus_name, tool_context):
+        return {"corpus_name": corpus_name, "status": "error", "message": "Corpus does not exist"}
+
+    corpus_resource_name = await run_blocking(get_corpus_resource_name, corpus_name)
+    timings: Dict[str, float] = {}
+    try:
+        results, cache_source = await asyncio.wait_for(
+            run_blocking(retrieve_contexts, corpus_resource_name, query, timings=timings),
+            timeout=DEFAULT_MULTI_CORPUS_TIMEOUT_SECONDS,
+        )
+    except asyncio.TimeoutError:
+        return {
+            "corpus_name": corpus_name,
+            "status": "timeout",
+            "message": f"No response within {DEFAULT_MULTI_CORPUS_TIMEOUT_SECONDS}s",
+        }
+
+    for result in results:
+        result["corpus_name"] = corpus_name
+    return {
+        "corpus_name": corpus_name,
+        "status": "success",
+        "results": results,
+        "cache": cache_source or "miss",
+        **({"timings_ms": timings} if timings else {}),
+    }
+
+
+async def rag_query_multi(
+    corpus_names: List[str],
+    query: str,
+    tool_context: ToolContext,
+) -> dict:
+    """
+    Query several Vertex AI RAG corpora concurrently and return one merged, ranked list.
+    Use this instead of calling rag_query once per corpus when a question may be
+    answered by more than one corpus.
+
+    Args:
+        corpus_names (List[str]): The names of the corpora to query.
+                                  Preferably use the resource_name values from list_corpora results.
+        query (str): The text query to search for in the corpora
+        tool_context (ToolContext): The tool context
+
+    Returns:
+        dict: The merged top results (each tagged with its corpus_name), per-corpus status and overall status
+    """
+    try:
+        if not corpus_names or not all(isinstance(name, str) and name for name in corpus_names):
+            return {
+                "status": "error",
+                "message": "Invalid corpus_names: Please provide a list of corpus names",
+                "query": query,
+                "corpus_names": corpus_names,
+            }
+
+        # Query each distinct corpus once, all at the same time
+        corpus_names = list(dict.fromkeys(corpus_names))
+        outcomes = await asyncio.gather(
+            *(_query_corpus(name, query, tool_context) for name in corpus_names),
+            return_exceptions=True,
+        )
+
+        ranked_lists = []
+        corpus_status = []
+        for name, outcome in zip(corpus_names, outcomes):
+            if isinstance(outcome, Exception):
+                corpus_status.append({"corpus_name": name, "status": "error", "message": str(outcome)})
+                continue
+            ranked_lists.append(outcome.pop("results", []))
+            corpus_status.append(outcome)
+
+        fuse = FUSION_METHODS[DEFAULT_FUSION_METHOD]
+        results = fuse(ranked_lists)[:DEFAULT_TOP_K]
+
+        if not results:
+            return {
+                "status": "warning",
+                "message": f"No results found in {len(corpus_names)} corpora for query: '{query}'",
+                "query": query,
+                "corpus_names": corpus_names,
+                "corpora": corpus_status,
+                "results": [],
+                "results_count": 0,
+            }
+
+        # Pack the merged contexts into the token budget for the model
+        packed = {"results": results}
+        if context_packer is not None:
+            sources, packed_results, packing = context_packer.pack(results)
+            packed = {"sources": sources, "results": packed_results, "packing": packing}
+
+        return {
+            "status": "success",
+            "message": f"Successfully queried {len(ranked_lists)} of {len(corpus_names)} corpora",
+            "query": query,
+            "corpus_names": corpus_names,
+            "fusion_method": DEFAULT_FUSION_METHOD,
+            "corpora": corpus_status,
+            **packed,
+            "results_count": len(packed["results"]),
+        }
+
+    except Exception as e:
+        error_msg = f"Error querying corpora: {str(e)}"
+        logging.error(error_msg)
+        return {
+            "status": "error",
+            "message": error_msg,
+            "query": query,
+            "corpus_names": corpus_names,
+        }
@@ -4,18 +4,194 @@ Utility functions for the RAG tools.
 
 import logging
 import re
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
 
 from google.adk.tools.tool_context import ToolContext
 from vertexai import rag
 
 from ..config import (
+    CORPUS_CACHE_TTL_SECONDS,
     LOCATION,
     PROJECT_ID,
+    RAG_FILES_PAGE_SIZE,
 )
 
 logger = logging.getLogger(__name__)
 
 
+class _CorpusDirectory:
+    """
+    Process-wide snapshot of the project's RAG corpora.
+
+    Holds a display name -> resource name index and the set of known resource
+    names, refreshed from rag.list_corpora() at most once per TTL window.
+    Concurrent callers that find the snapshot stale share a single refresh.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self._ttl_seconds = ttl_seconds
+        self._refresh_lock = threading.Lock()
+        # (display name index, resource names) swapped atomically on refresh
+        self._snapshot: Tuple[Dict[str, str], FrozenSet[str]] = ({}, frozenset())
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+
+    def _is_fresh(self) -> bool:
+        loaded_at = self._loaded_at
+        return loaded_at is not None and time.monotonic() - loaded_at < self._ttl_seconds
+
+    def _store(self, corpora: Iterable, generation: int) -> None:
+        by_display_name: Dict[str, str] = {}
+        resource_names = set()
+        for corpus in corpora:
+            resource_names.add(corpus.name)
+            display_name = getattr(corpus, "display_name", None)
+            if display_name:
+                # Keep the first match, as the previous linear scan did
+                by_display_name.setdefault(display_name, corpus.name)
+        self._snapshot = (by_display_name, frozenset(resource_names))
+        # An invalidation that raced with this listing keeps the snapshot stale
+        if generation == self._generation:
+            self._loaded_at = time.monotonic()
+
+    def snapshot(self) -> Tuple[Dict[str, str], FrozenSet[str]]:
+        """Return the current index, refreshing it first if the TTL has expired."""
+        if self._is_fresh():
+            return self._snapshot
+
+        with self._refresh_lock:
+            # Another caller may have refreshed while we waited for the lock
+            if self._is_fresh():
+                return self._snapshot
+            generation = self._generation
+            logger.info("Refreshing corpus directory from rag.list_corpora()")
+            self._store(rag.list_corpora(), generation)
+            return self._snapshot
+
+    def prime(self, corpora: Iterable) -> None:
+        """Replace the snapshot with a listing the caller already fetched."""
+        with self._refresh_lock:
+            self._store(corpora, self._generation)
+
+    def invalidate(self) -> None:
+        """Force the next lookup to re-list corpora."""
+        self._generation += 1
+        self._loaded_at = None
+
+
+_corpus_directory = _CorpusDirectory(CORPUS_CACHE_TTL_SECONDS)
+
+
+def invalidate_corpus_cache() -> None:
+    """
+    Drop the cached corpus directory so the next lookup re-lists corpora.
+    Call this after creating or deleting a corpus.
+    """
+    _corpus_directory.invalidate()
+
+
+def prime_corpus_cache(corpora: Iterable) -> None:
+    """
+    Seed the corpus directory from a rag.list_corpora() result that was
+    fetched anyway (e.g. by the list_corpora tool).
+
+    Args:
+        corpora (Iterable): Corpus objects as returned by rag.list_corpora()
+    """
+    _corpus_directory.prime(corpora)
+
+
+_corpus_versions: Dict[str, int] = {}
+_corpus_versions_lock = threading.Lock()
+
+
+def get_corpus_version(corpus_resource_name: str) -> int:
+    """
+    Get the in-process version of a corpus' contents. Caches key their entries
+    on it, so anything derived from an older version is no longer served.
+
+    Args:
+        corpus_resource_name (str): The full resource name of the corpus
+
+    Returns:
+        int: The current version (0 until the corpus is first modified)
+    """
+    return _corpus_versions.get(corpus_resource_name, 0)
+
+
+def corpus_versions_snapshot() -> Dict[str, int]:
+    """
+    Get the current version of every corpus that has one.
+
+    Returns:
+        Dict[str, int]: Corpus resource name -> version (corpora not listed are at 0)
+    """
+    with _corpus_versions_lock:
+        return dict(_corpus_versions)
+
+
+def bump_corpus_version(corpus_resource_name: str) -> int:
+    """
+    Record that a corpus' contents changed (files added or deleted, corpus deleted).
+
+    Args:
+        corpus_resource_name (str): The full resource name of the corpus
+
+    Returns:
+        int: The new version
+    """
+    with _corpus_versions_lock:
+        version = _corpus_versions.get(corpus_resource_name, 0) + 1
+        _corpus_versions[corpus_resource_name] = version
+        return version
+
+
+def iter_rag_files(corpus_resource_name: str, page_size: int = RAG_FILES_PAGE_SIZE) -> Iterator:
+    """
+    Lazily yield every RagFile in a corpus. The pager fetches one page at a
+    time, so walking a corpus of any size holds a single page in memory.
+
+    Args:
+        corpus_resource_name (str): The full resource name of the corpus
+        page_size (int): Files fetched per request
+
+    Returns:
+        Iterator: RagFile objects
+    """
+    return iter(rag.list_files(corpus_resource_name, page_size=page_size))
+
+
+def list_rag_files_page(
+    corpus_resource_name: str, page_size: int, page_token: Optional[str] = None
+) -> Tuple[List, str]:
+    """
+    Fetch a single page of a corpus' RagFiles.
+
+    Returns:
+        Tuple[List, str]: The files on the page and the token of the next page ("" on the last page)
+    """
+    pager = rag.list_files(corpus_resource_name, page_size=page_size, page_token=page_token or None)
+    # The pager exposes the first response's fields directly
+    return list(pager.rag_files), pager.next_page_token
+
+
+def rag_file_source_type(rag_file) -> str:
+    """The kind of source a RagFile was imported from."""
+    for field, source_type in (
+        ("gcs_source", "gcs"),
+        ("google_drive_source", "google_drive"),
+        ("direct_upload_source", "direct_upload"),
+        ("slack_source", "slack"),
+        ("jira_source", "jira"),
+        ("share_point_sources", "share_point"),
+    ):
+        if field in rag_file:
+            return source_type
+    return "unknown"
+
+
 def get_corpus_resource_name(corpus_name: str) -> str:
     """
     Convert a corpus name to its full resource name if needed.
@@ -35,11 +211,10 @@ def get_corpus_resource_name(corpus_name: str) -> str:
 
     # Check if this is a display name of an existing corpus
     try:
-        # List all corpora and check if there's a match with the display name
-        corpora = rag.list_corpora()
-        for corpus in corpora:
-            if hasattr(corpus, "display_name") and corpus.display_name == corpus_name:
-                return corpus.name
+        # Look up the display name in the shared corpus directory
+        by_display_name, _ = _corpus_directory.snapshot()
+        if corpus_name in by_display_name:
+            return by_display_name[corpus_name]
     except Exception as e:
         logger.warning(f"Error when checking for corpus display name: {str(e)}")
         # If we can't check, continue with the default behavior
@@ -78,19 +253,15 @@ def check_corpus_exists(corpus_name: str, tool_context: ToolContext) -> bool:
         # Get full resource name
         corpus_resource_name = get_corpus_resource_name(corpus_name)
 
-        # List all corpora and check if this one exists
-        corpora = rag.list_corpora()
-        for corpus in corpora:
-            if (
-                corpus.name == corpus_resource_name
-                or corpus.display_name == corpus_name
-            ):
-                # Update state
-                tool_context.state[f"corpus_exists_{corpus_name}"] = True
-                # Also set this as the current corpus if no current corpus is set
-                if not tool_context.state.get("current_corpus"):
-                    tool_context.state["current_corpus"] = corpus_name
-                return True
+        # Check the shared corpus directory for this one
+        by_display_name, resource_names = _corpus_directory.snapshot()
+        if corpus_resource_name in resource_names or corpus_name in by_display_name:
+            # Update state
+            tool_context.state[f"corpus_exists_{corpus_name}"] = True
+            # Also set this as the current corpus if no current corpus is set
+            if not tool_context.state.get("current_corpus"):
+                tool_context.state["current_corpus"] = corpus_name
+            return True
 
         return False
     except Exception as e:
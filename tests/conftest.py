@@ -0,0 +1,165 @@
+"""
+In-memory stand-ins for Firestore and Cloud KMS, enough for the audit ledger
+and its verifier: ordered queries, batched creates and ECDSA signatures made
+with a real P-256 key.
+"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, utils
+from google.api_core.exceptions import AlreadyExists
+
+from rag_agent.services import audit_ledger
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def get(self, field):
+        return self._data[field]
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self):
+        return FakeSnapshot(self.id, self.collection.docs.get(self.id))
+
+    def set(self, data):
+        self.collection.docs[self.id] = dict(data)
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=(), order=None, limit=None):
+        self.collection = collection
+        self.filters = filters
+        self.order = order
+        self._limit = limit
+
+    def where(self, field, op, value):
+        assert op == ">"
+        return FakeQuery(self.collection, self.filters + ((field, value),), self.order, self._limit)
+
+    def order_by(self, field, direction="ASCENDING"):
+        return FakeQuery(self.collection, self.filters, (field, direction), self._limit)
+
+    def limit(self, count):
+        return FakeQuery(self.collection, self.filters, self.order, count)
+
+    def stream(self):
+        with self.collection.db.lock:
+            items = list(self.collection.docs.items())
+        items = [
+            (doc_id, data) for doc_id, data in items
+            if all(field in data and data[field] > value for field, value in self.filters)
+        ]
+        if self.order:
+            field, direction = self.order
+            items = [(doc_id, data) for doc_id, data in items if field in data]
+            items.sort(key=lambda item: item[1][field], reverse=direction == "DESCENDING")
+        if self._limit is not None:
+            items = items[:self._limit]
+        return iter([FakeSnapshot(doc_id, dict(data)) for doc_id, data in items])
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.docs = {}
+        super().__init__(self)
+
+    def document(self, doc_id):
+        return FakeDocument(self, doc_id)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.creates = []
+
+    def create(self, document, data):
+        self.creates.append((document, dict(data)))
+
+    def commit(self):
+        self.db.before_commit(self)
+        with self.db.lock:
+            for document, _ in self.creates:
+                if document.id in document.collection.docs:
+                    raise AlreadyExists(f"Document {document.id} already exists")
+            for document, data in self.creates:
+                document.collection.docs[document.id] = data
+            self.db.commits.append(len(self.creates))
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.collections = {}
+        self.commits = []
+        # Replaced by tests to inject failures or delays into batch commits
+        self.before_commit = lambda batch: None
+
+    def collection(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self, name)
+        return self.collections[name]
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+class FakeKms:
+    """Signs SHA-256 digests with a P-256 key, like an EC_SIGN_P256_SHA256 key version."""
+
+    def __init__(self):
+        self.private_key = ec.generate_private_key(ec.SECP256R1())
+        self.sign_calls = 0
+
+    def crypto_key_version_path(self, project, location, key_ring, key, version):
+        return f"projects/{project}/locations/{location}/keyRings/{key_ring}/cryptoKeys/{key}/cryptoKeyVersions/{version}"
+
+    def asymmetric_sign(self, request):
+        self.sign_calls += 1
+        signature = self.private_key.sign(request["digest"]["sha256"], ec.ECDSA(utils.Prehashed(hashes.SHA256())))
+        return SimpleNamespace(signature=signature)
+
+    def get_public_key(self, request):
+        pem = self.private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        return SimpleNamespace(pem=pem, algorithm=SimpleNamespace(name="EC_SIGN_P256_SHA256"))
+
+
+@pytest.fixture
+def firestore_db():
+    return FakeFirestore()
+
+
+@pytest.fixture
+def kms_client():
+    return FakeKms()
+
+
+@pytest.fixture
+def make_ledger(monkeypatch, firestore_db, kms_client):
+    """Build AuditLedgers that write to the in-memory Firestore and sign with the fake KMS."""
+    monkeypatch.setattr(audit_ledger.firestore, "Client", lambda project=None: firestore_db)
+    monkeypatch.setattr(audit_ledger.kms, "KeyManagementServiceClient", lambda: kms_client)
+
+    def make(**options):
+        options.setdefault("batch_latency_ms", 20)
+        return audit_ledger.AuditLedger("project", "us-central1", "ring", "key", **options)
+
+    return make
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import json
+import threading
+
+from rag_agent.services.audit_ledger import GENESIS_HASH
+from rag_agent.services.ledger_verifier import canonical_entry
+from rag_agent.services.merkle import build_merkle_levels, merkle_root
+
+COLLECTION = "secure_audit_ledger"
+
+
+def _entries(db):
+    return sorted(db.collection(COLLECTION).docs.values(), key=lambda entry: entry["sequence"])
+
+
+def _assert_chained(entries, first_previous=GENESIS_HASH):
+    previous = first_previous
+    for sequence, entry in enumerate(entries):
+        assert entry["sequence"] == sequence
+        assert entry["previous_hash"] == previous
+        assert entry["current_hash"] == hashlib.sha256(canonical_entry(entry).encode()).hexdigest()
+        previous = entry["current_hash"]
+
+
+def test_concurrent_entries_are_group_committed_in_one_chain(make_ledger, firestore_db):
+    ledger = make_ledger(batch_size=50)
+
+    async def run():
+        await asyncio.gather(*(ledger.log_action("query", {"n": n}, f"user-{n % 3}") for n in range(120)))
+        await ledger.flush()
+
+    asyncio.run(run())
+
+    entries = _entries(firestore_db)
+    assert len(entries) == 120
+    _assert_chained(entries)
+    assert sorted(entry["payload"]["n"] for entry in entries) == list(range(120))
+    # Queued entries share Firestore batches of at most batch_size writes
+    assert sum(firestore_db.commits) == 120
+    assert len(firestore_db.commits) <= 4 and max(firestore_db.commits) <= 50
+    assert ledger.stats()["committed"] == 120
+    # Document IDs are the zero-padded sequence numbers
+    assert sorted(firestore_db.collection(COLLECTION).docs) == [f"{n:020d}" for n in range(120)]
+
+
+def test_writer_rechains_onto_entries_of_another_writer(make_ledger, firestore_db):
+    ledger = make_ledger()
+
+    async def log(count):
+        for n in range(count):
+            await ledger.log_action("query", {"n": n}, "user")
+        await ledger.flush()
+
+    async def run():
+        await log(2)
+        head = _entries(firestore_db)[-1]
+        # Another instance appends sequence 2 behind this writer's back
+        foreign = {"sequence": 2, "previous_hash": head["current_hash"], "timestamp": "t",
+                   "user_id": "other", "action": "query", "payload": {}}
+        foreign["current_hash"] = hashlib.sha256(json.dumps(foreign, sort_keys=True).encode()).hexdigest()
+        firestore_db.collection(COLLECTION).document(f"{2:020d}").set(foreign)
+        await log(2)
+
+    asyncio.run(run())
+
+    entries = _entries(firestore_db)
+    assert [entry["user_id"] for entry in entries] == ["user", "user", "other", "user", "user"]
+    _assert_chained(entries)
+
+
+def _log(ledger, count):
+    async def run():
+        await asyncio.gather(*(ledger.log_action("query", {"n": n}, "user") for n in range(count)))
+        await ledger.flush()
+
+    asyncio.run(run())
+
+
+def test_merkle_mode_signs_one_root_per_batch(make_ledger, firestore_db, kms_client):
+    ledger = make_ledger(batch_size=8, signing_mode="merkle")
+    _log(ledger, 21)
+
+    entries = _entries(firestore_db)
+    _assert_chained(entries)
+    roots = {entry["merkle_root"] for entry in entries}
+    assert kms_client.sign_calls == len(roots) == len(firestore_db.commits)
+    for entry in entries:
+        assert entry["signature_scheme"] == "merkle"
+        assert ledger.verify_entry(entry) == (True, "")
+
+
+def test_entry_mode_signs_every_entry(make_ledger, firestore_db, kms_client):
+    ledger = make_ledger(batch_size=8)
+    _log(ledger, 5)
+
+    assert kms_client.sign_calls == 5
+    assert all(ledger.verify_entry(entry) == (True, "") for entry in _entries(firestore_db))
+
+
+def test_tampered_merkle_entries_fail_verification(make_ledger, firestore_db):
+    ledger = make_ledger(batch_size=8, signing_mode="merkle")
+    _log(ledger, 4)
+    first, second, third, _ = _entries(firestore_db)
+
+    assert ledger.verify_entry({**first, "payload": {"n": 99}}) == (False, "hash mismatch")
+    assert ledger.verify_entry({**second, "merkle_proof": third["merkle_proof"]}) == (False, "invalid merkle proof")
+    # A valid proof under a root the key never signed
+    alone = merkle_root(build_merkle_levels([third["current_hash"]]))
+    forged = {**third, "merkle_root": alone, "merkle_proof": []}
+    assert ledger.verify_entry(forged) == (False, "invalid signature")
+
+
+def _journal_lines(path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+
+
+def test_failed_batches_are_journaled_and_replayed(make_ledger, firestore_db, tmp_path):
+    journal = tmp_path / "journal.jsonl"
+
+    def unavailable(batch):
+        raise RuntimeError("Firestore unavailable")
+
+    firestore_db.before_commit = unavailable
+    ledger = make_ledger(journal_path=str(journal))
+    _log(ledger, 6)
+    assert not _entries(firestore_db)
+    assert sorted(line["payload"]["n"] for line in _journal_lines(journal)) == list(range(6))
+
+    # The next start replays the journal once Firestore is back
+    firestore_db.before_commit = lambda batch: None
+    restarted = make_ledger(journal_path=str(journal))
+
+    async def run():
+        await restarted.start()
+        await restarted.shutdown(timeout=5)
+
+    asyncio.run(run())
+    entries = _entries(firestore_db)
+    assert sorted(entry["payload"]["n"] for entry in entries) == list(range(6))
+    _assert_chained(entries)
+    assert not journal.exists() and not (tmp_path / "journal.jsonl.replay").exists()
+
+
+def test_full_queue_spills_or_sheds(make_ledger, firestore_db, tmp_path):
+    release = threading.Event()
+    firestore_db.before_commit = lambda batch: release.wait(5)
+    journal = tmp_path / "journal.jsonl"
+    spilling = make_ledger(queue_size=1, batch_size=1, overflow_policy="spill", journal_path=str(journal))
+    shedding = make_ledger(queue_size=1, batch_size=1, overflow_policy="shed")
+
+    async def run(ledger):
+        await ledger.log_action("query", {"n": 0}, "user")
+        # Let the writer take the first entry into its (blocked) commit
+        await asyncio.sleep(0.05)
+        for n in range(1, 5):
+            await ledger.log_action("query", {"n": n}, "user")
+        release.set()
+        await ledger.flush()
+        release.clear()
+
+    asyncio.run(run(spilling))
+    assert spilling.stats()["spilled"] == 3
+    assert [line["payload"]["n"] for line in _journal_lines(journal)] == [2, 3, 4]
+
+    asyncio.run(run(shedding))
+    assert shedding.stats()["dropped"] == 3
+
+
+def test_shutdown_journals_the_batch_whose_commit_outlives_the_deadline(make_ledger, firestore_db, tmp_path):
+    release = threading.Event()
+
+    def slow_failure(batch):
+        release.wait(5)
+        raise RuntimeError("deadline exceeded")
+
+    firestore_db.before_commit = slow_failure
+    journal = tmp_path / "journal.jsonl"
+    ledger = make_ledger(journal_path=str(journal), journal_replay_interval=60)
+
+    async def run():
+        await ledger.log_action("query", {"n": 0}, "user")
+        await asyncio.sleep(0.05)
+        # The commit fails only after shutdown gave up waiting for the queue
+        asyncio.get_running_loop().call_later(0.2, release.set)
+        await ledger.shutdown(timeout=0.05)
+
+    asyncio.run(run())
+    assert [line["payload"]["n"] for line in _journal_lines(journal)] == [0]
+    assert ledger.stats()["dropped"] == 0
@@ -0,0 +1,74 @@
+from rag_agent.services.context_packing import MIN_TRUNCATED_TOKENS, TRUNCATION_MARK, ContextPacker
+
+
+def _words(start, stop, prefix="w"):
+    return " ".join(f"{prefix}{n}" for n in range(start, stop))
+
+
+def _result(source, text, **scores):
+    return {"source_uri": f"gs://bucket/{source}", "source_name": source, "corpus_name": "hr", "text": text, **scores}
+
+
+def _packer(token_budget=10000, mmr_lambda=1.0, min_overlap_words=8):
+    return ContextPacker(token_budget=token_budget, mmr_lambda=mmr_lambda, min_overlap_words=min_overlap_words)
+
+
+def test_overlapping_and_contained_chunks_are_removed():
+    results = [
+        _result("a.txt", _words(0, 100)),
+        # The next chunk repeats the last 20 words of the first one
+        _result("a.txt", _words(80, 180)),
+        _result("a.txt", _words(10, 50)),
+        # The same words in another source are not an overlap
+        _result("b.txt", _words(90, 120)),
+    ]
+
+    sources, packed, report = _packer().pack(results)
+
+    assert [item["text"] for item in packed] == [_words(0, 100), _words(100, 180), _words(90, 120)]
+    assert report["overlap_words_removed"] == 20 + 40
+    assert report["results_dropped"] == 1
+    assert report["tokens_saved"] == report["tokens_before"] - report["tokens_after"] > 0
+
+
+def test_sources_are_listed_once_and_scores_keep_their_names():
+    results = [
+        _result("a.txt", _words(0, 30), score=0.123456, rerank_score=0.98765),
+        _result("b.txt", _words(0, 30, prefix="x"), score=0.2, lexical_score=7.0, fused_score=0.5),
+        _result("a.txt", _words(0, 30, prefix="y"), score=0.3),
+    ]
+
+    sources, packed, _ = _packer().pack(results)
+
+    assert sources == [
+        {"source_uri": "gs://bucket/a.txt", "source_name": "a.txt", "corpus_name": "hr"},
+        {"source_uri": "gs://bucket/b.txt", "source_name": "b.txt", "corpus_name": "hr"},
+    ]
+    assert packed == [
+        {"source": 0, "text": _words(0, 30), "score": 0.123, "rerank_score": 0.988},
+        {"source": 1, "text": _words(0, 30, prefix="x"), "score": 0.2, "lexical_score": 7.0, "fused_score": 0.5},
+        {"source": 0, "text": _words(0, 30, prefix="y"), "score": 0.3},
+    ]
+
+
+def test_results_are_packed_into_the_token_budget():
+    results = [_result(f"{n}.txt", _words(0, 200, prefix=f"d{n}-")) for n in range(6)]
+    packer = _packer(token_budget=900)
+
+    _, packed, report = packer.pack(results)
+
+    assert report["tokens_after"] <= 900 < report["tokens_before"]
+    assert 0 < len(packed) < 6 and report["results_dropped"] == 6 - len(packed)
+    # Whole contexts in retrieval order, the last one cut at a word boundary
+    assert [item["text"] for item in packed[:-1]] == [_words(0, 200, prefix=f"d{n}-") for n in range(len(packed) - 1)]
+    assert packed[-1]["text"].endswith(TRUNCATION_MARK)
+    assert packed[-1]["text"][:-len(TRUNCATION_MARK)] in results[len(packed) - 1]["text"]
+    assert packer.stats()["requests"] == 1 and packer.stats()["tokens_saved"] == report["tokens_saved"]
+
+
+def test_the_first_result_is_always_included():
+    _, packed, _ = _packer(token_budget=10).pack([_result("a.txt", _words(0, 500))])
+
+    assert len(packed) == 1
+    text = packed[0]["text"]
+    assert text.endswith(TRUNCATION_MARK) and len(text) <= MIN_TRUNCATED_TOKENS * 4
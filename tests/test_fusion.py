@@ -0,0 +1,110 @@
+import pytest
+
+from rag_agent.services.fusion import RRF_K, hybrid_score_fusion, normalized_score_fusion, reciprocal_rank_fusion
+
+
+def _context(source, text, **scores):
+    return {"source_uri": f"gs://bucket/{source}", "text": text, **scores}
+
+
+def _order(fused):
+    return [(context["source_uri"].rsplit("/", 1)[-1], context["text"]) for context in fused]
+
+
+def test_rrf_merges_shared_contexts_and_ignores_raw_scores():
+    first = [_context("a", "one", score=0.1), _context("b", "two", score=0.2)]
+    second = [_context("c", "three", score=900.0), _context("a", "one", score=950.0)]
+
+    fused = reciprocal_rank_fusion([first, second])
+
+    assert _order(fused) == [("a", "one"), ("c", "three"), ("b", "two")]
+    assert fused[0]["fused_score"] == round(1 / (RRF_K + 1) + 1 / (RRF_K + 2), 6)
+    assert [context["fused_score"] for context in fused[1:]] == [round(1 / (RRF_K + 1), 6), round(1 / (RRF_K + 2), 6)]
+
+
+def test_distances_are_normalized_lower_is_better():
+    ranked = [_context("a", "near", score=0.1), _context("b", "mid", score=0.3), _context("c", "far", score=0.5)]
+
+    fused = normalized_score_fusion([ranked])
+
+    assert _order(fused) == [("a", "near"), ("b", "mid"), ("c", "far")]
+    assert [context["fused_score"] for context in fused] == [1.0, 0.5, 0.0]
+
+
+@pytest.mark.parametrize("field", ["rerank_score", "fused_score"])
+def test_lists_are_normalized_on_the_score_they_were_ranked_by(field):
+    # Reranked or fused lists are ordered by a similarity, not by the distance they still carry
+    reranked = [_context("a", "best", score=0.9, **{field: 8.0}), _context("b", "worst", score=0.1, **{field: 2.0})]
+    plain = [_context("c", "only", score=0.2)]
+
+    fused = normalized_score_fusion([reranked, plain])
+
+    scores = {text: context["fused_score"] for (_, text), context in zip(_order(fused), fused)}
+    assert scores == {"best": 1.0, "only": 1.0, "worst": 0.0}
+
+
+def test_contexts_without_a_score_are_the_worst_of_their_list():
+    ranked = [_context("a", "vector", score=0.2), _context("b", "lexical only", score=None),
+              _context("c", "vector too", score=0.4)]
+
+    fused = normalized_score_fusion([ranked])
+
+    assert [context["fused_score"] for context in fused] == [1.0, 0.0, 0.0]
+    assert _order(fused)[0] == ("a", "vector")
+    # Equal known scores all count as the best; a missing one still as the worst
+    tied = normalized_score_fusion([[_context("a", "x", score=0.3), _context("b", "y", score=None),
+                                     _context("c", "z", score=0.3)]])
+    assert sorted(context["fused_score"] for context in tied) == [0.0, 1.0, 1.0]
+
+
+PASSAGE = "the vacation policy grants thirty days of paid leave per calendar year to every employee"
+
+
+def test_lexical_hits_match_overlapping_vector_contexts_of_the_same_source():
+    # The server chunk and the client-side chunk cover the same passage with different borders
+    vector = [_context("a", "Intro. " + PASSAGE, score=0.4), _context("b", "unrelated text about parking spaces", score=0.2)]
+    lexical = [_context("a", PASSAGE + " and more", lexical_score=6.0),
+               _context("a", PASSAGE[:40] + " something else entirely here", lexical_score=9.0)]
+
+    fused = hybrid_score_fusion(vector, lexical, lexical_weight=0.5)
+
+    # The first hit matches the vector context, the second shares too few 3-grams and stands alone
+    by_text = {context["text"]: context for context in fused}
+    assert len(fused) == 3
+    matched = by_text["Intro. " + PASSAGE]
+    assert matched["lexical_score"] == 6.0 and matched["score"] == 0.4
+    assert matched["fused_score"] == round(0.5 * 0.6 + 0.5 * 6.0 / 9.0, 6)
+    assert by_text["unrelated text about parking spaces"]["lexical_score"] is None
+
+
+def test_a_hit_from_another_source_is_not_matched():
+    vector = [_context("a", PASSAGE, score=0.1)]
+    lexical = [_context("b", PASSAGE, lexical_score=3.0)]
+
+    fused = hybrid_score_fusion(vector, lexical, lexical_weight=0.3)
+
+    assert {context["source_uri"]: (context["score"], context["lexical_score"]) for context in fused} == {
+        "gs://bucket/a": (0.1, None), "gs://bucket/b": (None, 3.0),
+    }
+
+
+def test_unmatched_lexical_hits_get_the_lowest_vector_similarity():
+    vector = [_context("a", "first vector context text", score=0.2), _context("a", "second vector context text", score=0.6)]
+    lexical = [_context("c", "an exact keyword match", lexical_score=4.0)]
+
+    fused = hybrid_score_fusion(vector, lexical, lexical_weight=0.5)
+
+    lexical_only = next(context for context in fused if context["source_uri"] == "gs://bucket/c")
+    assert lexical_only["score"] is None
+    assert lexical_only["fused_score"] == round(0.5 * 0.4 + 0.5 * 1.0, 6)
+    assert _order(fused)[0] == ("c", "an exact keyword match")
+
+
+def test_a_vector_context_takes_the_best_matching_lexical_score():
+    vector = [_context("a", PASSAGE, score=0.3)]
+    lexical = [_context("a", PASSAGE, lexical_score=2.0), _context("a", "Leave: " + PASSAGE, lexical_score=5.0)]
+
+    fused = hybrid_score_fusion(vector, lexical, lexical_weight=1.0)
+
+    assert len(fused) == 1
+    assert fused[0]["lexical_score"] == 5.0 and fused[0]["fused_score"] == 1.0
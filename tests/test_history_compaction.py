@@ -0,0 +1,85 @@
+from google.genai import types
+
+from rag_agent.services.history_compaction import compact_contents, estimate_tokens, summarize_turns, split_turns
+
+
+def _turn(n, question=None, context_words=400):
+    results = [
+        {"source_uri": f"gs://bucket/doc{n}-{i}.txt", "source_name": f"doc{n}-{i}.txt",
+         "text": " ".join(f"word{n}" for _ in range(context_words)), "score": 0.2}
+        for i in range(2)
+    ]
+    return [
+        types.Content(role="user", parts=[types.Part(text=question or f"Question {n} about the handbook?")]),
+        types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(
+            id=f"call-{n}", name="rag_query", args={"corpus_name": "hr", "query": f"question {n}"},
+        ))]),
+        types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(
+            id=f"call-{n}", name="rag_query",
+            response={"status": "success", "message": "ok", "query": f"question {n}", "results": results},
+        ))]),
+        types.Content(role="model", parts=[types.Part(text=f"Answer {n}: see the handbook.")]),
+    ]
+
+
+def _history(turns, **options):
+    return [content for n in range(turns) for content in _turn(n, **options)]
+
+
+def _tokens(contents):
+    return sum(estimate_tokens(content) for content in contents)
+
+
+def test_history_within_budget_is_left_alone():
+    contents = _history(3)
+    original = list(contents)
+
+    assert compact_contents(contents, token_budget=_tokens(contents), keep_recent_turns=2) is None
+    assert contents == original
+
+
+def test_old_tool_results_are_trimmed_to_citations():
+    contents = _history(5)
+    recent = contents[-8:]
+    before = _tokens(contents)
+
+    report = compact_contents(contents, token_budget=before // 2, keep_recent_turns=2)
+
+    assert report == {"tokens_before": before, "tokens_after": _tokens(contents),
+                      "turns_trimmed": 3, "turns_summarized": 0}
+    assert report["tokens_after"] <= before // 2
+    # The recent turns are sent verbatim, the older ones keep their structure
+    assert contents[-8:] == recent
+    assert len(split_turns(contents)) == 5
+    trimmed = contents[2].parts[0].function_response
+    assert trimmed.id == "call-0"
+    assert trimmed.response == {
+        "status": "success", "message": "ok", "query": "question 0",
+        "citations": [{"source_uri": "gs://bucket/doc0-0.txt", "source_name": "doc0-0.txt"},
+                      {"source_uri": "gs://bucket/doc0-1.txt", "source_name": "doc0-1.txt"}],
+    }
+
+
+def test_old_turns_are_summarized_when_trimming_is_not_enough():
+    contents = _history(6, question="Long question " + "detail " * 400)
+    recent_question = contents[-8].parts[0].text
+
+    report = compact_contents(contents, token_budget=3000, keep_recent_turns=2, summary_token_budget=500)
+
+    assert report["turns_summarized"] == 4 and report["turns_trimmed"] == 0
+    assert len(split_turns(contents)) == 2
+    summary, question = contents[0].parts
+    assert question.text == recent_question
+    assert summary.text.startswith("[Summary of the earlier conversation")
+    assert "Agent: Answer 3: see the handbook." in summary.text
+    assert "Sources: gs://bucket/doc3-0.txt, gs://bucket/doc3-1.txt" in summary.text
+
+
+def test_summary_keeps_the_most_recent_turns_within_its_budget():
+    turns = split_turns(_history(10))
+
+    summary = summarize_turns(turns, token_budget=60)
+
+    assert len(summary) <= 60 * 4 + 60
+    assert "older turn(s) omitted]" in summary
+    assert "Answer 9" in summary and "Answer 0" not in summary
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from rag_agent.services.ledger_verifier import CHECKPOINT_COLLECTION, verify_chain
+
+COLLECTION = "secure_audit_ledger"
+
+
+@pytest.fixture
+def written(make_ledger, firestore_db, kms_client):
+    """Writes a ledger with entry-signed and Merkle-signed batches; returns a function that appends more."""
+
+    def write(count, signing_mode="entry"):
+        ledger = make_ledger(batch_size=10, signing_mode=signing_mode)
+
+        async def run():
+            for n in range(count):
+                await ledger.log_action("query", {"n": n}, "user")
+            await ledger.flush()
+
+        asyncio.run(run())
+
+    write(12, "entry")
+    write(25, "merkle")
+    return write
+
+
+def _verify(firestore_db, kms_client, **options):
+    options.setdefault("workers", 1)
+    options.setdefault("page_size", 8)
+    return verify_chain(firestore_db, kms_client, "key", **options)
+
+
+def _document(firestore_db, sequence):
+    return firestore_db.collection(COLLECTION).docs[f"{sequence:020d}"]
+
+
+def test_full_verification_of_a_valid_chain(written, firestore_db, kms_client):
+    report = _verify(firestore_db, kms_client, full=True)
+
+    assert report["status"] == "success"
+    assert report["mode"] == "full"
+    assert report["entries_verified"] == 37
+    assert report["last_sequence"] == report["checkpoint_sequence"] == 36
+    # Entry-signed entries are checked one by one, a Merkle batch once per root
+    merkle_roots = {_document(firestore_db, n)["merkle_root"] for n in range(12, 37)}
+    assert report["signatures_checked"] == 12 + len(merkle_roots)
+    assert firestore_db.collection(CHECKPOINT_COLLECTION).docs["latest"]["sequence"] == 36
+
+
+def test_incremental_runs_resume_from_the_checkpoint(written, firestore_db, kms_client):
+    _verify(firestore_db, kms_client)
+    written(5)
+
+    report = _verify(firestore_db, kms_client)
+    assert report["mode"] == "incremental"
+    assert report["start_sequence"] == 37
+    assert report["entries_verified"] == 5
+    assert report["status"] == "success"
+
+    assert _verify(firestore_db, kms_client)["entries_verified"] == 0
+
+
+@pytest.mark.parametrize("sequence, change, reason", [
+    (3, {"payload": {"n": 99}}, "hash mismatch"),
+    (20, {"payload": {"n": 99}}, "hash mismatch"),
+    (5, {"signature": "00" * 64}, "invalid signature"),
+    (30, {"merkle_proof": []}, "invalid merkle proof"),
+    (8, {"previous_hash": "0" * 64}, "previous_hash does not match the preceding entry"),
+])
+def test_tampering_is_reported_and_stops_the_checkpoint(written, firestore_db, kms_client, sequence, change, reason):
+    _document(firestore_db, sequence).update(change)
+
+    report = _verify(firestore_db, kms_client, full=True)
+
+    assert report["status"] == "failed"
+    assert report["first_failure_sequence"] == sequence
+    assert {"sequence": sequence, "reason": reason} in report["failures"]
+    assert report["checkpoint_sequence"] < sequence
+
+
+def test_a_deleted_entry_is_a_sequence_gap(written, firestore_db, kms_client):
+    del firestore_db.collection(COLLECTION).docs[f"{15:020d}"]
+
+    report = _verify(firestore_db, kms_client, full=True)
+
+    assert report["status"] == "failed"
+    assert report["first_failure_sequence"] == 16
+    assert {"sequence": 16, "reason": "sequence gap after 14"} in report["failures"]
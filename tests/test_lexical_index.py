@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from rag_agent.services import lexical_index
+from rag_agent.services.lexical_index import CorpusLexicalIndex, LexicalIndex
+
+SOURCES = {
+    "gs://bucket/a.txt": ["Error ERR-4021 means the disk is full.", "Restart the service after clearing space."],
+    "gs://bucket/b.txt": ["Policy #77 covers water damage.", "Claims under policy_77a need a photo."],
+    "gs://bucket/c.txt": ["Release v1.2.3 fixes ERR-4012 on startup."],
+}
+UPDATED_B = ["Policy #77 no longer covers water damage.", "SKU-9 replaces sku_77a."]
+
+
+def _source(uri, chunks):
+    return uri, uri.rsplit("/", 1)[-1], chunks
+
+
+def _assert_same(index, expected):
+    assert index.arrays.keys() == expected.arrays.keys()
+    for name, array in expected.arrays.items():
+        assert index.arrays[name].dtype == array.dtype, name
+        assert np.array_equal(index.arrays[name], array), name
+    for query in ("err-4021", "policy 77", "sku_77a", "water damage", "startup"):
+        assert index.search(query, 10) == expected.search(query, 10)
+
+
+def test_incremental_updates_match_a_build_from_scratch():
+    a, b, c = (_source(uri, chunks) for uri, chunks in SOURCES.items())
+    b_updated = _source(b[0], UPDATED_B)
+
+    index = CorpusLexicalIndex.empty().with_sources([a, b])
+    index = index.with_sources([c])
+    index = index.with_sources([b_updated])
+    index = index.without_sources([a[0]])
+
+    _assert_same(index, CorpusLexicalIndex.empty().with_sources([c, b_updated]))
+
+
+def test_stored_index_reloads_unchanged(tmp_path, monkeypatch):
+    monkeypatch.setattr(lexical_index, "source_chunks", lambda uri: SOURCES[uri])
+    corpus = "projects/p/locations/l/ragCorpora/1"
+    store = LexicalIndex(str(tmp_path))
+    assert store.add_sources(corpus, list(SOURCES)) == 5
+    store.remove_source(corpus, "gs://bucket/a.txt")
+
+    reloaded = LexicalIndex(str(tmp_path))
+    assert reloaded.has(corpus)
+    assert reloaded.search(corpus, "policy 77", 10) == store.search(corpus, "policy 77", 10)
+    assert all(hit["source_uri"] != "gs://bucket/a.txt" for hit in reloaded.search(corpus, "err-4021 disk", 10))
+
+
+def _rag_file(uri):
+    return SimpleNamespace(
+        display_name=uri.rsplit("/", 1)[-1],
+        gcs_source=SimpleNamespace(uris=[uri]),
+        google_drive_source=SimpleNamespace(resource_ids=[]),
+    )
+
+
+def test_build_keeps_changes_made_while_it_runs(tmp_path, monkeypatch):
+    chunks = {**SOURCES, "gs://bucket/d.txt": ["SKU-9 ships in March."]}
+    monkeypatch.setattr(lexical_index, "source_chunks", lambda uri: chunks[uri])
+    corpus = "projects/p/locations/l/ragCorpora/1"
+    store = LexicalIndex(str(tmp_path))
+
+    def rag_files():
+        yield _rag_file("gs://bucket/a.txt")
+        # add_data and delete_document commit while the listing is being read
+        assert store.tracks(corpus) and not store.has(corpus)
+        store.add_sources(corpus, ["gs://bucket/d.txt"])
+        store.remove_source(corpus, "gs://bucket/a.txt")
+        yield _rag_file("gs://bucket/b.txt")
+
+    store.build(corpus, 1, rag_files())
+
+    found = {hit["source_uri"] for hit in store.search(corpus, "sku-9 policy err-4021", 10)}
+    assert found == {"gs://bucket/b.txt", "gs://bucket/d.txt"}
+
+
+def test_build_discarded_when_corpus_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(lexical_index, "source_chunks", lambda uri: SOURCES[uri])
+    corpus = "projects/p/locations/l/ragCorpora/1"
+    store = LexicalIndex(str(tmp_path))
+
+    def rag_files():
+        yield _rag_file("gs://bucket/a.txt")
+        store.drop_corpus(corpus)
+
+    store.build(corpus, 1, rag_files())
+    assert not store.has(corpus)
+    assert not LexicalIndex(str(tmp_path)).has(corpus)
+
+
+def test_failed_build_is_not_retried_until_backoff_or_change(tmp_path, monkeypatch):
+    def unreadable(uri):
+        raise OSError("GCS read failed")
+
+    monkeypatch.setattr(lexical_index, "source_chunks", unreadable)
+    corpus = "projects/p/locations/l/ragCorpora/1"
+    store = LexicalIndex(str(tmp_path), retry_seconds=300)
+    with pytest.raises(OSError):
+        store.build(corpus, 1, [_rag_file("gs://bucket/a.txt")])
+
+    assert not store.tracks(corpus)
+    assert not store.should_build(corpus, 1)
+    assert store.should_build(corpus, 2)
+    store.retry_seconds = 0
+    assert store.should_build(corpus, 1)
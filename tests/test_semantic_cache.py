@@ -0,0 +1,37 @@
+from rag_agent.services.semantic_cache import HashingEmbedder, SemanticCache, identifiers
+
+KEY = ("projects/p/locations/l/ragCorpora/1", 5, 0.5)
+
+
+def _cache():
+    return SemanticCache(HashingEmbedder(), threshold=0.95, capacity=10, ttl_seconds=60)
+
+
+def test_identifiers():
+    assert identifiers("what's the refund policy") == frozenset()
+    assert identifiers("How do I reset a password") == frozenset()
+    assert identifiers("What does ERR-4021 mean?") == {"err-4021"}
+    assert identifiers("floor plan of building A") == {"a"}
+    assert identifiers("release notes for v1.2.3, plan B") == {"v1.2.3", "b"}
+
+
+def test_paraphrase_hits():
+    cache = _cache()
+    cache.insert(KEY, 1, "what's the refund policy", ["refund"])
+    payload, similarity, matched = cache.lookup(KEY, 1, "refund policy?")
+    assert payload == ["refund"] and similarity >= 0.95 and matched == "what's the refund policy"
+
+
+def test_different_identifiers_never_match():
+    cache = _cache()
+    cache.insert(KEY, 1, "What does ERR-4021 mean?", ["4021"])
+    cache.insert(KEY, 1, "floor plan of building A", ["A"])
+    assert cache.lookup(KEY, 1, "What does ERR-4012 mean?") is None
+    assert cache.lookup(KEY, 1, "floor plan of building B") is None
+    assert cache.lookup(KEY, 1, "what does err-4021 mean")[0] == ["4021"]
+
+
+def test_other_corpus_version_misses():
+    cache = _cache()
+    cache.insert(KEY, 1, "refund policy", ["refund"])
+    assert cache.lookup(KEY, 2, "refund policy") is None
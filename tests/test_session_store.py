@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import pytest
+from google.adk.events import Event, EventActions
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.genai import types
+
+from rag_agent.services.session_store import AlreadyExistsError, SqliteSessionService
+
+APP = "rag_agent"
+
+
+def _event(text, author="user", state_delta=None, partial=None):
+    return Event(
+        invocation_id="invocation",
+        author=author,
+        content=types.Content(role="user" if author == "user" else "model", parts=[types.Part(text=text)]),
+        actions=EventActions(state_delta=state_delta or {}),
+        partial=partial,
+        timestamp=time.time(),
+    )
+
+
+def _texts(session):
+    return [event.content.parts[0].text for event in session.events]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.sqlite3")
+
+
+def test_append_and_load_with_scoped_state(db_path):
+    service = SqliteSessionService(db_path)
+
+    async def run():
+        session = await service.create_session(app_name=APP, user_id="u1", session_id="s1", state={"topic": "hr"})
+        await service.append_event(session, _event("hello", state_delta={
+            "turns": 1, "user:language": "de", "app:greeting": "hi", "temp:scratch": "x",
+        }))
+        await service.append_event(session, _event("hi there", author="rag_agent", state_delta={"turns": 2}))
+        # A partial (streaming) event is not stored
+        await service.append_event(session, _event("hi th", author="rag_agent", partial=True))
+        other = await service.create_session(app_name=APP, user_id="u1", session_id="s2")
+        return await service.get_session(app_name=APP, user_id="u1", session_id="s1"), other
+
+    loaded, other = asyncio.run(run())
+    assert _texts(loaded) == ["hello", "hi there"]
+    assert loaded.state == {"topic": "hr", "turns": 2, "user:language": "de", "app:greeting": "hi"}
+    # app: and user: state is shared with the user's other sessions
+    assert other.state == {"user:language": "de", "app:greeting": "hi"}
+
+
+def test_sessions_survive_a_restart(db_path):
+    async def write():
+        service = SqliteSessionService(db_path)
+        session = await service.create_session(app_name=APP, user_id="u1", session_id="s1")
+        for n in range(3):
+            await service.append_event(session, _event(f"turn {n}", state_delta={"turns": n + 1}))
+
+    async def read():
+        service = SqliteSessionService(db_path)
+        return (
+            await service.get_session(app_name=APP, user_id="u1", session_id="s1"),
+            await service.get_session(app_name=APP, user_id="u1", session_id="s1",
+                                      config=GetSessionConfig(num_recent_events=2)),
+            service.stats(),
+        )
+
+    asyncio.run(write())
+    loaded, recent, stats = asyncio.run(read())
+    assert _texts(loaded) == ["turn 0", "turn 1", "turn 2"]
+    assert loaded.state == {"turns": 3}
+    assert _texts(recent) == ["turn 1", "turn 2"]
+    # The first load reads the events, the second is served from the hot tier
+    assert stats["misses"] == 1 and stats["hits"] == 1
+
+
+def test_appends_from_another_process_invalidate_the_hot_tier(db_path):
+    first, second = SqliteSessionService(db_path), SqliteSessionService(db_path)
+
+    async def run():
+        session = await first.create_session(app_name=APP, user_id="u1", session_id="s1")
+        await first.append_event(session, _event("from first"))
+        # The second worker appends to the same session
+        theirs = await second.get_session(app_name=APP, user_id="u1", session_id="s1")
+        await second.append_event(theirs, _event("from second"))
+        ours = await first.get_session(app_name=APP, user_id="u1", session_id="s1")
+        await first.append_event(ours, _event("first again"))
+        return (
+            await first.get_session(app_name=APP, user_id="u1", session_id="s1"),
+            await second.get_session(app_name=APP, user_id="u1", session_id="s1"),
+        )
+
+    seen_by_first, seen_by_second = asyncio.run(run())
+    assert _texts(seen_by_first) == _texts(seen_by_second) == ["from first", "from second", "first again"]
+
+
+def test_duplicate_events_and_sessions(db_path):
+    service = SqliteSessionService(db_path)
+
+    async def run():
+        session = await service.create_session(app_name=APP, user_id="u1", session_id="s1")
+        event = _event("once")
+        await service.append_event(session, event)
+        # Another reference to the same session delivers the same event again
+        copy = await service.get_session(app_name=APP, user_id="u1", session_id="s1")
+        await service.append_event(copy, event)
+        with pytest.raises(AlreadyExistsError):
+            await service.create_session(app_name=APP, user_id="u1", session_id="s1")
+        return await service.get_session(app_name=APP, user_id="u1", session_id="s1")
+
+    assert _texts(asyncio.run(run())) == ["once"]
+
+
+def test_delete_and_list_sessions(db_path):
+    service = SqliteSessionService(db_path)
+
+    async def run():
+        for session_id in ("s1", "s2"):
+            session = await service.create_session(app_name=APP, user_id="u1", session_id=session_id)
+            await service.append_event(session, _event(session_id))
+        await service.delete_session(app_name=APP, user_id="u1", session_id="s1")
+        listed = await service.list_sessions(app_name=APP, user_id="u1")
+        deleted = await service.get_session(app_name=APP, user_id="u1", session_id="s1")
+        return [session.id for session in listed.sessions], deleted
+
+    listed, deleted = asyncio.run(run())
+    assert listed == ["s2"]
+    assert deleted is None
+    # Nothing of the deleted session is left for a new process either
+    assert asyncio.run(SqliteSessionService(db_path).get_session(app_name=APP, user_id="u1", session_id="s1")) is None
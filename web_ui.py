@@ -4,6 +4,7 @@ import google.auth
 from google.auth.transport.requests import Request
 from google.oauth2 import id_token
 import os
+import json
 
 # --- Configuration ---
 # We try to get the URL from environment, or user can input it
@@ -16,6 +17,7 @@ st.title("🔐 Secure ADK Agent Interface")
 with st.sidebar:
     st.header("Connection Settings")
     service_url = st.text_input("Cloud Run URL", value=DEFAULT_SERVICE_URL, placeholder="https://adk-rag-agent-...")
+    stream_responses = st.toggle("Stream responses", value=True, help="Render the answer as it is generated (uses /chat/stream).")
     st.info("This UI uses your local Google Credentials to authenticate requests.")
 
 # --- Authentication Helper ---
@@ -33,6 +35,61 @@ def get_id_token(target_audience):
         st.error(f"Authentication failed: {e}")
         return None
 
+# --- Streaming Helper ---
+def iter_sse_events(response):
+    """
+    Parses a Server-Sent Events response into (event, data) tuples.
+    """
+    event_name, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            # A blank line terminates the current frame
+            if data_lines:
+                yield event_name, json.loads("\n".join(data_lines))
+            event_name, data_lines = "message", []
+        elif line.startswith("event:"):
+            event_name = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+def stream_chat(service_url, prompt, headers, message_placeholder):
+    """
+    Calls the /chat/stream endpoint and renders tokens as they arrive.
+    Returns the final answer, or None if the request failed.
+    """
+    status_placeholder = st.empty()
+    answer = ""
+    with requests.post(
+        f"{service_url}/chat/stream",
+        json={"prompt": prompt},
+        headers={**headers, "Accept": "text/event-stream"},
+        stream=True
+    ) as response:
+        if response.status_code != 200:
+            message_placeholder.error(f"Error {response.status_code}: {response.text}")
+            return None
+
+        for event, data in iter_sse_events(response):
+            if event == "token":
+                answer += data.get("text", "")
+                message_placeholder.markdown(answer + "▌")
+            elif event == "tool_call":
+                status_placeholder.caption(f"🔧 Running `{data.get('name')}`...")
+            elif event == "tool_result":
+                status_placeholder.caption(f"✅ `{data.get('name')}` finished")
+            elif event == "done":
+                answer = data.get("response", answer)
+            elif event == "error":
+                status_placeholder.empty()
+                message_placeholder.error(f"Agent error: {data.get('error')}")
+                return None
+
+    status_placeholder.empty()
+    message_placeholder.markdown(answer)
+    return answer
+
 # --- Chat Interface ---
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -68,22 +125,27 @@ if prompt := st.chat_input("Ask your secure agent something..."):
                     "Content-Type": "application/json"
                 }
                 
-                # Send request to your FastAPI /chat endpoint
-                response = requests.post(
-                    f"{service_url}/chat",
-                    json={"prompt": prompt},
-                    headers=headers
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    # Assuming your API returns {"response": "..."}
-                    answer = data.get("response", str(data))
-                    message_placeholder.markdown(answer)
-                    st.session_state.messages.append({"role": "assistant", "content": answer})
+                if stream_responses:
+                    answer = stream_chat(service_url, prompt, headers, message_placeholder)
+                    if answer is not None:
+                        st.session_state.messages.append({"role": "assistant", "content": answer})
                 else:
-                    error_msg = f"Error {response.status_code}: {response.text}"
-                    message_placeholder.error(error_msg)
+                    # Send request to your FastAPI /chat endpoint
+                    response = requests.post(
+                        f"{service_url}/chat",
+                        json={"prompt": prompt},
+                        headers=headers
+                    )
+                
+                    if response.status_code == 200:
+                        data = response.json()
+                        # Assuming your API returns {"response": "..."}
+                        answer = data.get("response", str(data))
+                        message_placeholder.markdown(answer)
+                        st.session_state.messages.append({"role": "assistant", "content": answer})
+                    else:
+                        error_msg = f"Error {response.status_code}: {response.text}"
+                        message_placeholder.error(error_msg)
             
         except Exception as e:
             message_placeholder.error(f"Connection failed: {str(e)}")